@@ -0,0 +1,800 @@
+#!/usr/bin/env python3
+"""
+Performance benchmarks for the Anaptyss Chat API
+
+Benchmarks:
+1. Concurrency: N concurrent chat sessions against one API worker
+2. Context tokens: financial context extraction input over a synthetic conversation
+3. Session memory: bytes per in-memory session and sessions per GB
+4. Session stores: save/get latency and round-trip integrity of the SQLite and Redis stores
+5. Session locks: concurrent requests at one shared and at distinct sessions
+6. Batched search: one query_batch_points round trip vs sequential unfiltered + filtered searches
+7. Payload projection: bytes and deserialization time of full vs projected search payloads
+8. Diversification: distinct documents and context tokens with and without collapsing + MMR
+9. Quantization: recall@k, vector memory and latency of scalar/binary quantized search
+
+Each benchmark can run against a live server (--url) or in-process with
+simulated OpenAI/Qdrant latency (--simulate), which needs no API keys.
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import types
+import asyncio
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+DEFAULT_API_URL = "http://localhost:8000"
+BENCHMARK_QUERY = "How can banks modernize their core banking systems?"
+
+def print_header(text):
+    """Print a formatted header."""
+    print("\n" + "=" * 50)
+    print(f" {text}")
+    print("=" * 50)
+
+# ─── SIMULATED BACKENDS ─────────────────────────────────────────────────────────
+class SimulatedOpenAI:
+    """Blocking stand-in for the OpenAI client that sleeps for a fixed latency per call."""
+    def __init__(self, completion_latency: float = 1.0, embedding_latency: float = 0.1):
+        self.completion_latency = completion_latency
+        self.embedding_latency = embedding_latency
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self._complete))
+        self.embeddings = types.SimpleNamespace(create=self._embed)
+        self.models = types.SimpleNamespace(list=lambda: [])
+
+    def _complete(self, messages=None, response_format=None, **kwargs):
+        time.sleep(self.completion_latency)
+        if response_format:
+            content = json.dumps({"topics": ["core banking"], "financial_context": None})
+        else:
+            content = ("Core banking modernization typically starts with a phased roadmap, "
+                       "an API-first integration layer and a clear data migration plan.")
+        return types.SimpleNamespace(
+            choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=content))]
+        )
+
+    def _embed(self, input=None, **kwargs):
+        time.sleep(self.embedding_latency)
+        inputs = input if isinstance(input, list) else [input]
+        return types.SimpleNamespace(
+            data=[types.SimpleNamespace(embedding=[0.01] * 1536) for _ in inputs]
+        )
+
+class SimulatedQdrant:
+    """Blocking stand-in for the Qdrant client that sleeps for a fixed latency per round trip."""
+    def __init__(self, search_latency: float = 0.05, top_score: float = 0.9):
+        self.search_latency = search_latency
+        self.top_score = top_score
+
+    @staticmethod
+    def _payload(i: int, with_payload=True):
+        payload = {
+            "title": f"Core Banking Insight {i}",
+            "url": f"https://www.anaptyss.com/blog/core-banking-{i}/",
+            "text": "Core banking modernization " * 50,
+            "excerpt": "How banks modernize their core platforms " * 5,
+            "content_type": "posts",
+            "content_type_name": "Blog Posts",
+            "industries": ["banking"],
+            "topics": ["digital_transformation"],
+            "custom_fields": {"author": "Anaptyss", "reading_time": "6 min", "featured": False},
+            "categories": ["Banking", "Digital Transformation"],
+            "tags": ["core banking", "modernization", "cloud"],
+        }
+        if isinstance(with_payload, list):
+            payload = {key: payload[key] for key in with_payload if key in payload}
+        return payload
+
+    def _points(self, limit: int, with_payload=True):
+        from qdrant_client.models import ScoredPoint
+        return [
+            ScoredPoint(id=i, version=0, score=self.top_score - i * 0.01, payload=self._payload(i, with_payload))
+            for i in range(limit)
+        ]
+
+    def query_points(self, limit: int = 7, with_payload=True, **kwargs):
+        from qdrant_client.http.models import QueryResponse
+        time.sleep(self.search_latency)
+        return QueryResponse(points=self._points(limit, with_payload))
+
+    def query_batch_points(self, requests=(), **kwargs):
+        from qdrant_client.http.models import QueryResponse
+        time.sleep(self.search_latency)
+        return [
+            QueryResponse(points=self._points(request.limit, True if request.with_payload is None else request.with_payload))
+            for request in requests
+        ]
+
+    def retrieve(self, ids=(), with_payload=True, **kwargs):
+        from qdrant_client.models import Record
+        time.sleep(self.search_latency)
+        return [Record(id=i, payload=self._payload(i, with_payload)) for i in ids]
+
+    def get_collections(self):
+        return types.SimpleNamespace(collections=[types.SimpleNamespace(name="anaptyss_content")])
+
+def load_simulated_app(args):
+    """Import the API with simulated backends injected in place of the real clients."""
+    os.environ.setdefault("OPENAI_API_KEY", "simulated")
+    import main
+
+    main.openai = SimulatedOpenAI(args.completion_latency, args.embedding_latency)
+    main.qdrant = SimulatedQdrant(args.search_latency)
+    main.app.dependency_overrides[main.get_openai_client] = lambda: main.openai
+    main.app.dependency_overrides[main.get_qdrant_client] = lambda: main.qdrant
+    return main
+
+# ─── CONCURRENCY BENCHMARK ──────────────────────────────────────────────────────
+async def _simulated_sessions(main, sessions: int):
+    import httpx
+
+    async def run_session(client):
+        first = await client.post("/chat", json={"message": BENCHMARK_QUERY})
+        sid = first.json()["session_id"]
+        start = time.perf_counter()
+        response = await client.post("/chat", json={"message": BENCHMARK_QUERY, "session_id": sid})
+        response.raise_for_status()
+        return time.perf_counter() - start
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=120) as client:
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(run_session(client) for _ in range(sessions)))
+        return time.perf_counter() - start, list(latencies)
+
+def _live_sessions(api_url: str, sessions: int):
+    def run_session(_):
+        sid = str(uuid.uuid4())
+        requests.post(f"{api_url}/chat", json={"message": BENCHMARK_QUERY, "session_id": sid}, timeout=120)
+        start = time.perf_counter()
+        response = requests.post(f"{api_url}/chat", json={"message": BENCHMARK_QUERY, "session_id": sid}, timeout=120)
+        response.raise_for_status()
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        start = time.perf_counter()
+        latencies = list(pool.map(run_session, range(sessions)))
+        return time.perf_counter() - start, latencies
+
+def benchmark_concurrency(args):
+    """Compare one session's latency with the wall time of N concurrent sessions."""
+    print_header(f"Concurrency: {args.sessions} concurrent sessions")
+
+    if args.simulate:
+        main = load_simulated_app(args)
+        run = lambda n: asyncio.run(_simulated_sessions(main, n))
+        print(f"Simulated latency: completion {args.completion_latency}s, "
+              f"embedding {args.embedding_latency}s, search {args.search_latency}s")
+    else:
+        run = lambda n: _live_sessions(args.url, n)
+        print(f"Target: {args.url}")
+
+    single_wall, _ = run(1)
+    concurrent_wall, latencies = run(args.sessions)
+
+    print(f"Single session:            {single_wall:.2f}s")
+    print(f"{args.sessions} concurrent sessions:   {concurrent_wall:.2f}s wall "
+          f"(median {statistics.median(latencies):.2f}s, max {max(latencies):.2f}s per session)")
+    print(f"Slowdown vs one session:   {concurrent_wall / single_wall:.2f}x "
+          f"(fully serialized would be ~{args.sessions}x)")
+    return concurrent_wall / single_wall
+
+# ─── CONTEXT TOKEN BENCHMARK ────────────────────────────────────────────────────
+SYNTHETIC_USER_MESSAGES = [
+    "We're a mid-sized regional bank looking at our core banking options.",
+    "Our current core is a 20-year-old mainframe system and batch processing is slowing us down.",
+    "How do other banks approach a phased core migration?",
+    "What does an API-first integration layer look like in practice?",
+    "We also struggle with KYC onboarding times for business customers.",
+    "Can automation help with AML transaction monitoring false positives?",
+    "How would a cloud move affect our regulatory reporting?",
+    "What are the risks of running core banking on a public cloud?",
+    "Do you have case studies from banks of our size?",
+    "Our board wants a business case. What ROI have similar projects shown?",
+    "How long does a typical data migration take?",
+    "What team structure do you recommend during the transition?",
+    "How do we keep the legacy and new systems in sync during cutover?",
+    "We are also considering a new payments hub. Should that come first?",
+    "What about real-time payments and ISO 20022 readiness?",
+    "How can analytics improve our credit risk decisions?",
+    "Are there managed services options to run the new platform?",
+    "What security certifications should a vendor have?",
+    "How do you handle change management for branch staff?",
+    "Could we schedule a call to discuss a roadmap for next year?",
+]
+
+def benchmark_context_tokens(args):
+    """Compare whole-history and delta financial context extraction input over 20 turns."""
+    print_header("Context tokens: 20-turn conversation")
+    import tiktoken
+    main = load_simulated_app(args)
+    encoder = tiktoken.get_encoding("cl100k_base")
+    count = lambda text: len(encoder.encode(text))
+
+    reply = "Core banking modernization usually starts with a phased roadmap. " * 15
+    summary = "The user is a regional bank exploring core modernization, compliance automation and cloud. " * 3
+    memory = main.ConversationMemory()
+    user_messages = []
+    legacy_total = delta_total = 0
+
+    print(f"{'turn':>4} {'whole history':>14} {'delta':>8}  mode")
+    for turn, message in enumerate(SYNTHETIC_USER_MESSAGES, 1):
+        memory.add_exchange(message, reply)
+        user_messages.append(message)
+
+        # Whole-history extraction re-sent every user message on every turn
+        legacy = count(" ".join(user_messages)) if turn > 1 else 0
+        full = memory.needs_full_context_analysis()
+        delta = count(message) + count(main.financial_context_input(memory, full))
+        legacy_total += legacy
+        delta_total += delta
+        print(f"{turn:>4} {legacy:>14} {delta:>8}  {'full' if full else 'delta'}")
+
+        # Stand-ins for the extraction result and the background summary fold
+        memory.apply_financial_context({
+            "industry_vertical": "banking",
+            "topics_of_interest": [message.split()[-1].strip("?.")],
+            "potential_use_cases": [],
+            "detected_pain_points": []
+        }, full, 0.9)
+        if memory.unsummarized:
+            memory.summary, memory.unsummarized = summary, []
+
+    print(f"Total input tokens: whole history {legacy_total}, delta {delta_total} "
+          f"({100 * (1 - delta_total / legacy_total):.0f}% saved)")
+    return legacy_total, delta_total
+
+# ─── SESSION MEMORY BENCHMARK ───────────────────────────────────────────────────
+def build_synthetic_session(main, turns: int):
+    """Build a ConversationMemory the way a chat of the given length fills it."""
+    memory = main.ConversationMemory()
+    reply = "Core banking modernization usually starts with a phased roadmap and an integration layer. " * 16
+    for turn in range(turns):
+        message = SYNTHETIC_USER_MESSAGES[turn % len(SYNTHETIC_USER_MESSAGES)]
+        memory.add_exchange(message, f"{reply}({turn})")
+        memory.record_analysis(
+            {"positive": 0.6, "negative": 0.1, "neutral": 0.3},
+            [f"topic {turn % 7}", "core banking"]
+        )
+        memory.apply_financial_context({
+            "industry_vertical": "banking",
+            "topics_of_interest": [f"topic {turn % 7}"],
+            "potential_use_cases": ["core migration"],
+            "detected_pain_points": ["legacy batch processing"]
+        }, False, 0.9)
+        memory.last_source_ids = list(range(turn, turn + 7))
+        # Stand-in for the background summary fold
+        if memory.unsummarized:
+            memory.summary = "The user is a regional bank exploring core modernization and compliance automation. " * 4
+            memory.unsummarized = []
+    return memory
+
+def benchmark_session_memory(args):
+    """Measure the resident size of in-memory sessions and how many fit per GB."""
+    print_header(f"Session memory: {args.memory_sessions} sessions of {args.turns} turns")
+    import tracemalloc
+    main = load_simulated_app(args)
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    sessions = [build_synthetic_session(main, args.turns) for _ in range(args.memory_sessions)]
+    per_session = (tracemalloc.get_traced_memory()[0] - before) / len(sessions)
+    tracemalloc.stop()
+
+    sample = sessions[0]
+    text_bytes = sum(len(msg.content) for msg in sample.messages) + len(sample.summary)
+    print(f"Resident bytes per session: {per_session:,.0f} "
+          f"({text_bytes:,} of them message and summary text)")
+    print(f"approx_size() estimate:     {sample.approx_size():,}")
+    print(f"Serialized (shared stores): {len(sample.to_bytes()):,}")
+    print(f"Sessions per GB:            {(1 << 30) / per_session:,.0f}")
+    return per_session
+
+# ─── SESSION STORE ROUND TRIP ──────────────────────────────────────────────────
+def session_round_trip(store, sessions, repeat: int = 3):
+    """
+    Save, load, index and delete sessions through a store and check nothing is lost or left behind.
+
+    Returns:
+        (mean save ms, mean get ms, whether every check passed)
+    """
+    ids = [f"benchmark-{uuid.uuid4()}" for _ in sessions]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for sid, memory in zip(ids, sessions):
+            store.save(sid, memory)
+    save_ms = (time.perf_counter() - start) / (repeat * len(ids)) * 1000
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        loaded = [store.get(sid) for sid in ids]
+    get_ms = (time.perf_counter() - start) / (repeat * len(ids)) * 1000
+
+    intact = all(
+        copy is not None and copy.to_bytes() == memory.to_bytes()
+        for copy, memory in zip(loaded, sessions)
+    )
+    for i, sid in enumerate(ids):
+        store.index_email(f"lead{i}@bank.example", sid)
+    intact = intact and all(store.find_by_email(f"lead{i}@bank.example") == sid for i, sid in enumerate(ids))
+
+    intact = intact and all(store.delete(sid) for sid in ids)
+    intact = intact and all(
+        store.get(sid) is None and store.find_by_email(f"lead{i}@bank.example") is None
+        for i, sid in enumerate(ids)
+    )
+    intact = intact and not set(ids) & set(store.session_ids())
+    return save_ms, get_ms, intact
+
+def benchmark_session_stores(args):
+    """Round-trip sessions through the shared SQLite and Redis stores: latency and integrity."""
+    print_header(f"Session stores: {args.memory_sessions} sessions of {args.turns} turns")
+    import tempfile
+    from session_store import RedisSessionStore, SQLiteSessionStore
+    main = load_simulated_app(args)
+    sessions = [build_synthetic_session(main, args.turns) for _ in range(args.memory_sessions)]
+    encode, decode = main.ConversationMemory.to_bytes, main.ConversationMemory.from_bytes
+
+    stores = {}
+    with tempfile.TemporaryDirectory() as directory:
+        stores["sqlite"] = SQLiteSessionStore(os.path.join(directory, "sessions.db"), encode, decode)
+        if args.redis_url:
+            stores["redis"] = RedisSessionStore(encode, decode, url=args.redis_url)
+        else:
+            try:
+                import fakeredis
+                stores["fakeredis"] = RedisSessionStore(encode, decode, client=fakeredis.FakeRedis())
+            except ImportError:
+                print("Redis: skipped (pass --redis-url or pip install fakeredis)")
+
+        results = {}
+        for name, store in stores.items():
+            save_ms, get_ms, intact = session_round_trip(store, sessions)
+            results[name] = {"save_ms": save_ms, "get_ms": get_ms, "intact": intact}
+            print(f"{name:>9}: save {save_ms:.3f}ms, get {get_ms:.3f}ms per session, "
+                  f"round trip {'intact' if intact else 'CORRUPTED'}")
+    return results
+
+# ─── SESSION LOCK STRESS TEST ───────────────────────────────────────────────────
+async def _stress_sessions(main, requests: int):
+    import httpx
+
+    async def post(client, sid, i):
+        response = await client.post("/chat", json={"message": f"{BENCHMARK_QUERY} ({i})", "session_id": sid})
+        response.raise_for_status()
+
+    async def new_session(client):
+        return (await client.post("/chat", json={"message": BENCHMARK_QUERY})).json()["session_id"]
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=300) as client:
+        shared = await new_session(client)
+        start = time.perf_counter()
+        await asyncio.gather(*(post(client, shared, i) for i in range(requests)))
+        shared_wall = time.perf_counter() - start
+
+        distinct = [await new_session(client) for _ in range(requests)]
+        start = time.perf_counter()
+        await asyncio.gather(*(post(client, sid, i) for i, sid in enumerate(distinct)))
+        distinct_wall = time.perf_counter() - start
+
+        # Let the last analytics jobs finish before inspecting the sessions
+        while main.analysis_futures:
+            await asyncio.sleep(0.05)
+        return shared, shared_wall, distinct, distinct_wall
+
+def benchmark_session_locks(args):
+    """Fire concurrent requests at one shared session and at distinct sessions, then check session integrity."""
+    print_header(f"Session locks: {args.sessions} concurrent requests, shared vs distinct sessions")
+    main = load_simulated_app(args)
+
+    shared, shared_wall, distinct, distinct_wall = asyncio.run(_stress_sessions(main, args.sessions))
+
+    memory = main.sessions.get(shared)
+    roles = [msg.role for msg in memory.messages]
+    user_messages = [msg.content for msg in memory.messages if msg.role == "user"]
+    intact = (
+        memory.interaction_count == args.sessions
+        and roles == ["user", "assistant"] * (len(roles) // 2)
+        and len(set(user_messages)) == len(user_messages)
+        and all(main.sessions.get(sid).interaction_count == 1 for sid in distinct)
+    )
+
+    print(f"Shared session:     {shared_wall:.2f}s wall for {args.sessions} requests (serialized)")
+    print(f"Distinct sessions:  {distinct_wall:.2f}s wall for {args.sessions} requests (parallel)")
+    print(f"Lock metrics:       {main.session_locks.stats()}")
+    print(f"Session state:      {'intact' if intact else 'CORRUPTED'} "
+          f"({memory.interaction_count} turns recorded on the shared session)")
+    return intact
+
+# ─── BATCHED SEARCH BENCHMARK ───────────────────────────────────────────────────
+FINANCIAL_QUERY = "How does core banking modernization support Basel and AML compliance?"
+
+def sequential_enhanced_search(main, query_vector, financial_terms, qdrant_client, limit: int = 7):
+    """The previous search path: unfiltered search, then a filtered search if the results are weak."""
+    search_results = qdrant_client.query_points(
+        collection_name=main.COLLECTION, query=query_vector, limit=limit, score_threshold=0.7
+    ).points
+    if financial_terms and (len(search_results) < 3 or max([r.score for r in search_results] or [0]) < 0.75):
+        filters = main.create_financial_filters(financial_terms)
+        if filters:
+            filtered_results = qdrant_client.query_points(
+                collection_name=main.COLLECTION, query=query_vector, query_filter=filters,
+                limit=limit, score_threshold=0.65
+            ).points
+            seen_ids = set(r.id for r in search_results)
+            combined_results = list(search_results)
+            for result in filtered_results:
+                if result.id not in seen_ids:
+                    combined_results.append(result)
+                    seen_ids.add(result.id)
+            combined_results.sort(key=lambda x: x.score, reverse=True)
+            return combined_results[:limit]
+    return search_results
+
+def benchmark_batched_search(args):
+    """Compare the batched search with the previous sequential path for a query with financial terms."""
+    print_header("Batched search: one round trip vs sequential searches")
+    import random
+    main = load_simulated_app(args)
+    terms = main.extract_financial_terms(FINANCIAL_QUERY)
+    print(f"Financial terms: {terms}")
+
+    if args.qdrant_url:
+        from qdrant_client import QdrantClient
+        client = QdrantClient(url=args.qdrant_url)
+        scenarios = [("live", client)]
+        print(f"Target: {args.qdrant_url}")
+    else:
+        # Strong initial results need only one search; weak ones trigger the filtered search
+        scenarios = [
+            ("strong results", SimulatedQdrant(args.search_latency, top_score=0.9)),
+            ("weak results", SimulatedQdrant(args.search_latency, top_score=0.72)),
+        ]
+        print(f"Simulated round trip: {args.search_latency * 1000:.0f}ms")
+
+    rng = random.Random(0)
+    vectors = [[rng.uniform(-1, 1) for _ in range(1536)] for _ in range(args.iterations)]
+
+    def mean_ms(search, client):
+        start = time.perf_counter()
+        for vector in vectors:
+            search(vector, terms, client)
+        return (time.perf_counter() - start) / len(vectors) * 1000
+
+    results = {}
+    for name, client in scenarios:
+        sequential = mean_ms(lambda v, t, c: sequential_enhanced_search(main, v, t, c), client)
+        batched = mean_ms(lambda v, t, c: main._enhanced_search(v, t, c, 7), client)
+        results[name] = (sequential, batched)
+        print(f"{name:>15}: sequential {sequential:.1f}ms, batched {batched:.1f}ms per query")
+    return results
+
+# ─── PAYLOAD PROJECTION BENCHMARK ──────────────────────────────────────────────
+def benchmark_payload_projection(args):
+    """Compare full search payloads with projected payloads plus one retrieve of the prompt text."""
+    print_header("Payload projection: full vs projected search payloads")
+    from typing import List
+    from pydantic import TypeAdapter
+    from qdrant_client.models import Record, ScoredPoint
+    main = load_simulated_app(args)
+    # Hybrid search returns the vector candidates plus the keyword hits; 7 reach the prompt
+    limit = 7
+    candidates = limit * 2 + main.LEXICAL_CANDIDATES
+    print(f"Candidates per query: {candidates}, hydrated: {limit}")
+
+    if args.qdrant_url:
+        import random
+        from qdrant_client import QdrantClient
+        client = QdrantClient(url=args.qdrant_url)
+        rng = random.Random(0)
+        vectors = [[rng.uniform(-1, 1) for _ in range(1536)] for _ in range(args.iterations)]
+
+        def mean_ms(search):
+            start = time.perf_counter()
+            for vector in vectors:
+                search(vector)
+            return (time.perf_counter() - start) / len(vectors) * 1000
+
+        def projected_search(vector):
+            hits = client.query_points(
+                collection_name=main.COLLECTION, query=vector, limit=candidates,
+                with_payload=main.SEARCH_PAYLOAD_FIELDS
+            ).points
+            return main.hydrate_payloads(hits[:limit], client)
+
+        full = mean_ms(lambda vector: client.query_points(
+            collection_name=main.COLLECTION, query=vector, limit=candidates, with_payload=True
+        ))
+        projected = mean_ms(projected_search)
+        print(f"Target: {args.qdrant_url}")
+        print(f"Full payloads: {full:.1f}ms, projected + retrieve: {projected:.1f}ms per query")
+        return {"full_ms": full, "projected_ms": projected}
+
+    simulated = SimulatedQdrant()
+    scored_points = TypeAdapter(List[ScoredPoint])
+    records = TypeAdapter(List[Record])
+    full = scored_points.dump_json(simulated._points(candidates))
+    projected = scored_points.dump_json(simulated._points(candidates, main.SEARCH_PAYLOAD_FIELDS))
+    hydrated = records.dump_json([
+        Record(id=i, payload=simulated._payload(i, main.PROMPT_PAYLOAD_FIELDS)) for i in range(limit)
+    ])
+
+    def parse_ms(adapter, data, repeat=200):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            adapter.validate_json(data)
+        return (time.perf_counter() - start) / repeat * 1000
+
+    full_ms = parse_ms(scored_points, full)
+    projected_ms = parse_ms(scored_points, projected) + parse_ms(records, hydrated)
+    projected_bytes = len(projected) + len(hydrated)
+    print(f"Full payloads:        {len(full) / 1024:.1f}KB, {full_ms:.2f}ms to deserialize")
+    print(f"Projected + retrieve: {projected_bytes / 1024:.1f}KB, {projected_ms:.2f}ms to deserialize")
+    print(f"Bytes saved: {(1 - projected_bytes / len(full)) * 100:.0f}%")
+    return {"full_bytes": len(full), "projected_bytes": projected_bytes, "full_ms": full_ms, "projected_ms": projected_ms}
+
+# ─── DIVERSIFICATION BENCHMARK ─────────────────────────────────────────────────
+def build_candidate_hits(documents: int = 8, chunks: int = 3, dimensions: int = 1536, seed: int = 0):
+    """Ranked hits where each document contributes several near-duplicate chunks."""
+    import numpy as np
+    from qdrant_client.models import ScoredPoint
+    rng = np.random.default_rng(seed)
+    hits = []
+    for doc in range(documents):
+        base = rng.standard_normal(dimensions)
+        for chunk in range(chunks):
+            hits.append(ScoredPoint(
+                id=len(hits),
+                version=0,
+                score=0.9 - doc * 0.01 - chunk * 0.002,
+                vector=(base + 0.3 * rng.standard_normal(dimensions)).tolist(),
+                payload={
+                    "doc_id": f"post-{doc}",
+                    "title": f"Core Banking Insight {doc}",
+                    "url": f"https://www.anaptyss.com/blog/core-banking-{doc}/",
+                    "text": f"Core banking modernization, part {chunk} of insight {doc}. " * 20,
+                    "content_type": "posts",
+                }
+            ))
+    # Chunks of the strongest documents rank next to each other
+    hits.sort(key=lambda hit: hit.score, reverse=True)
+    return hits
+
+def benchmark_diversification(args):
+    """Compare the top hits by rank with document collapsing + MMR over the same candidates."""
+    print_header("Diversification: document collapsing + MMR")
+    from diversification import collapse_by_document, document_key, mmr_select
+    main = load_simulated_app(args)
+    limit = 7
+    candidates = build_candidate_hits()[:limit * main.SEARCH_CANDIDATES_PER_RESULT]
+
+    def describe(name, hits):
+        documents = len({document_key(hit) for hit in hits})
+        tokens = sum(main.prompt_assembler.count(main.format_response(hit.payload, include_metadata=False)) for hit in hits)
+        print(f"{name:>14}: {len(hits)} hits from {documents} documents, {tokens} context tokens")
+        return {"hits": len(hits), "documents": documents, "tokens": tokens}
+
+    ranked = describe("top by rank", candidates[:limit])
+    collapsed = collapse_by_document(candidates, main.MAX_CHUNKS_PER_DOCUMENT)
+    diversified = describe("collapse + MMR", mmr_select(collapsed, limit, main.MMR_DIVERSITY))
+    return {"ranked": ranked, "diversified": diversified}
+
+# ─── QUANTIZATION BENCHMARK ────────────────────────────────────────────────────
+QUANTIZATION_MODES = ("none", "scalar", "binary")
+
+def vector_memory_bytes(mode: str, points: int, dimensions: int) -> int:
+    """RAM held by the vectors searched first: float32 originals, int8 codes or sign bits."""
+    return points * {"none": dimensions * 4, "scalar": dimensions, "binary": dimensions // 8}[mode]
+
+def exact_top_k(corpus, queries, k: int):
+    import numpy as np
+    scores = queries @ corpus.T
+    return [set(np.argsort(-row)[:k]) for row in scores]
+
+def quantize_corpus(corpus, mode: str):
+    """The vectors searched first in a mode: int8 codes (dequantized), packed sign bits or the originals."""
+    import numpy as np
+    if mode == "scalar":
+        # int8 codes over the 0.99 quantile range, as with quantile=0.99
+        low, high = np.quantile(corpus, [0.005, 0.995])
+        scale = (high - low) / 255
+        codes = np.clip(np.round((corpus - low) / scale), 0, 255).astype(np.uint8)
+        return codes.astype(np.float32) * scale + low
+    if mode == "binary":
+        return np.packbits(corpus > 0, axis=1)
+    return corpus
+
+def emulated_quantized_top_k(corpus, queries, mode: str, k: int, oversampling: float, rescore: bool = True,
+                             quantized=None):
+    """Top-k the way Qdrant serves a quantized collection: approximate candidates, then exact rescoring."""
+    import numpy as np
+    candidates = max(k, int(k * oversampling)) if rescore else k
+    if quantized is None:
+        quantized = quantize_corpus(corpus, mode)
+    if mode == "binary":
+        query_bits = np.packbits(queries > 0, axis=1)
+        # Fewer differing bits is closer
+        approximate = -np.stack([np.unpackbits(quantized ^ row, axis=1).sum(axis=1) for row in query_bits]).astype(np.float32)
+    else:
+        approximate = queries @ quantized.T
+
+    results = []
+    for i, row in enumerate(approximate):
+        shortlist = np.argpartition(-row, candidates - 1)[:candidates]
+        if rescore:
+            shortlist = shortlist[np.argsort(-(corpus[shortlist] @ queries[i]))]
+        else:
+            shortlist = shortlist[np.argsort(-row[shortlist])]
+        results.append(set(shortlist[:k]))
+    return results
+
+def recall_at_k(results, baseline) -> float:
+    return statistics.mean(len(found & expected) / len(expected) for found, expected in zip(results, baseline))
+
+def benchmark_quantization(args):
+    """Recall@k against the unquantized baseline, with vector memory and search latency per mode."""
+    print_header("Quantization: recall, memory and latency")
+    import numpy as np
+    from debug_chatbot import FINANCIAL_TEST_QUERIES
+    k = args.recall_k
+    queries_text = [test["query"] for test in FINANCIAL_TEST_QUERIES]
+
+    if not args.qdrant_url:
+        # Emulated with NumPy on clustered synthetic vectors. Latency is a brute-force
+        # scan per query, so it only compares the modes; Qdrant's HNSW needs a live server.
+        rng = np.random.default_rng(0)
+        centers = rng.standard_normal((50, 1536))
+        corpus = centers[rng.integers(0, 50, 3000)] + 0.8 * rng.standard_normal((3000, 1536))
+        queries = corpus[rng.integers(0, 3000, len(queries_text) * 20)] + 0.8 * rng.standard_normal((len(queries_text) * 20, 1536))
+        corpus = (corpus / np.linalg.norm(corpus, axis=1, keepdims=True)).astype(np.float32)
+        queries = (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+        print(f"Emulated: {len(corpus)} synthetic points, {len(queries)} synthetic queries, recall@{k}, "
+              f"oversampling {args.oversampling} (pass --qdrant-url for the test queries and Qdrant latency)")
+        baseline = exact_top_k(corpus, queries, k)
+        results = {}
+        for mode in QUANTIZATION_MODES:
+            quantized = quantize_corpus(corpus, mode)
+            latencies, found = [], []
+            for i in range(len(queries)):
+                start = time.perf_counter()
+                found.extend(emulated_quantized_top_k(
+                    corpus, queries[i:i + 1], mode, k, args.oversampling, quantized=quantized
+                ))
+                latencies.append((time.perf_counter() - start) * 1000)
+            recall = recall_at_k(found, baseline)
+            unrescored = recall_at_k(emulated_quantized_top_k(
+                corpus, queries, mode, k, args.oversampling, rescore=False, quantized=quantized
+            ), baseline)
+            memory = vector_memory_bytes(mode, len(corpus), corpus.shape[1])
+            latency = statistics.median(latencies)
+            results[mode] = {
+                "recall": recall, "recall_without_rescore": unrescored, "memory_bytes": memory, "median_ms": latency
+            }
+            print(f"{mode:>7}: recall@{k} {recall:.3f} (without rescoring {unrescored:.3f}), "
+                  f"vectors in RAM {memory / 1e6:.1f}MB, median {latency:.1f}ms")
+        return results
+
+    from openai import OpenAI
+    from qdrant_client import QdrantClient, models
+    from collection_schema import quantization_config
+    from embedding_cache import embedding_cache
+    main = load_simulated_app(args)
+    client = QdrantClient(url=args.qdrant_url)
+
+    ids, vectors = [], []
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=main.COLLECTION, limit=256, offset=offset, with_payload=False, with_vectors=True
+        )
+        ids.extend(point.id for point in points)
+        vectors.extend(point.vector for point in points)
+        if offset is None:
+            break
+    corpus = np.asarray(vectors, dtype=np.float32)
+    corpus /= np.linalg.norm(corpus, axis=1, keepdims=True)
+    queries = np.asarray(embedding_cache.embed_many(OpenAI(), queries_text), dtype=np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    baseline = [{ids[row] for row in rows} for rows in exact_top_k(corpus, queries, k)]
+    print(f"Target: {args.qdrant_url}, {len(ids)} points of {main.COLLECTION}, "
+          f"{len(queries_text)} test queries, recall@{k}, oversampling {args.oversampling}")
+
+    results = {}
+    for mode in QUANTIZATION_MODES:
+        name = f"{main.COLLECTION}_bench_{mode}"
+        quantized = mode != "none"
+        if name in [c.name for c in client.get_collections().collections]:
+            client.delete_collection(collection_name=name)
+        client.create_collection(
+            collection_name=name,
+            vectors_config=models.VectorParams(size=corpus.shape[1], distance=models.Distance.COSINE, on_disk=quantized),
+            quantization_config=quantization_config(mode) if quantized else None
+        )
+        try:
+            for start in range(0, len(ids), 256):
+                client.upsert(collection_name=name, points=models.Batch(
+                    ids=ids[start:start + 256], vectors=corpus[start:start + 256].tolist()
+                ))
+            while client.get_collection(collection_name=name).status != models.CollectionStatus.GREEN:
+                time.sleep(0.5)
+
+            search_params = models.SearchParams(
+                quantization=models.QuantizationSearchParams(rescore=True, oversampling=args.oversampling)
+            ) if quantized else None
+            latencies, found = [], []
+            for _ in range(args.iterations):
+                found = []
+                for query in queries:
+                    start = time.perf_counter()
+                    hits = client.query_points(
+                        collection_name=name, query=query.tolist(), limit=k, search_params=search_params
+                    ).points
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    found.append({hit.id for hit in hits})
+        finally:
+            client.delete_collection(collection_name=name)
+
+        recall = recall_at_k(found, baseline)
+        memory = vector_memory_bytes(mode, len(ids), corpus.shape[1])
+        latency = statistics.median(latencies)
+        results[mode] = {"recall": recall, "memory_bytes": memory, "median_ms": latency}
+        print(f"{mode:>7}: recall@{k} {recall:.3f}, vectors in RAM {memory / 1e6:.1f}MB, median {latency:.1f}ms")
+    return results
+
+def main():
+    """Run the requested benchmarks."""
+    parser = argparse.ArgumentParser(description="Performance benchmarks for the Anaptyss Chat API")
+    parser.add_argument("--url", default=DEFAULT_API_URL, help="Base URL of a running API server")
+    parser.add_argument("--simulate", action="store_true", help="Run in-process with simulated OpenAI/Qdrant latency")
+    parser.add_argument("--completion-latency", type=float, default=1.0, help="Simulated chat completion latency (s)")
+    parser.add_argument("--embedding-latency", type=float, default=0.1, help="Simulated embedding latency (s)")
+    parser.add_argument("--search-latency", type=float, default=0.05, help="Simulated Qdrant search latency (s)")
+    parser.add_argument("--concurrency", action="store_true", help="Benchmark N concurrent chat sessions")
+    parser.add_argument("--sessions", type=int, default=10, help="Number of concurrent sessions")
+    parser.add_argument("--context-tokens", action="store_true", help="Benchmark financial context extraction tokens")
+    parser.add_argument("--session-memory", action="store_true", help="Measure bytes per in-memory session")
+    parser.add_argument("--memory-sessions", type=int, default=1000, help="Sessions built for the memory measurement")
+    parser.add_argument("--turns", type=int, default=6, help="Turns per session for the memory measurement")
+    parser.add_argument("--session-stores", action="store_true", help="Round-trip sessions through the shared stores")
+    parser.add_argument("--redis-url", help="Redis server for the session store round trip (default: fakeredis)")
+    parser.add_argument("--session-locks", action="store_true", help="Stress test per-session locking")
+    parser.add_argument("--batched-search", action="store_true", help="Compare batched and sequential Qdrant searches")
+    parser.add_argument("--payload-projection", action="store_true", help="Compare full and projected search payloads")
+    parser.add_argument("--diversification", action="store_true", help="Compare ranked and diversified search hits")
+    parser.add_argument("--quantization", action="store_true", help="Measure recall, memory and latency of quantized search")
+    parser.add_argument("--recall-k", type=int, default=10, help="k for recall@k in the quantization benchmark")
+    parser.add_argument("--oversampling", type=float, default=2.0, help="Candidates per result before rescoring")
+    parser.add_argument("--qdrant-url", help="Run the search benchmarks against this Qdrant server")
+    parser.add_argument("--iterations", type=int, default=20, help="Queries per search benchmark")
+
+    args = parser.parse_args()
+
+    benchmarks = {
+        "concurrency": benchmark_concurrency,
+        "context_tokens": benchmark_context_tokens,
+        "session_memory": benchmark_session_memory,
+        "session_stores": benchmark_session_stores,
+        "session_locks": benchmark_session_locks,
+        "batched_search": benchmark_batched_search,
+        "payload_projection": benchmark_payload_projection,
+        "diversification": benchmark_diversification,
+        "quantization": benchmark_quantization,
+    }
+
+    # If no specific benchmarks are requested, run all of them
+    selected = [name for name in benchmarks if getattr(args, name)] or list(benchmarks)
+    for name in selected:
+        benchmarks[name](args)
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,240 @@
+"""
+Declarative schema for the Qdrant collections.
+
+Every ingestion entry point calls ``ensure_collection()`` instead of
+creating collections ad hoc. It creates a missing collection from its
+schema, or migrates an existing one by diffing the live configuration
+against the schema: HNSW, optimizer and quantization settings are updated in
+place and missing payload indexes are created. Running it again changes nothing.
+
+Each collection records the schema ``version`` it was last brought in line
+with in its Qdrant metadata (``schema_version``). Bump the version when a
+schema changes; the next run migrates the collection and records the new
+version. A collection recorded at a newer version than the running code's
+schema is left untouched, so an older deployment can't roll back its
+settings. Vector size and distance can't be migrated in place; a mismatch
+raises and the collection has to be recreated and re-ingested.
+
+Run ``python collection_schema.py [collection ...]`` to apply the schema
+without ingesting (start_chatbot.sh does this on first start).
+"""
+
+import sys
+import logging
+from typing import Any, Dict, List, Optional
+
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as rest_models
+
+from config import VECTOR_QUANTIZATION
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATION_MODES = ("", "scalar", "binary")
+
+def quantization_config(mode: str) -> Any:
+    """
+    Qdrant quantization config for a VECTOR_QUANTIZATION mode.
+
+    Quantized vectors stay in RAM; the originals are only read to rescore
+    the oversampled candidates, so they can live on disk.
+
+    Raises:
+        ValueError: Unknown mode
+    """
+    if mode == "scalar":
+        return rest_models.ScalarQuantization(
+            scalar=rest_models.ScalarQuantizationConfig(type=rest_models.ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    if mode == "binary":
+        return rest_models.BinaryQuantization(binary=rest_models.BinaryQuantizationConfig(always_ram=True))
+    if mode:
+        raise ValueError(f"Unknown quantization mode '{mode}', expected one of {QUANTIZATION_MODES}")
+    return None
+
+def _quantization_mode(config: Any) -> str:
+    if isinstance(config, rest_models.ScalarQuantization):
+        return "scalar"
+    if isinstance(config, rest_models.BinaryQuantization):
+        return "binary"
+    return ""
+
+# Website content chunks (ingest.py, ingest_json.py, ingest_sitemap.py).
+# A few thousand points: a denser graph and a larger build beam are cheap at
+# this size and keep recall high; two segments keep per-search overhead low.
+CONTENT_SCHEMA = {
+    "version": 1,
+    "vector_size": 1536,
+    "distance": rest_models.Distance.COSINE,
+    "hnsw": {"m": 32, "ef_construct": 256},
+    "optimizers": {"default_segment_number": 2, "indexing_threshold": 10000},
+    "quantization": VECTOR_QUANTIZATION,
+    "payload_indexes": {
+        "content_type": rest_models.PayloadSchemaType.KEYWORD,
+        "content_type_name": rest_models.PayloadSchemaType.KEYWORD,
+        "industries": rest_models.PayloadSchemaType.KEYWORD,
+        "topics": rest_models.PayloadSchemaType.KEYWORD,
+        "doc_id": rest_models.PayloadSchemaType.KEYWORD,
+        "url": rest_models.PayloadSchemaType.KEYWORD,
+    },
+}
+
+COLLECTION_SCHEMAS: Dict[str, Dict[str, Any]] = {
+    "anaptyss_content": CONTENT_SCHEMA,
+    # ingest_sitemapEnhanced-BasedonSourceCode.py
+    "anaptyss_enhanced_content": {
+        **CONTENT_SCHEMA,
+        "payload_indexes": {
+            **CONTENT_SCHEMA["payload_indexes"],
+            "publication_date": rest_models.PayloadSchemaType.DATETIME,
+        },
+    },
+    # Uploaded documents (document_manager.py)
+    "anaptyss_enterprise_documents": {
+        "version": 1,
+        "vector_size": 1536,
+        "distance": rest_models.Distance.COSINE,
+        "hnsw": {"m": 16, "ef_construct": 200},
+        "optimizers": {"default_segment_number": 2, "indexing_threshold": 10000},
+        "quantization": VECTOR_QUANTIZATION,
+        "payload_indexes": {
+            "document_id": rest_models.PayloadSchemaType.KEYWORD,
+            "document_type": rest_models.PayloadSchemaType.KEYWORD,
+        },
+    },
+}
+
+# Collection metadata key holding the schema version
+VERSION_KEY = "schema_version"
+
+def _stored_version(info: Any) -> Optional[int]:
+    """Schema version recorded in a collection's metadata; None for collections created before versioning."""
+    version = (info.config.metadata or {}).get(VERSION_KEY)
+    return int(version) if version is not None else None
+
+def _create(client: QdrantClient, collection: str, schema: Dict[str, Any]):
+    client.create_collection(
+        collection_name=collection,
+        vectors_config=rest_models.VectorParams(
+            size=schema["vector_size"],
+            distance=schema["distance"],
+            on_disk=bool(schema["quantization"])
+        ),
+        hnsw_config=rest_models.HnswConfigDiff(**schema["hnsw"]),
+        optimizers_config=rest_models.OptimizersConfigDiff(**schema["optimizers"]),
+        quantization_config=quantization_config(schema["quantization"]),
+        metadata={VERSION_KEY: schema["version"]}
+    )
+
+def _migrate(client: QdrantClient, collection: str, schema: Dict[str, Any], info: Any) -> List[str]:
+    """Bring an existing collection in line with its schema; returns the changes made."""
+    vectors = info.config.params.vectors
+    if isinstance(vectors, rest_models.VectorParams) and (
+        vectors.size != schema["vector_size"] or vectors.distance != schema["distance"]
+    ):
+        raise ValueError(
+            f"Collection '{collection}' has {vectors.size}-dim {vectors.distance} vectors, the schema expects "
+            f"{schema['vector_size']}-dim {schema['distance']}; recreate it and re-ingest"
+        )
+
+    changes = []
+    hnsw = {key: value for key, value in schema["hnsw"].items() if getattr(info.config.hnsw_config, key) != value}
+    optimizers = {
+        key: value for key, value in schema["optimizers"].items()
+        if getattr(info.config.optimizer_config, key) != value
+    }
+    quantization = schema["quantization"]
+    requantize = _quantization_mode(info.config.quantization_config) != quantization
+    # Original vectors go to disk exactly when quantized copies serve the searches
+    move_vectors = isinstance(vectors, rest_models.VectorParams) and bool(vectors.on_disk) != bool(quantization)
+    if hnsw or optimizers or requantize or move_vectors:
+        client.update_collection(
+            collection_name=collection,
+            hnsw_config=rest_models.HnswConfigDiff(**hnsw) if hnsw else None,
+            optimizers_config=rest_models.OptimizersConfigDiff(**optimizers) if optimizers else None,
+            quantization_config=(quantization_config(quantization) or rest_models.Disabled.DISABLED) if requantize else None,
+            vectors_config={"": rest_models.VectorParamsDiff(on_disk=bool(quantization))} if move_vectors else None
+        )
+        changes.extend(f"{key}={value}" for key, value in {**hnsw, **optimizers}.items())
+        if requantize:
+            changes.append(f"quantization={quantization or 'off'}")
+        if move_vectors:
+            changes.append(f"vectors on_disk={bool(quantization)}")
+
+    existing = info.payload_schema or {}
+    for field, field_type in schema["payload_indexes"].items():
+        if field in existing and existing[field].data_type == field_type:
+            continue
+        if field in existing:
+            # Wrong type: drop it so it can be rebuilt
+            client.delete_payload_index(collection_name=collection, field_name=field, wait=True)
+        client.create_payload_index(collection_name=collection, field_name=field, field_schema=field_type, wait=True)
+        changes.append(f"index {field} ({field_type.value})")
+
+    stored = _stored_version(info)
+    if stored != schema["version"]:
+        client.update_collection(collection_name=collection, metadata={VERSION_KEY: schema["version"]})
+        changes.append(f"schema_version {stored} -> {schema['version']}")
+    return changes
+
+def ensure_collection(client: QdrantClient, collection: str) -> Dict[str, Any]:
+    """
+    Create or migrate a collection so it matches its schema.
+
+    Args:
+        client: Qdrant client
+        collection: Name of a collection in COLLECTION_SCHEMAS
+
+    Returns:
+        Summary with the schema version, the version the collection was
+        recorded at before (None if created now or never recorded), whether it
+        was created, and the changes applied to an existing one
+
+    Raises:
+        KeyError: The collection has no schema
+        ValueError: The vector size or distance differs from the schema
+    """
+    schema = COLLECTION_SCHEMAS[collection]
+    existing = [c.name for c in client.get_collections().collections]
+    if collection not in existing:
+        _create(client, collection, schema)
+        for field, field_type in schema["payload_indexes"].items():
+            client.create_payload_index(collection_name=collection, field_name=field, field_schema=field_type, wait=True)
+        logger.info(f"Created collection '{collection}' (schema v{schema['version']})")
+        return {
+            "collection": collection, "version": schema["version"], "previous_version": None,
+            "created": True, "changes": []
+        }
+
+    info = client.get_collection(collection_name=collection)
+    stored = _stored_version(info)
+    if stored is not None and stored > schema["version"]:
+        logger.warning(
+            f"Collection '{collection}' is at schema v{stored}, newer than this code's v{schema['version']}; "
+            f"leaving it unchanged"
+        )
+        return {
+            "collection": collection, "version": stored, "previous_version": stored,
+            "created": False, "changes": []
+        }
+
+    changes = _migrate(client, collection, schema, info)
+    if changes:
+        logger.info(
+            f"Migrated collection '{collection}' from schema v{stored if stored is not None else '?'} "
+            f"to v{schema['version']}: {', '.join(changes)}"
+        )
+    else:
+        logger.info(f"Collection '{collection}' matches schema v{schema['version']}")
+    return {
+        "collection": collection, "version": schema["version"], "previous_version": stored,
+        "created": False, "changes": changes
+    }
+
+if __name__ == "__main__":
+    from config import QDRANT_URL
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    qdrant = QdrantClient(url=QDRANT_URL)
+    for name in sys.argv[1:] or list(COLLECTION_SCHEMAS):
+        ensure_collection(qdrant, name)
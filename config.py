@@ -4,6 +4,102 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# Relative default paths of local state files would depend on the working
+# directory the API or an ingestion script was started from
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 QDRANT_URL       = os.getenv("QDRANT_URL")
 SITE_URL         = os.getenv("SITE_URL", "https://techposts.org")
+
+# Per-message analysis stage (sentiment, topics, intent, preferences, financial context)
+ANALYSIS_TIMEOUT     = float(os.getenv("ANALYSIS_TIMEOUT", "8"))
+ANALYSIS_MAX_WORKERS = int(os.getenv("ANALYSIS_MAX_WORKERS", "16"))
+
+# Background queue for turn analytics that run after the reply is sent
+BACKGROUND_WORKERS    = int(os.getenv("BACKGROUND_WORKERS", "4"))
+BACKGROUND_QUEUE_SIZE = int(os.getenv("BACKGROUND_QUEUE_SIZE", "1000"))
+
+# Thread pool for blocking OpenAI/Qdrant/SMTP calls made from async request handlers
+IO_MAX_WORKERS = int(os.getenv("IO_MAX_WORKERS", "32"))
+
+# How long a turn waits (overlapped with retrieval) for the previous turn's analytics
+PENDING_ANALYSIS_WAIT = float(os.getenv("PENDING_ANALYSIS_WAIT", "1.5"))
+
+# Session store: "memory" (per process), "sqlite" (WAL, shared by workers on one box) or "redis"
+SESSION_STORE   = os.getenv("SESSION_STORE", "memory")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.db")
+REDIS_URL       = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Limits for the in-memory session store; idle sessions expire and the least
+# recently used are evicted first (0 disables a limit)
+SESSION_TTL       = float(os.getenv("SESSION_TTL", "7200")) or None
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "10000")) or None
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(256 * 1024 * 1024))) or None
+
+# The in-memory store snapshots changed sessions to this file every few seconds
+# and restores them lazily after a restart (empty disables snapshots)
+SESSION_SNAPSHOT_PATH     = os.getenv("SESSION_SNAPSHOT_PATH", os.path.join(BASE_DIR, "sessions.snapshot.db"))
+SESSION_SNAPSHOT_INTERVAL = float(os.getenv("SESSION_SNAPSHOT_INTERVAL", "5"))
+
+# Token budget for the main completion prompt (system + context + recent turns)
+PROMPT_TOKEN_BUDGET        = int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+PROMPT_HISTORY_RESERVE     = int(os.getenv("PROMPT_HISTORY_RESERVE", "800"))
+MAX_ASSISTANT_TURN_TOKENS  = int(os.getenv("MAX_ASSISTANT_TURN_TOKENS", "300"))
+
+# Financial context is extracted from each new message and merged; the whole
+# conversation is re-analyzed every N turns or after a low-confidence extraction
+FINANCIAL_CONTEXT_REFRESH_TURNS  = int(os.getenv("FINANCIAL_CONTEXT_REFRESH_TURNS", "10"))
+FINANCIAL_CONTEXT_MIN_CONFIDENCE = float(os.getenv("FINANCIAL_CONTEXT_MIN_CONFIDENCE", "0.5"))
+
+# Query embedding cache shared by all search paths; the optional SQLite file
+# keeps embeddings across restarts (empty keeps them in memory only)
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+EMBEDDING_CACHE_TTL  = float(os.getenv("EMBEDDING_CACHE_TTL", str(7 * 24 * 3600))) or None
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "")
+
+# Semantic cache of search results: a query reuses the hits of a cached query
+# with the same filters when their embeddings are at least this similar.
+# Ingestion bumps a version file in COLLECTION_VERSION_DIR to invalidate it;
+# ingestion scripts and API workers must resolve it to the same directory.
+RETRIEVAL_CACHE_THRESHOLD = float(os.getenv("RETRIEVAL_CACHE_THRESHOLD", "0.97"))
+RETRIEVAL_CACHE_SIZE      = int(os.getenv("RETRIEVAL_CACHE_SIZE", "2000"))
+RETRIEVAL_CACHE_TTL       = float(os.getenv("RETRIEVAL_CACHE_TTL", "3600")) or None
+COLLECTION_VERSION_DIR    = os.getenv("COLLECTION_VERSION_DIR", BASE_DIR)
+
+# Serve content searches from an in-process copy of the collection instead of
+# a network hop to Qdrant; reloaded on this interval and after ingestion
+LOCAL_VECTOR_SEARCH             = os.getenv("LOCAL_VECTOR_SEARCH", "false").lower() in ("1", "true", "yes")
+VECTOR_ENGINE_REFRESH_INTERVAL  = float(os.getenv("VECTOR_ENGINE_REFRESH_INTERVAL", "300"))
+
+# Hybrid retrieval: BM25 over chunk titles/text fused with the vector search
+# by reciprocal rank fusion (the index file is written next to the version files)
+HYBRID_SEARCH                   = os.getenv("HYBRID_SEARCH", "true").lower() in ("1", "true", "yes")
+BM25_K1                         = float(os.getenv("BM25_K1", "1.2"))
+BM25_B                          = float(os.getenv("BM25_B", "0.75"))
+LEXICAL_CANDIDATES              = int(os.getenv("LEXICAL_CANDIDATES", "20"))
+RRF_K                           = int(os.getenv("RRF_K", "60"))
+
+# Post-retrieval diversification: search this many candidates per result,
+# keep at most MAX_CHUNKS_PER_DOCUMENT chunks of a page, then pick the final
+# hits by maximal marginal relevance (0 keeps the ranked order)
+SEARCH_CANDIDATES_PER_RESULT    = int(os.getenv("SEARCH_CANDIDATES_PER_RESULT", "2"))
+MAX_CHUNKS_PER_DOCUMENT         = int(os.getenv("MAX_CHUNKS_PER_DOCUMENT", "1"))
+MMR_DIVERSITY                   = float(os.getenv("MMR_DIVERSITY", "0.3"))
+
+# Opt-in vector quantization for the Qdrant collections: "" (off), "scalar"
+# (int8, 4x smaller) or "binary" (1 bit per dimension, 32x smaller). Original
+# vectors move to disk; searches oversample quantized candidates and rescore
+# them with the originals.
+VECTOR_QUANTIZATION             = os.getenv("VECTOR_QUANTIZATION", "").lower()
+QUANTIZATION_OVERSAMPLING       = float(os.getenv("QUANTIZATION_OVERSAMPLING", "2.0"))
+
+# End-to-end deadline per chat request (clients may ask for a shorter one with
+# deadline_ms), counted from when the turn holds its session lock. Retrieval
+# may use the first RETRIEVAL_DEADLINE_SHARE of it,
+# optional stages are skipped when less than OPTIONAL_STAGE_MIN_SECONDS is left,
+# and DEADLINE_FINISH_RESERVE is held back for recording the turn.
+REQUEST_DEADLINE_SECONDS        = float(os.getenv("REQUEST_DEADLINE_SECONDS", "25"))
+RETRIEVAL_DEADLINE_SHARE        = float(os.getenv("RETRIEVAL_DEADLINE_SHARE", "0.3"))
+OPTIONAL_STAGE_MIN_SECONDS      = float(os.getenv("OPTIONAL_STAGE_MIN_SECONDS", "3"))
+DEADLINE_FINISH_RESERVE         = float(os.getenv("DEADLINE_FINISH_RESERVE", "0.5"))
@@ -0,0 +1,58 @@
+"""
+End-to-end deadlines for chat requests.
+
+Each request gets one time budget once it holds its session's lock (time
+queued behind the session's previous turn doesn't count). Required stages
+(retrieval, the main completion) are given what is left of it, and
+optional stages (the executive summary and recommendation sub-calls, the
+wait for the previous turn's analytics) are skipped when too little is
+left. Skipped stages are reported back to the client, so a slow upstream
+costs polish rather than blowing the latency ceiling.
+"""
+
+import time
+import threading
+from collections import Counter
+from typing import Any, Dict, List
+
+class Deadline:
+    """
+    Time budget of one request.
+
+    Args:
+        seconds: Total budget, counted from construction
+    """
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + seconds
+        self.skipped: List[str] = []
+
+    def remaining(self, reserve: float = 0.0) -> float:
+        """Seconds left before the deadline, minus ``reserve`` held back for later stages."""
+        return max(0.0, self.expires_at - time.monotonic() - reserve)
+
+    def checkpoint(self, share: float) -> float:
+        """Seconds until ``share`` of the whole budget has elapsed (a stage's slice of it)."""
+        return max(0.0, min(self.started_at + self.seconds * share, self.expires_at) - time.monotonic())
+
+    def allows(self, stage: str, needed: float, reserve: float = 0.0) -> bool:
+        """Whether an optional stage that needs ``needed`` seconds still fits; records it as skipped if not."""
+        if self.remaining(reserve) >= needed:
+            return True
+        self.skip(stage)
+        return False
+
+    def skip(self, stage: str):
+        """Record a stage that was skipped or cut short."""
+        with _stats_lock:
+            _skips[stage] += 1
+        self.skipped.append(stage)
+
+# Skipped stages across all requests, for /metrics
+_skips: Counter = Counter()
+_stats_lock = threading.Lock()
+
+def deadline_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        return {"skipped_stages": dict(_skips)}
@@ -309,36 +309,37 @@ def test_specific_query(query, expected_content=None):
         print(f"❌ Error: {str(e)}")
         return False
 
+# Queries with content the answers are expected to mention
+FINANCIAL_TEST_QUERIES = [
+    {
+        "query": "What are the key challenges in financial regulatory compliance?",
+        "expected": ["Basel", "regulation", "compliance", "KYC", "AML"]
+    },
+    {
+        "query": "How can banks modernize their core banking systems?",
+        "expected": ["legacy", "modernization", "digital transformation", "core banking"]
+    },
+    {
+        "query": "Explain model risk management for banks",
+        "expected": ["model risk", "validation", "MRM", "regulatory", "framework"]
+    },
+    {
+        "query": "What services do you offer for data analytics in finance?",
+        "expected": ["analytics", "insights", "data", "dashboard", "reporting"]
+    },
+    {
+        "query": "How can you help with digital banking transformation?",
+        "expected": ["digital", "transformation", "customer experience", "modernization"]
+    }
+]
+
 def run_financial_services_test_suite():
     """Run a suite of tests specifically for financial services queries."""
     print_header("Financial Services Query Test Suite")
     
-    test_queries = [
-        {
-            "query": "What are the key challenges in financial regulatory compliance?",
-            "expected": ["Basel", "regulation", "compliance", "KYC", "AML"]
-        },
-        {
-            "query": "How can banks modernize their core banking systems?",
-            "expected": ["legacy", "modernization", "digital transformation", "core banking"]
-        },
-        {
-            "query": "Explain model risk management for banks",
-            "expected": ["model risk", "validation", "MRM", "regulatory", "framework"]
-        },
-        {
-            "query": "What services do you offer for data analytics in finance?",
-            "expected": ["analytics", "insights", "data", "dashboard", "reporting"]
-        },
-        {
-            "query": "How can you help with digital banking transformation?",
-            "expected": ["digital", "transformation", "customer experience", "modernization"]
-        }
-    ]
-    
     results = []
     
-    for test in test_queries:
+    for test in FINANCIAL_TEST_QUERIES:
         success = test_specific_query(test["query"], test["expected"])
         results.append(success)
         time.sleep(1)  # Small pause between queries
@@ -0,0 +1,76 @@
+"""
+Post-retrieval diversification of search hits.
+
+Chunks of one page share a ``doc_id`` (ingest_json.py) or ``url``
+(ingest_sitemap.py), so the top hits are often several chunks of the same
+blog post. Collapsing keeps the best chunks per document, and maximal
+marginal relevance (MMR) then picks hits that are relevant but unlike the
+ones already picked, so the prompt gets more distinct information per token.
+"""
+
+from typing import Any, Dict, List
+
+import numpy as np
+
+def document_key(hit: Any) -> Any:
+    """The document a chunk belongs to: its doc_id, else its url, else the point itself."""
+    payload = hit.payload or {}
+    return payload.get("doc_id") or payload.get("url") or hit.id
+
+def collapse_by_document(hits: List[Any], max_per_document: int = 1) -> List[Any]:
+    """
+    Keep the first ``max_per_document`` hits of each document.
+
+    Args:
+        hits: Search hits, best first
+        max_per_document: Chunks kept per document
+
+    Returns:
+        The surviving hits in their original order
+    """
+    kept: Dict[Any, int] = {}
+    collapsed = []
+    for hit in hits:
+        key = document_key(hit)
+        if kept.get(key, 0) < max_per_document:
+            kept[key] = kept.get(key, 0) + 1
+            collapsed.append(hit)
+    return collapsed
+
+def mmr_select(hits: List[Any], limit: int, diversity: float = 0.3) -> List[Any]:
+    """
+    Pick up to ``limit`` hits by maximal marginal relevance.
+
+    The incoming order already combines vector and keyword evidence, so a
+    hit's relevance is taken from its rank (1.0 for the first, falling
+    linearly) rather than recomputed from cosine similarity.
+
+    Args:
+        hits: Search hits, best first, each with its vector
+        limit: Hits to return
+        diversity: Weight of the redundancy penalty, from 0 (rank order) to 1
+
+    Returns:
+        The selected hits in selection order; the first ``limit`` hits when
+        any of them lacks a vector
+    """
+    if len(hits) <= 1 or diversity <= 0 or any(hit.vector is None for hit in hits):
+        return hits[:limit]
+
+    vectors = np.asarray([hit.vector for hit in hits], dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors /= np.where(norms == 0, 1, norms)
+    similarity = vectors @ vectors.T
+    relevance = 1 - np.arange(len(hits), dtype=np.float32) / len(hits)
+
+    selected = [0]
+    redundancy = similarity[0].copy()
+    available = np.ones(len(hits), dtype=bool)
+    available[0] = False
+    while len(selected) < min(limit, len(hits)):
+        scores = np.where(available, (1 - diversity) * relevance - diversity * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+    return [hits[i] for i in selected]
@@ -12,10 +12,13 @@ import magic  # for mime type detection
 
 from openai import OpenAI
 from qdrant_client import QdrantClient
-from qdrant_client.models import PointStruct, Filter, FieldCondition, MatchValue
+from qdrant_client.models import PointStruct, Filter, FieldCondition, MatchAny, MatchValue
 
 # Import configuration 
 from config import OPENAI_API_KEY, QDRANT_URL
+from embedding_cache import embedding_cache
+from retrieval_cache import bump_collection_version
+from collection_schema import ensure_collection
 
 # Configure logging
 logging.basicConfig(
@@ -115,10 +118,7 @@ def search_by_content_type(
     """
     # Generate query embedding
     try:
-        query_embedding = self.openai_client.embeddings.create(
-            input=query,
-            model=self.embedding_model
-        ).data[0].embedding
+        query_embedding = embedding_cache.embed(self.openai_client, query, model=self.embedding_model)
     except Exception as e:
         self.logger.error(f"Query embedding failed: {e}")
         return []
@@ -137,13 +137,13 @@ def search_by_content_type(
     
     # Perform search
     try:
-        search_results = self.qdrant_client.search(
+        search_results = self.qdrant_client.query_points(
             collection_name="anaptyss_content",  # Use the WordPress collection
-            query_vector=query_embedding,
+            query=query_embedding,
             limit=limit,
             with_payload=True,
-            filter=filter_obj
-        )
+            query_filter=filter_obj
+        ).points
         
         # Process and enrich results
         results = []
@@ -178,6 +178,7 @@ class DocumentManager:
         self.openai_client = OpenAI(api_key=openai_api_key)
         self.embedding_model = embedding_model
         self.collection_name = collection_name
+        ensure_collection(self.qdrant_client, collection_name)
         
         # Setup logging
         self.logger = logger
@@ -296,6 +297,7 @@ class DocumentManager:
                     )
                 ]
             )
+            bump_collection_version(self.collection_name)
         except Exception as e:
             self.logger.error(f"Qdrant storage failed: {e}")
         
@@ -353,10 +355,7 @@ class DocumentManager:
         """
         # Generate query embedding
         try:
-            query_embedding = self.openai_client.embeddings.create(
-                input=query,
-                model=self.embedding_model
-            ).data[0].embedding
+            query_embedding = embedding_cache.embed(self.openai_client, query, model=self.embedding_model)
         except Exception as e:
             self.logger.error(f"Query embedding failed: {e}")
             return []
@@ -376,13 +375,13 @@ class DocumentManager:
         
         # Perform search
         try:
-            search_results = self.qdrant_client.search(
+            search_results = self.qdrant_client.query_points(
                 collection_name=self.collection_name,
-                query_vector=query_embedding,
+                query=query_embedding,
                 limit=limit,
                 with_payload=True,
-                filter=qdrant_filter
-            )
+                query_filter=qdrant_filter
+            ).points
             
             # Process and enrich results
             results = []
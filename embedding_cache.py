@@ -0,0 +1,184 @@
+"""
+Shared cache for query embeddings.
+
+Every search path embeds the visitor's query before searching Qdrant, and
+many visitors send the same openers word for word. Embeddings are cached by
+model and normalized text in an in-process LRU, optionally backed by a
+SQLite file that survives restarts and is shared by the workers on one box.
+"""
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_TTL, EMBEDDING_CACHE_PATH
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMBEDDING_MODEL = "text-embedding-ada-002"
+
+def normalize_query(text: str) -> str:
+    """Cache key text: case-folded with whitespace collapsed."""
+    return " ".join(text.split()).casefold()
+
+class EmbeddingCache:
+    """
+    LRU cache of embeddings keyed by (model, normalized text).
+
+    Args:
+        max_entries: Entries kept in memory; least recently used go first
+        ttl: Seconds an embedding stays valid, or None to keep it until evicted
+        path: SQLite file for the persistent tier, or None for memory only
+    """
+    def __init__(self, max_entries: int = 10000, ttl: Optional[float] = None, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        # (model, normalized text) → (embedding, created at), least recently used first
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[List[float], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if path:
+            with self._connect() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings ("
+                    "model TEXT NOT NULL, text TEXT NOT NULL, vector BLOB NOT NULL, created_at REAL NOT NULL, "
+                    "PRIMARY KEY (model, text))"
+                )
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl is not None and time.time() - created_at > self.ttl
+
+    def get(self, text: str, model: str = DEFAULT_EMBEDDING_MODEL) -> Optional[List[float]]:
+        """Cached embedding of ``text``, or None (not counted as a miss)."""
+        key = (model, normalize_query(text))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[1]):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+
+        if not self.path:
+            return None
+        row = self._connect().execute(
+            "SELECT vector, created_at FROM embeddings WHERE model = ? AND text = ?", key
+        ).fetchone()
+        if row is None or self._expired(row[1]):
+            return None
+        vector = array("f", row[0]).tolist()
+        self._remember(key, vector, row[1])
+        with self._lock:
+            self.persistent_hits += 1
+        return vector
+
+    def put(self, text: str, vector: List[float], model: str = DEFAULT_EMBEDDING_MODEL):
+        key = (model, normalize_query(text))
+        created_at = time.time()
+        self._remember(key, vector, created_at)
+        if self.path:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO embeddings (model, text, vector, created_at) VALUES (?, ?, ?, ?)",
+                    (*key, array("f", vector).tobytes(), created_at)
+                )
+
+    def _remember(self, key: Tuple[str, str], vector: List[float], created_at: float):
+        with self._lock:
+            self._entries[key] = (vector, created_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def embed(
+        self,
+        openai_client: Any,
+        text: str,
+        model: str = DEFAULT_EMBEDDING_MODEL,
+        timeout: Optional[float] = None
+    ) -> List[float]:
+        """
+        Embedding of ``text``, from the cache or the OpenAI API.
+
+        Args:
+            openai_client: OpenAI client used on a cache miss
+            text: Text to embed; the API is sent the text as given
+            model: Embedding model
+            timeout: Seconds the API call may take, None for the client default
+
+        Returns:
+            The embedding vector
+        """
+        return self.embed_many(openai_client, [text], model, timeout)[0]
+
+    def embed_many(
+        self,
+        openai_client: Any,
+        texts: List[str],
+        model: str = DEFAULT_EMBEDDING_MODEL,
+        timeout: Optional[float] = None
+    ) -> List[List[float]]:
+        """Embeddings of several texts, with all cache misses sent in one API call."""
+        vectors: List[Optional[List[float]]] = [self.get(text, model) for text in texts]
+        missing: Dict[str, List[int]] = {}
+        for i, (text, vector) in enumerate(zip(texts, vectors)):
+            if vector is None:
+                missing.setdefault(normalize_query(text), []).append(i)
+
+        if missing:
+            with self._lock:
+                self.misses += len(missing)
+            inputs = [texts[indexes[0]] for indexes in missing.values()]
+            # An explicit timeout=None would disable the client's default timeout
+            options = {"timeout": timeout} if timeout is not None else {}
+            response = openai_client.embeddings.create(input=inputs, model=model, **options)
+            for indexes, item in zip(missing.values(), response.data):
+                self.put(texts[indexes[0]], item.embedding, model)
+                for i in indexes:
+                    vectors[i] = item.embedding
+        return vectors
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.persistent_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.persistent_hits) / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "persistent": bool(self.path),
+        }
+
+# Shared by every search path in the process
+embedding_cache = EmbeddingCache(
+    max_entries=EMBEDDING_CACHE_SIZE,
+    ttl=EMBEDDING_CACHE_TTL,
+    path=EMBEDDING_CACHE_PATH or None
+)
@@ -13,6 +13,9 @@ from qdrant_client import QdrantClient
 from qdrant_client.http.models import PointStruct
 from config import OPENAI_API_KEY, QDRANT_URL, SITE_URL
 from urllib.parse import urljoin
+from retrieval_cache import bump_collection_version
+from lexical_index import build_lexical_index
+from collection_schema import ensure_collection
 
 # Setup logging
 logging.basicConfig(
@@ -352,21 +355,9 @@ def main():
     qdrant = QdrantClient(url=QDRANT_URL)
     processor = ContentProcessor()
     
-    # Ensure collection exists
+    # Create the collection, or bring its indexes and settings up to date
     COLLECTION = "anaptyss_content"
-    collections = [c.name for c in qdrant.get_collections().collections]
-    
-    if COLLECTION not in collections:
-        logger.info(f"Creating new collection '{COLLECTION}'")
-        qdrant.create_collection(
-            collection_name=COLLECTION,
-            vectors_config={
-                "size": 1536,
-                "distance": "Cosine"
-            }
-        )
-    else:
-        logger.info(f"Using existing collection '{COLLECTION}'")
+    ensure_collection(qdrant, COLLECTION)
     
     # Fetch URLs by scraping
     urls = fetch_site_urls()
@@ -475,6 +466,10 @@ def main():
         )
         total_uploads += len(points)
     
+    # Cached search results in the API are stale now
+    bump_collection_version(COLLECTION)
+    build_lexical_index(qdrant, COLLECTION)
+    
     logger.info(f"\nIngestion complete!")
     logger.info(f"Total pages processed: {total_items}")
     logger.info(f"Total chunks created: {total_chunks}")
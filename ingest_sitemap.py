@@ -13,6 +13,9 @@ from openai import OpenAI
 from qdrant_client import QdrantClient
 from qdrant_client.http.models import PointStruct
 from config import OPENAI_API_KEY, QDRANT_URL, SITE_URL, SEARCH_CONFIG
+from retrieval_cache import bump_collection_version
+from lexical_index import build_lexical_index
+from collection_schema import ensure_collection
 
 # Namespaces for XML parsing
 NAMESPACES = {
@@ -42,18 +45,9 @@ openai = OpenAI(api_key=OPENAI_API_KEY)
 qdrant = QdrantClient(url=QDRANT_URL)
 
 COLLECTION = "anaptyss_content"
-existing = [c.name for c in qdrant.get_collections().collections]
-if COLLECTION not in existing:
-    qdrant.create_collection(
-        collection_name=COLLECTION,
-        vectors_config={
-            "size": 1536,
-            "distance": "Cosine"
-        }
-    )
-    print(f"Created Qdrant collection '{COLLECTION}'")
-else:
-    print(f"Qdrant collection '{COLLECTION}' already exists")
+# Create the collection, or bring its indexes and settings up to date
+schema = ensure_collection(qdrant, COLLECTION)
+print(f"Qdrant collection '{COLLECTION}' ready (schema v{schema['version']})")
 
 # Helper function to clean HTML content
 def clean_html(html_content):
@@ -278,6 +272,10 @@ def ingest_content():
         batch = points[i : i + BATCH_SIZE]
         qdrant.upsert(collection_name=COLLECTION, points=batch)
         print(f"  • Upserted points {i + 1}–{i + len(batch)}")
+
+    # Cached search results in the API are stale now
+    bump_collection_version(COLLECTION)
+    build_lexical_index(qdrant, COLLECTION)
     
     # Content type summary
     content_type_summary = {}
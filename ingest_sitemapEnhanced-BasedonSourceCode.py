@@ -11,9 +11,11 @@ from datetime import datetime
 from bs4 import BeautifulSoup
 from openai import OpenAI
 from qdrant_client import QdrantClient
-from qdrant_client.http import models as rest_models
 from qdrant_client.http.models import PointStruct  # Add this import
 from config import OPENAI_API_KEY, QDRANT_URL, SITE_URL, SEARCH_CONFIG
+from retrieval_cache import bump_collection_version
+from lexical_index import build_lexical_index
+from collection_schema import ensure_collection
 
 # Namespaces for XML parsing
 NAMESPACES = {
@@ -40,10 +42,6 @@ HEADERS = {
 
 # Collection configuration
 COLLECTION = "anaptyss_enhanced_content"
-VECTOR_CONFIG = {
-    "size": 1536,
-    "distance": "Cosine"
-}
 
 # Initialize clients
 openai = OpenAI(api_key=OPENAI_API_KEY)
@@ -51,36 +49,9 @@ qdrant = QdrantClient(url=QDRANT_URL)
 
 # Check and create collection
 def ensure_collection_exists():
-    """Ensure the Qdrant collection exists."""
-    existing_collections = [c.name for c in qdrant.get_collections().collections]
-    if COLLECTION not in existing_collections:
-        qdrant.create_collection(
-            collection_name=COLLECTION,
-            vectors_config=rest_models.VectorParams(
-                size=VECTOR_CONFIG["size"], 
-                distance=rest_models.Distance.COSINE
-            )
-        )
-        print(f"Created Qdrant collection '{COLLECTION}'")
-        
-        # Create payload schema for more structured indexing
-        qdrant.create_payload_index(
-            collection_name=COLLECTION,
-            field_name="content_type",
-            field_schema=rest_models.PayloadSchemaType.KEYWORD
-        )
-        qdrant.create_payload_index(
-            collection_name=COLLECTION,
-            field_name="content_type_name",
-            field_schema=rest_models.PayloadSchemaType.KEYWORD
-        )
-        qdrant.create_payload_index(
-            collection_name=COLLECTION,
-            field_name="publication_date",
-            field_schema=rest_models.PayloadSchemaType.DATETIME
-        )
-    else:
-        print(f"Qdrant collection '{COLLECTION}' already exists")
+    """Create the Qdrant collection, or bring its indexes and settings up to date."""
+    schema = ensure_collection(qdrant, COLLECTION)
+    print(f"Qdrant collection '{COLLECTION}' ready (schema v{schema['version']})")
 
 # Helper function to clean HTML content
 def clean_html(html_content):
@@ -349,6 +320,10 @@ def ingest_content():
         batch = points[i : i + BATCH_SIZE]
         qdrant.upsert(collection_name=COLLECTION, points=batch)
         print(f"  • Upserted points {i + 1}–{i + len(batch)}")
+
+    # Cached search results in the API are stale now
+    bump_collection_version(COLLECTION)
+    build_lexical_index(qdrant, COLLECTION)
     
     # Content type summary
     content_type_summary = {}
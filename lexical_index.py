@@ -0,0 +1,298 @@
+"""
+BM25 keyword index over chunk titles and text.
+
+ada-002 embeds acronym-heavy queries ("FRTB", "BCBS 239", "CVA/XVA") poorly,
+while the chunks that answer them contain those exact tokens. The index is
+a compact inverted index: one vocabulary dict plus CSR-style postings
+arrays (row ids and term frequencies per term), scored with BM25 in NumPy.
+
+Ingestion scripts call ``build_lexical_index()`` after writing a collection,
+which saves the index next to the collection version file. API processes
+load it (or build it, without a current saved index) in the background on
+first use, searching vectors only until it is ready, and reload it in the
+background when ingestion bumps the collection version.
+"""
+
+import os
+import re
+import json
+import time
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from config import COLLECTION_VERSION_DIR, BM25_K1, BM25_B
+from retrieval_cache import read_collection_version
+
+logger = logging.getLogger(__name__)
+
+# Title terms count this many times towards a chunk's term frequencies
+TITLE_WEIGHT = 2
+
+# How often (seconds) a loaded index checks whether ingestion bumped its collection version
+VERSION_CHECK_INTERVAL = 1.0
+
+# Seconds before a failed load or build is retried
+LOAD_RETRY_INTERVAL = 60.0
+
+STOPWORDS = frozenset(
+    "a about an and are as at be by can do does for from has have how i in is it its me my "
+    "of on or our so that the their them they this to us was we what when which who why "
+    "will with you your".split()
+)
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased alphanumeric runs without stopwords; "CVA/XVA" → ["cva", "xva"]."""
+    return [token for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+def _index_path(collection: str) -> str:
+    return os.path.join(COLLECTION_VERSION_DIR, f".{collection}.bm25.npz")
+
+class LexicalIndex:
+    """
+    Immutable BM25 index over a collection's chunks.
+
+    Args:
+        ids: Qdrant point id of each row
+        vocabulary: term → term id
+        offsets: Postings of term t are ``rows[offsets[t]:offsets[t + 1]]``
+        rows: Row of each posting, grouped by term
+        frequencies: Term frequency of each posting
+        lengths: Token count of each row
+        version: Collection version the index was built from
+    """
+    def __init__(
+        self,
+        ids: List[Any],
+        vocabulary: Dict[str, int],
+        offsets: np.ndarray,
+        rows: np.ndarray,
+        frequencies: np.ndarray,
+        lengths: np.ndarray,
+        version: str = ""
+    ):
+        self.ids = ids
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.rows = rows
+        self.frequencies = frequencies
+        self.lengths = lengths
+        self.version = version
+        self.loaded_at = time.monotonic()
+        documents = len(ids)
+        document_frequency = np.diff(offsets).astype(np.float32)
+        self.idf = np.log1p((documents - document_frequency + 0.5) / (document_frequency + 0.5))
+        average_length = float(lengths.mean()) if documents else 1.0
+        # BM25 length normalization per row, precomputed once
+        self.norms = (BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(average_length, 1.0))).astype(np.float32)
+
+    @classmethod
+    def build(cls, documents: Iterable[Tuple[Any, str, str]], version: str = "") -> "LexicalIndex":
+        """
+        Index (point id, title, text) triples.
+
+        Returns:
+            The index, with rows in the order the documents were given
+        """
+        ids: List[Any] = []
+        vocabulary: Dict[str, int] = {}
+        postings: List[Dict[int, int]] = []
+        lengths: List[int] = []
+        for point_id, title, text in documents:
+            row = len(ids)
+            ids.append(point_id)
+            counts: Dict[str, int] = {}
+            for token in tokenize(text or ""):
+                counts[token] = counts.get(token, 0) + 1
+            for token in tokenize(title or ""):
+                counts[token] = counts.get(token, 0) + TITLE_WEIGHT
+            lengths.append(sum(counts.values()))
+            for token, count in counts.items():
+                term = vocabulary.setdefault(token, len(vocabulary))
+                if term == len(postings):
+                    postings.append({})
+                postings[term][row] = count
+
+        offsets = np.zeros(len(postings) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(term_postings) for term_postings in postings])
+        rows = np.fromiter((row for term_postings in postings for row in term_postings), dtype=np.int32, count=offsets[-1])
+        frequencies = np.fromiter(
+            (count for term_postings in postings for count in term_postings.values()), dtype=np.float32, count=offsets[-1]
+        )
+        return cls(ids, vocabulary, offsets, rows, frequencies, np.asarray(lengths, dtype=np.float32), version)
+
+    def search(self, query: str, limit: int = 20) -> List[Tuple[Any, float]]:
+        """
+        Rank rows against a query with BM25.
+
+        Returns:
+            Up to ``limit`` (point id, BM25 score) pairs, best first; rows
+            sharing no term with the query are left out
+        """
+        terms = {self.vocabulary[token] for token in tokenize(query) if token in self.vocabulary}
+        if not terms or not self.ids:
+            return []
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term in terms:
+            start, end = self.offsets[term], self.offsets[term + 1]
+            rows = self.rows[start:end]
+            frequencies = self.frequencies[start:end]
+            scores[rows] += self.idf[term] * frequencies * (BM25_K1 + 1) / (frequencies + self.norms[rows])
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > limit:
+            matched = matched[np.argpartition(-scores[matched], limit - 1)[:limit]]
+        matched = matched[np.argsort(-scores[matched])]
+        return [(self.ids[row], float(scores[row])) for row in matched]
+
+    def save(self, path: str):
+        """Write the index atomically as a compressed .npz file."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            ids=np.array(json.dumps(self.ids)),
+            vocabulary=np.array(json.dumps(self.vocabulary)),
+            offsets=self.offsets,
+            rows=self.rows,
+            frequencies=self.frequencies,
+            lengths=self.lengths,
+            version=np.array(self.version)
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "LexicalIndex":
+        with np.load(path) as data:
+            return cls(
+                json.loads(str(data["ids"])),
+                json.loads(str(data["vocabulary"])),
+                data["offsets"],
+                data["rows"],
+                data["frequencies"],
+                data["lengths"],
+                str(data["version"])
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "documents": len(self.ids),
+            "terms": len(self.vocabulary),
+            "postings": int(self.offsets[-1]),
+            "index_mb": round((self.rows.nbytes + self.frequencies.nbytes + self.offsets.nbytes) / 1e6, 2),
+            "age_s": round(time.monotonic() - self.loaded_at, 1),
+        }
+
+def build_lexical_index(client: Any, collection: str, batch_size: int = 256) -> LexicalIndex:
+    """
+    Scroll a collection's payloads into a new index and save it for the API processes.
+
+    Call after ``bump_collection_version()`` so the saved index carries the new version.
+    """
+    version = read_collection_version(collection)
+    start = time.perf_counter()
+    documents = []
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection,
+            limit=batch_size,
+            offset=offset,
+            with_payload=["title", "text"],
+            with_vectors=False
+        )
+        for point in points:
+            payload = point.payload or {}
+            documents.append((point.id, payload.get("title", ""), payload.get("text", "")))
+        if offset is None:
+            break
+
+    index = LexicalIndex.build(documents, version)
+    index.save(_index_path(collection))
+    logger.info(
+        f"Built BM25 index for {collection}: {len(documents)} chunks, {len(index.vocabulary)} terms "
+        f"in {(time.perf_counter() - start) * 1000:.0f}ms"
+    )
+    return index
+
+class _LoadedIndex:
+    """The current index of one collection, reloaded in the background after ingestion."""
+    def __init__(self, client: Any, collection: str):
+        self.client = client
+        self.collection = collection
+        self.index: Optional[LexicalIndex] = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._failed_at: Optional[float] = None
+        self._version_checked_at = 0.0
+
+    def _load(self) -> LexicalIndex:
+        """Saved index if it matches the collection version, otherwise a rebuilt one."""
+        path = _index_path(self.collection)
+        version = read_collection_version(self.collection)
+        if os.path.exists(path):
+            index = LexicalIndex.load(path)
+            if index.version == version:
+                logger.info(f"Loaded BM25 index for {self.collection} ({len(index.ids)} chunks)")
+                return index
+        return build_lexical_index(self.client, self.collection)
+
+    def _reload_in_background(self):
+        try:
+            self.index = self._load()
+            self._failed_at = None
+        except Exception as e:
+            self._failed_at = time.monotonic()
+            if self.index is None:
+                logger.warning(f"BM25 index for {self.collection} unavailable, retrying in {LOAD_RETRY_INTERVAL:.0f}s: {e}")
+            else:
+                logger.warning(f"BM25 index reload for {self.collection} failed, keeping the previous one: {e}")
+        finally:
+            self._refreshing = False
+
+    def _refresh(self, now: float):
+        """Start a background (re)load unless one is running or the last one failed recently."""
+        if self._failed_at is not None and now - self._failed_at < LOAD_RETRY_INTERVAL:
+            return
+        with self._lock:
+            if not self._refreshing:
+                self._refreshing = True
+                threading.Thread(target=self._reload_in_background, name="bm25-reload", daemon=True).start()
+
+    def current(self) -> Optional[LexicalIndex]:
+        index = self.index
+        now = time.monotonic()
+        if index is None:
+            # Building scrolls the whole collection; don't make a request wait for it
+            self._refresh(now)
+            return None
+
+        if now - self._version_checked_at >= VERSION_CHECK_INTERVAL:
+            self._version_checked_at = now
+            if read_collection_version(self.collection) != index.version:
+                self._refresh(now)
+        return index
+
+_indexes: Dict[str, _LoadedIndex] = {}
+_indexes_lock = threading.Lock()
+
+def get_lexical_index(client: Any, collection: str) -> Optional[LexicalIndex]:
+    """
+    The collection's BM25 index; the first call starts loading (or building) it.
+
+    Returns:
+        The current index, or None while the first load runs in the
+        background or after it failed; callers fall back to vector-only search
+    """
+    with _indexes_lock:
+        loaded = _indexes.get(collection)
+        if loaded is None:
+            loaded = _indexes[collection] = _LoadedIndex(client, collection)
+    return loaded.current()
+
+def lexical_index_stats() -> Dict[str, Any]:
+    return {collection: loaded.index.stats() for collection, loaded in _indexes.items() if loaded.index is not None}
@@ -1,16 +1,47 @@
 #!/usr/bin/env python3
 import uuid
+import asyncio
+import functools
+import threading
 import logging
 import json
 import re
+import sys
+import math
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from collections import deque
+from typing import List, Dict, Any, Optional, Callable, Tuple, AsyncIterator, Annotated, Deque, NamedTuple
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, EmailStr
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, EmailStr, Field, TypeAdapter, ValidationError
 from openai import OpenAI
-from qdrant_client import QdrantClient
-from config import OPENAI_API_KEY, QDRANT_URL
+from qdrant_client import QdrantClient, models
+from config import (
+    OPENAI_API_KEY, QDRANT_URL, ANALYSIS_TIMEOUT, ANALYSIS_MAX_WORKERS,
+    BACKGROUND_WORKERS, BACKGROUND_QUEUE_SIZE, IO_MAX_WORKERS, PENDING_ANALYSIS_WAIT,
+    SESSION_STORE, SESSION_DB_PATH, REDIS_URL, SESSION_TTL, SESSION_MAX_COUNT, SESSION_MAX_BYTES,
+    SESSION_SNAPSHOT_PATH, SESSION_SNAPSHOT_INTERVAL,
+    PROMPT_TOKEN_BUDGET, PROMPT_HISTORY_RESERVE, MAX_ASSISTANT_TURN_TOKENS,
+    FINANCIAL_CONTEXT_REFRESH_TURNS, FINANCIAL_CONTEXT_MIN_CONFIDENCE,
+    LOCAL_VECTOR_SEARCH, VECTOR_ENGINE_REFRESH_INTERVAL,
+    HYBRID_SEARCH, LEXICAL_CANDIDATES, RRF_K,
+    SEARCH_CANDIDATES_PER_RESULT, MAX_CHUNKS_PER_DOCUMENT, MMR_DIVERSITY,
+    VECTOR_QUANTIZATION, QUANTIZATION_OVERSAMPLING,
+    REQUEST_DEADLINE_SECONDS, RETRIEVAL_DEADLINE_SHARE, OPTIONAL_STAGE_MIN_SECONDS, DEADLINE_FINISH_RESERVE
+)
+from task_queue import BackgroundTaskQueue
+from session_store import SessionStore, SnapshotSessionStore, create_session_store
+from session_locks import SessionLocks
+from embedding_cache import embedding_cache
+from retrieval_cache import get_retrieval_cache, retrieval_cache_stats
+from vector_engine import VectorEngine
+from lexical_index import get_lexical_index, lexical_index_stats
+from diversification import collapse_by_document, mmr_select
+from deadline import Deadline, deadline_stats
+from prompt_assembler import PromptAssembler
 
 # Setup logging
 logging.basicConfig(
@@ -19,7 +50,32 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Anaptyss Chat API")
+# Turn analytics (sentiment, topics, intent, lead-form decision) run here after the reply is sent
+background_queue = BackgroundTaskQueue(
+    workers=BACKGROUND_WORKERS,
+    maxsize=BACKGROUND_QUEUE_SIZE,
+    name="analytics"
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # tiktoken may download its vocabulary; do it once here, not in a request
+    await run_blocking(prompt_assembler.load)
+    await background_queue.start()
+    if HYBRID_SEARCH:
+        # Start loading (or building) the BM25 index in the background
+        get_lexical_index(qdrant, COLLECTION)
+    snapshotter = None
+    if isinstance(sessions, SnapshotSessionStore):
+        snapshotter = asyncio.create_task(snapshot_sessions_periodically())
+    yield
+    await background_queue.stop()
+    if snapshotter is not None:
+        snapshotter.cancel()
+        # Final snapshot so a restart (e.g. uvicorn --reload) keeps every conversation
+        await snapshot_sessions()
+
+app = FastAPI(title="Anaptyss Chat API", lifespan=lifespan)
 
 # ─── CORS CONFIG ───────────────────────────────────────────────────────────────
 app.add_middleware(
@@ -35,14 +91,91 @@ openai = OpenAI(api_key=OPENAI_API_KEY)
 qdrant = QdrantClient(url=QDRANT_URL)
 COLLECTION = "anaptyss_content"
 
+# Payload fields that ranking, thresholds, merges and sources need. The chunk
+# text (and excerpt, custom_fields, categories, tags) stays in Qdrant until
+# the final hits are hydrated with one batched retrieve.
+SEARCH_PAYLOAD_FIELDS = ["doc_id", "title", "url", "content_type", "content_type_name", "industries", "topics"]
+PROMPT_PAYLOAD_FIELDS = ["text"]
+
+# Quantized collections: oversample candidates from the quantized vectors and
+# rescore them with the originals
+SEARCH_PARAMS = models.SearchParams(
+    quantization=models.QuantizationSearchParams(rescore=True, oversampling=QUANTIZATION_OVERSAMPLING)
+) if VECTOR_QUANTIZATION else None
+
+# Optional in-process copy of the collection that answers content searches locally
+vector_engine = VectorEngine(qdrant, COLLECTION, refresh_interval=VECTOR_ENGINE_REFRESH_INTERVAL) \
+    if LOCAL_VECTOR_SEARCH else None
+
+# Bounded pool for the blocking per-message analysis calls
+analysis_executor = ThreadPoolExecutor(max_workers=ANALYSIS_MAX_WORKERS, thread_name_prefix="analysis")
+
+# Bounded pool for the blocking OpenAI, Qdrant and SMTP calls on the request path.
+# Kept separate from the analysis pool so background analytics can't starve replies.
+io_executor = ThreadPoolExecutor(max_workers=IO_MAX_WORKERS, thread_name_prefix="chat-io")
+
+async def run_blocking(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a blocking call on the I/O pool so the event loop keeps serving other requests."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(io_executor, functools.partial(fn, *args, **kwargs))
+
+# Token-budgeted assembly of the main completion prompt
+prompt_assembler = PromptAssembler(
+    budget=PROMPT_TOKEN_BUDGET,
+    history_reserve=PROMPT_HISTORY_RESERVE,
+    max_assistant_tokens=MAX_ASSISTANT_TURN_TOKENS
+)
+
+# Fallback results for the analysis calls
+DEFAULT_SENTIMENT = {"positive": 0.33, "negative": 0.33, "neutral": 0.34}
+DEFAULT_INTENT = {
+    "information_seeking": 0.25,
+    "product_interest": 0.25,
+    "technical_question": 0.25,
+    "contact_request": 0.25,
+    "compliance_question": 0.0,
+    "implementation_interest": 0.0
+}
+DEFAULT_PREFERENCES = {"content_type": None, "industry": None, "topic": None}
+
 # ─── ENHANCED SESSION STORE ───────────────────────────────────────────────────
+class Message(NamedTuple):
+    """A conversation message; much smaller than a role/content dict."""
+    role: str
+    content: str
+
+class Sentiment(NamedTuple):
+    """Sentiment scores of one user message."""
+    positive: float
+    negative: float
+    neutral: float
+    
+    @classmethod
+    def from_scores(cls, scores: Dict[str, float]) -> "Sentiment":
+        return cls(scores.get("positive", 0), scores.get("negative", 0), scores.get("neutral", 0))
+
 class ConversationMemory:
+    # Once the recent window exceeds MAX_MESSAGES it is cut back to the last KEEP_MESSAGES
+    MAX_MESSAGES = 10
+    KEEP_MESSAGES = 8
+    # Sentiment is kept for the most recent messages only
+    SENTIMENT_HISTORY_SIZE = 10
+    
+    __slots__ = (
+        "messages", "summary", "unsummarized", "interaction_count", "sentiment_history",
+        "topics_discussed", "last_form_trigger", "financial_context", "context_analyzed_turn",
+        "context_refresh_due", "last_source_ids", "content_preferences", "pending_show_form"
+    )
+    
     def __init__(self):
-        self.messages: List[Dict[str, str]] = []
+        self.messages: List[Message] = []
         self.summary: str = ""
+        # Messages dropped from the recent window but not yet folded into the summary
+        self.unsummarized: List[Message] = []
         self.interaction_count: int = 0
-        self.sentiment_history: List[Dict[str, float]] = []
-        self.topics_discussed: List[str] = []
+        self.sentiment_history: Deque[Sentiment] = deque(maxlen=self.SENTIMENT_HISTORY_SIZE)
+        # Ordered set: topics in the order they first came up
+        self.topics_discussed: Dict[str, None] = {}
         self.last_form_trigger: Optional[datetime] = None
         self.financial_context: Dict[str, Any] = {
             "industry_vertical": None,
@@ -50,96 +183,201 @@ class ConversationMemory:
             "potential_use_cases": [],
             "detected_pain_points": []
         }
-        self.last_sources: List[Dict[str, Any]] = []
+        # Turn of the last full financial context re-analysis, and whether a
+        # low-confidence extraction asked for one on the next turn
+        self.context_analyzed_turn: int = 0
+        self.context_refresh_due: bool = False
+        # Qdrant point IDs of the sources behind the last reply
+        self.last_source_ids: List[Any] = []
+        self.content_preferences: Dict[str, Any] = dict(DEFAULT_PREFERENCES)
+        # Lead-form decision made by background analytics, delivered on the next turn or poll
+        self.pending_show_form: bool = False
         
     def add_exchange(self, user_msg: str, assistant_msg: str, sentiment: Dict[str, float] = None, topics: List[str] = None):
-        if sentiment is None:
-            sentiment = {"positive": 0.33, "negative": 0.33, "neutral": 0.34}
-        if topics is None:
-            topics = []
-            
+        """Record an exchange. Sentiment and topics may be recorded later with record_analysis()."""
         self.messages.extend([
-            {"role": "user", "content": user_msg},
-            {"role": "assistant", "content": assistant_msg}
+            Message("user", user_msg),
+            Message("assistant", assistant_msg)
         ])
         
         self.interaction_count += 1
-        self.sentiment_history.append(sentiment)
-        self.topics_discussed.extend([t for t in topics if t not in self.topics_discussed])
+        if sentiment is not None or topics is not None:
+            self.record_analysis(sentiment, topics)
         
-        # Update summary if conversation gets long
-        if len(self.messages) > 10:
-            self.summarize_conversation()
+        # Keep a short recent window; older messages are folded into the
+        # summary by the background analytics job
+        if len(self.messages) > self.MAX_MESSAGES:
+            evicted = len(self.messages) - self.KEEP_MESSAGES
+            self.unsummarized.extend(self.messages[:evicted])
+            self.messages = self.messages[evicted:]
             
-    def summarize_conversation(self):
-        """Summarize the conversation to maintain context while reducing token usage."""
-        if not self.messages:
-            return
+    def record_analysis(self, sentiment: Dict[str, float] = None, topics: List[str] = None):
+        """Record the sentiment and topics of the latest user message."""
+        if sentiment is None:
+            sentiment = DEFAULT_SENTIMENT
+        if topics is None:
+            topics = []
+        
+        self.sentiment_history.append(Sentiment.from_scores(sentiment))
+        self.topics_discussed.update(dict.fromkeys(topics))
+    
+    # Short keys keep serialized sessions small in the shared session stores
+    SERIALIZED_FIELDS = {
+        "m": "messages",
+        "s": "summary",
+        "u": "unsummarized",
+        "n": "interaction_count",
+        "sh": "sentiment_history",
+        "t": "topics_discussed",
+        "ft": "last_form_trigger",
+        "fc": "financial_context",
+        "ca": "context_analyzed_turn",
+        "cr": "context_refresh_due",
+        "si": "last_source_ids",
+        "cp": "content_preferences",
+        "f": "pending_show_form"
+    }
+    
+    def to_bytes(self) -> bytes:
+        """Serialize to compact JSON, omitting empty fields and storing messages and sentiment as arrays."""
+        data = {}
+        for key, attr in self.SERIALIZED_FIELDS.items():
+            value = getattr(self, attr)
+            if not value:
+                continue
+            if attr in ("messages", "unsummarized", "sentiment_history", "topics_discussed"):
+                value = list(value)
+            elif attr == "last_form_trigger":
+                value = value.isoformat()
+            data[key] = value
+        return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> "ConversationMemory":
+        """Restore a session serialized with to_bytes()."""
+        memory = cls()
+        for key, value in json.loads(raw).items():
+            attr = cls.SERIALIZED_FIELDS.get(key)
+            if attr is None:
+                continue
+            if attr in ("messages", "unsummarized"):
+                value = [Message(sys.intern(role), content) for role, content in value]
+            elif attr == "sentiment_history":
+                value = deque(
+                    (Sentiment.from_scores(s) if isinstance(s, dict) else Sentiment(*s) for s in value),
+                    maxlen=cls.SENTIMENT_HISTORY_SIZE
+                )
+            elif attr == "topics_discussed":
+                value = dict.fromkeys(value)
+            elif attr == "last_form_trigger":
+                value = datetime.fromisoformat(value)
+            setattr(memory, attr, value)
+        return memory
+    
+    def approx_size(self) -> int:
+        """Cheap estimate of the session's memory footprint in bytes, used for the cache budget."""
+        size = 1200 + len(self.summary)
+        size += sum(len(msg.content) + 110 for msg in self.messages + self.unsummarized)
+        size += 90 * len(self.sentiment_history)
+        size += sum(len(topic) + 80 for topic in self.topics_discussed)
+        size += 40 * len(self.last_source_ids)
+        return size
+    
+    def take_show_form(self) -> bool:
+        """Return the pending lead-form decision and clear it so it is delivered once."""
+        show_form, self.pending_show_form = self.pending_show_form, False
+        return show_form
             
-        summary_prompt = "Summarize the key points of this conversation about financial services topics:\n\n"
-        for msg in self.messages:
-            summary_prompt += f"{msg['role']}: {msg['content']}\n"
+    def fold_into_summary(self, messages: List[Message], timeout: Optional[float] = None) -> str:
+        """
+        Fold messages that left the recent window into the running summary.
+
+        Only the existing summary and the new messages are sent, so the cost
+        doesn't grow with the length of the conversation.
+
+        Args:
+            messages: Messages evicted since the last fold, oldest first
+            timeout: Timeout for the API call in seconds
+
+        Returns:
+            The updated summary
+        """
+        if not messages:
+            return self.summary
+            
+        summary_prompt = "Update the summary of this conversation about financial services topics with the new messages below. Keep the key points, the user's organization, needs and interests, and anything they asked to follow up on.\n\n"
+        summary_prompt += f"Current summary:\n{self.summary or 'None yet'}\n\nNew messages:\n"
+        for msg in messages:
+            summary_prompt += f"{msg.role}: {msg.content}\n"
             
         response = openai.chat.completions.create(
             model="gpt-3.5-turbo",
             messages=[{"role": "user", "content": summary_prompt}],
-            temperature=0.3
+            temperature=0.3,
+            timeout=timeout
         )
         
-        self.summary = response.choices[0].message.content
-        # Keep only last 4 exchanges after summarization
-        self.messages = self.messages[-8:]
+        return response.choices[0].message.content
         
-    def update_financial_context(self, query: str):
-        """Extract and update financial industry context from the query."""
+    # Most items kept per financial context list; the oldest are dropped first
+    MAX_CONTEXT_ITEMS = 6
+    
+    @classmethod
+    def _merge_items(cls, existing: List[str], new: List[str]) -> List[str]:
+        """Append new items after existing ones, skipping case-insensitive duplicates."""
+        merged, seen = [], set()
+        for item in (existing or []) + (new or []):
+            key = item.strip().lower()
+            if key and key not in seen:
+                seen.add(key)
+                merged.append(item.strip())
+        return merged[-cls.MAX_CONTEXT_ITEMS:]
+    
+    def needs_full_context_analysis(self) -> bool:
+        """Whether this turn's analysis should re-read the conversation instead of just the new message."""
         if self.interaction_count <= 1:
-            # Only analyze full context after initial exchange
+            return False
+        return (self.context_refresh_due
+                or self.interaction_count - self.context_analyzed_turn >= FINANCIAL_CONTEXT_REFRESH_TURNS)
+    
+    def merge_financial_context(self, analysis: Optional[Dict[str, Any]]):
+        """Merge extracted financial context, preserving existing values if new ones are None."""
+        if not analysis:
             return
-            
-        # Combine all user messages to create context
-        all_user_messages = " ".join([msg["content"] for msg in self.messages if msg["role"] == "user"])
-        
-        analysis_prompt = f"""
-Analyze the following conversation from a financial services perspective.
-Extract the following information in JSON format:
-
-1. industry_vertical: The specific financial industry vertical mentioned (banking, insurance, wealth management, etc.)
-2. topics_of_interest: Financial topics the user seems interested in (up to 3)
-3. potential_use_cases: Potential use cases the user might be exploring (up to 3)
-4. detected_pain_points: Business challenges or pain points mentioned (up to 3)
-
-Conversation: {all_user_messages}
+        for key, value in analysis.items():
+            if key in self.financial_context and value:
+                if isinstance(value, list):
+                    # For lists, add new items without duplicates, in a stable order
+                    self.financial_context[key] = self._merge_items(self.financial_context[key], value)
+                else:
+                    self.financial_context[key] = value or self.financial_context[key]
+    
+    def apply_financial_context(self, analysis: Optional[Dict[str, Any]], full: bool, confidence: float):
+        """
+        Apply a financial context extraction to the session.
 
-Respond ONLY with valid JSON, no other text.
-"""
-        
-        try:
-            response = openai.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": analysis_prompt}],
-                temperature=0.1
-            )
-            
-            result_text = response.choices[0].message.content
-            
-            # Extract JSON from the response (handling possible text before/after)
-            import re
-            json_match = re.search(r'({[\s\S]*})', result_text)
-            if json_match:
-                try:
-                    analysis = json.loads(json_match.group(1))
-                    # Update financial context, preserving existing values if new ones are None
-                    for key, value in analysis.items():
-                        if key in self.financial_context and value:
-                            if isinstance(value, list):
-                                # For lists, add new items without duplicates
-                                self.financial_context[key] = list(set((self.financial_context[key] or []) + value))
-                            else:
-                                self.financial_context[key] = value or self.financial_context[key]
-                except json.JSONDecodeError:
-                    logger.warning("Failed to parse financial context JSON")
-        except Exception as e:
-            logger.warning(f"Error updating financial context: {e}")
+        Args:
+            analysis: Extracted context, or None if the extraction failed
+            full: The extraction covered the conversation rather than just the
+                latest message, so its lists replace the stored ones
+            confidence: How well the model thinks the stored context still
+                describes the user; a low score schedules a full re-analysis
+        """
+        if analysis is None:
+            return
+        if full:
+            for key, value in analysis.items():
+                if key not in self.financial_context:
+                    continue
+                if isinstance(value, list):
+                    self.financial_context[key] = self._merge_items([], value)
+                elif value:
+                    self.financial_context[key] = value
+            self.context_analyzed_turn = self.interaction_count
+            self.context_refresh_due = False
+        else:
+            self.merge_financial_context(analysis)
+            self.context_refresh_due = confidence < FINANCIAL_CONTEXT_MIN_CONFIDENCE
 
     def should_show_form(self, intent_scores: Dict[str, float]) -> bool:
         """Determine if we should show the lead form based on various factors."""
@@ -160,7 +398,7 @@ Respond ONLY with valid JSON, no other text.
         
         # Lead-related detection - check for keywords in the recent messages
         recent_msgs = self.messages[-min(4, len(self.messages)):]
-        recent_text = ' '.join([msg["content"] for msg in recent_msgs if msg["role"] == "user"]).lower()
+        recent_text = ' '.join([msg.content for msg in recent_msgs if msg.role == "user"]).lower()
         lead_keywords = ["contact", "email", "call", "talk to", "expert", "consultant", "demo", "meeting", 
                         "speak with", "pricing", "cost", "quote", "proposal", "help us", "our bank", "our company"]
         
@@ -170,20 +408,61 @@ Respond ONLY with valid JSON, no other text.
         # Show form if discussing important financial services topics after enough exchanges
         if has_high_value_topic and self.interaction_count >= 3:
             # Check if sentiment is positive
-            recent_sentiments = self.sentiment_history[-min(3, len(self.sentiment_history)):]
-            avg_positive = sum(s.get("positive", 0) for s in recent_sentiments) / len(recent_sentiments)
+            recent_sentiments = list(self.sentiment_history)[-3:] or [Sentiment.from_scores(DEFAULT_SENTIMENT)]
+            avg_positive = sum(s.positive for s in recent_sentiments) / len(recent_sentiments)
             if avg_positive > 0.65:
                 return True
         
         return False
 
-# Maps session_id → ConversationMemory
-sessions: Dict[str, ConversationMemory] = {}
+# Maps session_id → ConversationMemory; in-process by default, or shared
+# between workers with the sqlite/redis backends
+sessions: SessionStore = create_session_store(
+    SESSION_STORE,
+    encode=ConversationMemory.to_bytes,
+    decode=ConversationMemory.from_bytes,
+    sqlite_path=SESSION_DB_PATH,
+    redis_url=REDIS_URL,
+    max_sessions=SESSION_MAX_COUNT,
+    ttl=SESSION_TTL,
+    max_bytes=SESSION_MAX_BYTES,
+    sizeof=ConversationMemory.approx_size,
+    snapshot_path=SESSION_SNAPSHOT_PATH
+)
+
+async def snapshot_sessions():
+    """Write the sessions changed since the last snapshot to the snapshot database."""
+    # Sessions are mutated on the event loop, so they are encoded here and
+    # only the compression and write go to a thread
+    batch = sessions.collect_snapshot()
+    await run_blocking(sessions.write_snapshot, batch)
+
+async def snapshot_sessions_periodically():
+    while True:
+        await asyncio.sleep(SESSION_SNAPSHOT_INTERVAL)
+        try:
+            await snapshot_sessions()
+        except Exception as e:
+            logger.error(f"Session snapshot failed: {e}", exc_info=True)
+
+EMAIL_PATTERN = re.compile(r'[\w.+-]+@[\w-]+(?:\.[\w-]+)+')
+
+async def index_message_emails(sid: str, text: str):
+    """Index email addresses in a stored message so /lead can find the session in O(1)."""
+    for email in set(EMAIL_PATTERN.findall(text)):
+        await session_call(sessions.index_email, email.lower(), sid)
+
+async def session_call(fn: Callable[..., Any], *args) -> Any:
+    """Call a session store method, off the event loop when the call does I/O."""
+    if sessions.blocks(fn.__name__, *args):
+        return await run_blocking(fn, *args)
+    return fn(*args)
 
 # ─── REQUEST & RESPONSE SCHEMAS ────────────────────────────────────────────────
 class ChatRequest(BaseModel):
     message: str
     session_id: Optional[str] = None
+    deadline_ms: Optional[int] = Field(default=None, gt=0)  # Capped at REQUEST_DEADLINE_SECONDS
 
 class ChatResponse(BaseModel):
     reply: str
@@ -191,6 +470,7 @@ class ChatResponse(BaseModel):
     session_id: str
     sources: List[Dict[str, Any]] = []
     suggested_questions: List[str] = []  # Keep it in the model but don't populate it
+    skipped_stages: List[str] = []  # Optional stages dropped to meet the request deadline
 
 class LeadRequest(BaseModel):
     name: str
@@ -200,6 +480,7 @@ class LeadRequest(BaseModel):
     industry: Optional[str] = None  # Added for financial services
     job_title: Optional[str] = None  # Added for financial services
     company_size: Optional[str] = None  # Added for financial services
+    session_id: Optional[str] = None  # Chat session the lead came from, if known
 
 class LeadResponse(BaseModel):
     status: str
@@ -217,14 +498,14 @@ def get_qdrant_client():
 async def health():
     # Check OpenAI connection
     try:
-        openai.models.list()
+        await run_blocking(openai.models.list)
     except Exception as e:
         logger.error(f"OpenAI connection error: {e}")
         return {"status": "error", "message": "OpenAI connection failed"}
     
     # Check Qdrant connection
     try:
-        collections = qdrant.get_collections()
+        collections = await run_blocking(qdrant.get_collections)
         collection_names = [c.name for c in collections.collections]
         if COLLECTION not in collection_names:
             return {"status": "warning", "message": f"Qdrant connection OK but collection '{COLLECTION}' not found"}
@@ -234,6 +515,21 @@ async def health():
         
     return {"status": "ok"}
 
+# ─── METRICS ───────────────────────────────────────────────────────────────────
+@app.get("/metrics")
+async def metrics():
+    """Session cache size/eviction counters, per-session lock waits, cache hit rates and background queue state."""
+    return {
+        "sessions": await session_call(sessions.stats),
+        "session_locks": session_locks.stats(),
+        "embedding_cache": embedding_cache.stats(),
+        "retrieval_cache": retrieval_cache_stats(),
+        "vector_engine": vector_engine.stats() if vector_engine else None,
+        "lexical_index": lexical_index_stats(),
+        "deadlines": deadline_stats(),
+        "background_queue": background_queue.stats()
+    }
+
 # ─── GREETING HANDLER ───────────────────────────────────────────────────────────
 def is_greeting(message: str) -> bool:
     """Check if the message is a simple greeting."""
@@ -376,51 +672,236 @@ def create_financial_filters(terms: List[str]) -> Dict[str, Any]:
     
     return {}
 
-def enhanced_financial_search(query: str, qdrant_client, openai_client, limit: int = 7):
-    """Enhanced search optimized for financial services queries."""
+def retrieval_timeout(deadline: Optional[Deadline]) -> Optional[float]:
+    """Seconds left of the retrieval share of the request deadline, None without a deadline."""
+    return deadline.checkpoint(RETRIEVAL_DEADLINE_SHARE) if deadline is not None else None
+
+def qdrant_timeout(deadline: Optional[Deadline]) -> Optional[int]:
+    """The retrieval timeout in the whole seconds (at least one) Qdrant's timeout parameter takes."""
+    seconds = retrieval_timeout(deadline)
+    return max(1, math.ceil(seconds)) if seconds is not None else None
+
+def enhanced_financial_search(query: str, qdrant_client, openai_client, limit: int = 7, deadline: Optional[Deadline] = None):
+    """Enhanced search optimized for financial services queries, bounded by the deadline's retrieval share."""
     # Extract financial terms
     financial_terms = extract_financial_terms(query)
     
-    # Generate embedding
-    emb_response = openai_client.embeddings.create(
-        input=query,
-        model="text-embedding-ada-002"
+    # Generate embedding (repeated queries come from the shared cache)
+    query_vector = embedding_cache.embed(openai_client, query, timeout=retrieval_timeout(deadline))
+    
+    # Keyword matches are ranked in-process; only the vector side needs Qdrant
+    lexical_hits = lexical_search(query, qdrant_client) if HYBRID_SEARCH else None
+    
+    # Paraphrases of a recent query with the same financial terms reuse its
+    # results; the embedding similarity threshold decides what counts as one.
+    # Keyword hits stay out of the key: paraphrases rarely share them exactly.
+    retrieval_cache = get_retrieval_cache(COLLECTION)
+    mode = "hybrid" if lexical_hits is not None else "enhanced"
+    cache_key = f"{mode}:{limit}:{'|'.join(sorted(financial_terms))}"
+    cached = retrieval_cache.lookup(query_vector, cache_key)
+    if cached is not None:
+        return cached
+    
+    search_client = vector_engine or qdrant_client
+    candidates = limit * SEARCH_CANDIDATES_PER_RESULT
+    if lexical_hits is not None:
+        search_results = _hybrid_search(query_vector, lexical_hits, search_client, candidates, qdrant_timeout(deadline))
+    else:
+        search_results = _enhanced_search(query_vector, financial_terms, search_client, candidates, qdrant_timeout(deadline))
+    
+    # Several chunks of one page carry mostly the same information: keep the
+    # best of each page, then the relevant hits least like those already picked
+    search_results = collapse_by_document(search_results, MAX_CHUNKS_PER_DOCUMENT)
+    if MMR_DIVERSITY > 0 and len(search_results) > limit:
+        search_results = attach_vectors(search_results, search_client, qdrant_timeout(deadline))
+        search_results = mmr_select(search_results, limit, MMR_DIVERSITY)
+        for hit in search_results:
+            # Cached results don't need the vectors
+            hit.vector = None
+    # Only the hits that reach the prompt fetch their text
+    search_results = hydrate_payloads(search_results[:limit], search_client, qdrant_timeout(deadline))
+    retrieval_cache.store(query_vector, cache_key, search_results)
+    return search_results
+
+def attach_vectors(hits: List[Any], qdrant_client, timeout: Optional[int] = None) -> List[Any]:
+    """
+    Fetch the vectors of search hits for diversification, without their payloads.
+
+    Args:
+        hits: Ranked search results
+        qdrant_client: Client (or vector engine) for the single batched retrieve
+        timeout: Qdrant request timeout in seconds
+
+    Returns:
+        The hits in the same order, without any deleted since the search; a
+        hit whose vector doesn't come back makes MMR keep the rank order
+    """
+    missing = [hit for hit in hits if hit.vector is None]
+    if not missing:
+        return hits
+    points = qdrant_client.retrieve(
+        collection_name=COLLECTION,
+        ids=[hit.id for hit in missing],
+        with_payload=False,
+        with_vectors=True,
+        timeout=timeout
     )
-    query_vector = emb_response.data[0].embedding
-    
-    # Initial semantic search
-    search_results = qdrant_client.search(
+    vectors = {point.id: point.vector for point in points}
+    for hit in missing:
+        hit.vector = vectors.get(hit.id)
+    return [hit for hit in hits if hit.id in vectors or hit.vector is not None]
+
+def hydrate_payloads(hits: List[Any], qdrant_client, timeout: Optional[int] = None) -> List[Any]:
+    """
+    Fill in the prompt fields of hits searched with SEARCH_PAYLOAD_FIELDS.
+
+    Args:
+        hits: Ranked search results; hits that already carry the text are left alone
+        qdrant_client: Client (or vector engine) for the single batched retrieve
+        timeout: Qdrant request timeout in seconds
+
+    Returns:
+        The hits in the same order, without any deleted since the search
+    """
+    missing = [hit for hit in hits if "text" not in (hit.payload or {})]
+    if not missing:
+        return hits
+    points = qdrant_client.retrieve(
         collection_name=COLLECTION,
-        query_vector=query_vector,
-        limit=limit,
-        score_threshold=0.7
+        ids=[hit.id for hit in missing],
+        with_payload=PROMPT_PAYLOAD_FIELDS,
+        timeout=timeout
     )
+    points = {point.id: point for point in points}
+    for hit in missing:
+        point = points.get(hit.id)
+        if point is None:
+            continue
+        hit.payload = {**(hit.payload or {}), **(point.payload or {})}
+    return [hit for hit in hits if "text" in (hit.payload or {})]
+
+def lexical_search(query: str, qdrant_client) -> Optional[List[Tuple[Any, float]]]:
+    """BM25 hits for the query as (point id, score), or None while the keyword index is unavailable."""
+    index = get_lexical_index(qdrant_client, COLLECTION)
+    if index is None:
+        # Loading or building in the background (a failure is logged there)
+        return None
+    return index.search(query, LEXICAL_CANDIDATES)
+
+def _hybrid_search(
+    query_vector: List[float],
+    lexical_hits: List[Tuple[Any, float]],
+    qdrant_client,
+    limit: int,
+    timeout: Optional[int] = None
+):
+    """Vector search fused with BM25 hits by reciprocal rank fusion, in one round trip."""
+    requests = [
+        models.QueryRequest(
+            query=query_vector,
+            limit=limit * 2,
+            score_threshold=0.65,
+            with_payload=SEARCH_PAYLOAD_FIELDS,
+            params=SEARCH_PARAMS
+        )
+    ]
+    if lexical_hits:
+        # Payloads and similarity scores of the keyword hits come back in the same batch
+        requests.append(
+            models.QueryRequest(
+                query=query_vector,
+                filter=models.Filter(must=[models.HasIdCondition(has_id=[point_id for point_id, _ in lexical_hits])]),
+                limit=len(lexical_hits),
+                with_payload=SEARCH_PAYLOAD_FIELDS,
+                params=SEARCH_PARAMS
+            )
+        )
+    responses = [
+        response.points
+        for response in qdrant_client.query_batch_points(collection_name=COLLECTION, requests=requests, timeout=timeout)
+    ]
     
-    # If financial terms detected or limited results, try with filters
-    if financial_terms and (len(search_results) < 3 or max([r.score for r in search_results] or [0]) < 0.75):
-        filters = create_financial_filters(financial_terms)
-        
-        if filters:
-            filtered_results = qdrant_client.search(
+    fused: Dict[Any, float] = {}
+    points = {}
+    for rank, hit in enumerate(responses[0]):
+        fused[hit.id] = 1 / (RRF_K + rank + 1)
+        points[hit.id] = hit
+    keyword_points = {hit.id: hit for hit in responses[1]} if lexical_hits else {}
+    for rank, (point_id, _) in enumerate(lexical_hits):
+        hit = keyword_points.get(point_id)
+        if hit is None:
+            # Deleted since the index was built
+            continue
+        fused[point_id] = fused.get(point_id, 0.0) + 1 / (RRF_K + rank + 1)
+        points.setdefault(point_id, hit)
+    
+    # Hits keep their cosine score; only the order comes from the fused ranks
+    ranked = sorted(fused, key=fused.get, reverse=True)[:limit]
+    return [points[point_id] for point_id in ranked]
+
+def _enhanced_search(
+    query_vector: List[float],
+    financial_terms: List[str],
+    qdrant_client,
+    limit: int,
+    timeout: Optional[int] = None
+):
+    """Semantic search, plus a filtered search when financial terms are present and the results are weak."""
+    filters = create_financial_filters(financial_terms) if financial_terms else {}
+    
+    if filters:
+        # Issue the filtered search together with the initial one so a weak
+        # initial result doesn't cost a second round trip
+        search_results, filtered_results = [
+            response.points
+            for response in qdrant_client.query_batch_points(
                 collection_name=COLLECTION,
-                query_vector=query_vector,
-                filter=filters,
-                limit=limit,
-                score_threshold=0.65  # Lower threshold for filtered search
+                requests=[
+                    models.QueryRequest(
+                        query=query_vector,
+                        limit=limit,
+                        score_threshold=0.7,
+                        with_payload=SEARCH_PAYLOAD_FIELDS,
+                        params=SEARCH_PARAMS
+                    ),
+                    models.QueryRequest(
+                        query=query_vector,
+                        filter=models.Filter(**filters),
+                        limit=limit,
+                        score_threshold=0.65,  # Lower threshold for filtered search
+                        with_payload=SEARCH_PAYLOAD_FIELDS,
+                        params=SEARCH_PARAMS
+                    )
+                ],
+                timeout=timeout
             )
-            
-            # Combine and deduplicate results
-            seen_ids = set(r.id for r in search_results)
-            combined_results = list(search_results)
-            
-            for result in filtered_results:
-                if result.id not in seen_ids:
-                    combined_results.append(result)
-                    seen_ids.add(result.id)
-            
-            # Sort by score and return top results
-            combined_results.sort(key=lambda x: x.score, reverse=True)
-            return combined_results[:limit]
+        ]
+    else:
+        # Initial semantic search
+        search_results = qdrant_client.query_points(
+            collection_name=COLLECTION,
+            query=query_vector,
+            limit=limit,
+            score_threshold=0.7,
+            with_payload=SEARCH_PAYLOAD_FIELDS,
+            search_params=SEARCH_PARAMS,
+            timeout=timeout
+        ).points
+    
+    # If financial terms detected and limited results, use the filtered results too
+    if filters and (len(search_results) < 3 or max([r.score for r in search_results] or [0]) < 0.75):
+        # Combine and deduplicate results
+        seen_ids = set(r.id for r in search_results)
+        combined_results = list(search_results)
+        
+        for result in filtered_results:
+            if result.id not in seen_ids:
+                combined_results.append(result)
+                seen_ids.add(result.id)
+        
+        # Sort by score and return top results
+        combined_results.sort(key=lambda x: x.score, reverse=True)
+        return combined_results[:limit]
     
     return search_results
 
@@ -434,7 +915,7 @@ def generate_financial_prompt(query: str, context: str, memory: ConversationMemo
     is_followup = any(phrase in query.lower() for phrase in ["more", "additional", "follow up", "followup", "another", "similar", "also", "too"])
     
     # Get previous responses to check for redundancy
-    previous_responses = [msg["content"] for msg in memory.messages if msg["role"] == "assistant"]
+    previous_responses = [msg.content for msg in memory.messages if msg.role == "assistant"]
     
     system_prompt = """You are AnaptIQ, an executive-level consultant specializing in digital transformation, banking technology, and managed services for the financial services industry. Your responses should:
 
@@ -487,8 +968,16 @@ Instead:
     
     return full_prompt
 
-def format_financial_response(response: str, query: str) -> str:
-    """Format response for financial services with executive summary and improved readability."""
+# Used when the recommendations sub-call fails or doesn't fit the deadline
+DEFAULT_RECOMMENDATIONS = "• Consider implementing the solutions discussed above to drive business value\n• Partner with experienced consultants to ensure successful execution\n• Start with a pilot project to validate the approach before scaling"
+
+def format_financial_response(response: str, query: str, deadline: Optional[Deadline] = None) -> str:
+    """
+    Format response for financial services with executive summary and improved readability.
+
+    The summary and recommendation sub-calls are skipped when the request
+    deadline leaves less than OPTIONAL_STAGE_MIN_SECONDS for them.
+    """
     # Check if response already has good structure
     has_headers = '##' in response or '# ' in response
     
@@ -504,6 +993,9 @@ def format_financial_response(response: str, query: str) -> str:
     
     # For complex responses without good structure, generate an executive summary
     if is_complex and not has_headers:
+        if deadline is not None and not deadline.allows("executive_summary", OPTIONAL_STAGE_MIN_SECONDS, DEADLINE_FINISH_RESERVE):
+            return response
+        
         summary_prompt = f"""
 Create a brief executive summary (2-3 bullet points) of the following response to a financial services question.
 Focus on key strategic insights and actionable recommendations. Keep it concise and impactful.
@@ -518,7 +1010,8 @@ Format as "## Executive Summary" followed by bullet points.
             summary_result = openai.chat.completions.create(
                 model="gpt-3.5-turbo",
                 messages=[{"role": "user", "content": summary_prompt}],
-                temperature=0.3
+                temperature=0.3,
+                timeout=deadline.remaining(DEADLINE_FINISH_RESERVE) if deadline else None
             )
             
             summary = summary_result.choices[0].message.content
@@ -592,17 +1085,21 @@ Response: {response}
 
 Format as bullet points only, no introduction text.
 """
-                            try:
-                                rec_result = openai.chat.completions.create(
-                                    model="gpt-3.5-turbo",
-                                    messages=[{"role": "user", "content": recommendation_prompt}],
-                                    temperature=0.3
-                                )
-                                recommendations = rec_result.choices[0].message.content
-                                formatted_paragraphs.append(recommendations)
-                            except Exception as e:
-                                logger.warning(f"Error generating recommendations: {e}")
-                                formatted_paragraphs.append("• Consider implementing the solutions discussed above to drive business value\n• Partner with experienced consultants to ensure successful execution\n• Start with a pilot project to validate the approach before scaling")
+                            if deadline is not None and not deadline.allows("recommendations", OPTIONAL_STAGE_MIN_SECONDS, DEADLINE_FINISH_RESERVE):
+                                formatted_paragraphs.append(DEFAULT_RECOMMENDATIONS)
+                            else:
+                                try:
+                                    rec_result = openai.chat.completions.create(
+                                        model="gpt-3.5-turbo",
+                                        messages=[{"role": "user", "content": recommendation_prompt}],
+                                        temperature=0.3,
+                                        timeout=deadline.remaining(DEADLINE_FINISH_RESERVE) if deadline else None
+                                    )
+                                    recommendations = rec_result.choices[0].message.content
+                                    formatted_paragraphs.append(recommendations)
+                                except Exception as e:
+                                    logger.warning(f"Error generating recommendations: {e}")
+                                    formatted_paragraphs.append(DEFAULT_RECOMMENDATIONS)
                     else:
                         # For very short responses, just add paragraphs without additional structure
                         formatted_paragraphs.extend(improved_paragraphs)
@@ -623,76 +1120,7 @@ def format_source_reference(source: Dict[str, Any]) -> str:
     """Format a source reference in markdown."""
     return f"[{source['title']}]({source['url']})"
 
-def classify_intent(message: str) -> Dict[str, float]:
-    """Classify user intent with financial services focus."""
-    prompt = f"""Classify the user's message into these categories for a financial services chatbot (respond with numbers 0-1 for each):
-    - information_seeking: Looking for general information
-    - product_interest: Interest in specific products/services
-    - technical_question: Technical or implementation questions
-    - contact_request: Wanting to contact or engage with sales
-    - compliance_question: Questions about regulatory compliance
-    - implementation_interest: Interest in implementation details or methodology
-    
-    Message: {message}
-    
-    Respond in JSON format only."""
-    
-    response = openai.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.1
-    )
-    
-    try:
-        import json
-        return json.loads(response.choices[0].message.content)
-    except:
-        return {
-            "information_seeking": 0.25,
-            "product_interest": 0.25,
-            "technical_question": 0.25,
-            "contact_request": 0.25,
-            "compliance_question": 0.0,
-            "implementation_interest": 0.0
-        }
-
 # ─── INTELLIGENCE FUNCTIONS ───────────────────────────────────────────────────
-def analyze_sentiment(text: str) -> Dict[str, float]:
-    """Analyze sentiment of user message."""
-    prompt = f"""Analyze the sentiment of this message and return ONLY a JSON object with these scores (0-1):
-    - positive: How positive/satisfied the user seems
-    - negative: How negative/frustrated the user seems
-    - neutral: How neutral/objective the user seems
-    
-    Message: {text}"""
-    
-    response = openai.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.1
-    )
-    
-    try:
-        return json.loads(response.choices[0].message.content)
-    except:
-        return {"positive": 0.33, "negative": 0.33, "neutral": 0.34}
-
-def extract_topics(text: str) -> List[str]:
-    """Extract main topics from text with financial services focus."""
-    prompt = f"""Extract 2-3 main financial services topics/themes from this text as a comma-separated list.
-    Focus on banking, finance, compliance, technology, and related domains.
-    
-    Text: {text}"""
-    
-    response = openai.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.1
-    )
-    
-    topics = [t.strip() for t in response.choices[0].message.content.split(",")]
-    return topics[:3]
-
 def personalize_response(base_response: str, memory: ConversationMemory) -> str:
     """Personalize response based on conversation history and financial context."""
     if not memory.topics_discussed and not memory.financial_context["industry_vertical"]:
@@ -726,8 +1154,8 @@ def personalize_response(base_response: str, memory: ConversationMemory) -> str:
 
 def generate_lead_email(memory: ConversationMemory) -> str:
     """Generate lead email content based on conversation history with financial services focus."""
-    topics = list(set(memory.topics_discussed))  # Remove duplicates
-    sentiment_summary = "Positive" if sum(s.get("positive", 0) for s in memory.sentiment_history) > sum(s.get("negative", 0) for s in memory.sentiment_history) else "Mixed"
+    topics = list(memory.topics_discussed)
+    sentiment_summary = "Positive" if sum(s.positive for s in memory.sentiment_history) > sum(s.negative for s in memory.sentiment_history) else "Mixed"
     
     # Add financial context if available
     financial_context = ""
@@ -743,8 +1171,8 @@ def generate_lead_email(memory: ConversationMemory) -> str:
     if len(memory.messages) > 0:
         recent_msgs = memory.messages[-min(6, len(memory.messages)):]
         for msg in recent_msgs:
-            role_name = "Customer" if msg["role"] == "user" else "AnaptIQ"
-            recent_conversation += f"\n{role_name}: {msg['content'][:300]}..."
+            role_name = "Customer" if msg.role == "user" else "AnaptIQ"
+            recent_conversation += f"\n{role_name}: {msg.content[:300]}..."
     
     email_content = f"""
     New Financial Services Lead from Chatbot Interaction
@@ -765,27 +1193,160 @@ def generate_lead_email(memory: ConversationMemory) -> str:
     
     return email_content
 
-def detect_content_preferences(message: str) -> Dict[str, Any]:
-    """Detect content type and topic preferences with financial services focus."""
-    prompt = f"""Analyze this message and return ONLY a JSON object with these fields:
-    - content_type: What type of content they're looking for (case_study, whitepaper, blog, guide, or null if unclear)
-    - industry: Which financial industry they're interested in (banking, insurance, wealth_management, investment_banking, payments, or null)
-    - topic: What financial topic they're interested in (digital_transformation, core_banking, compliance, risk_management, payments, cloud, ai_ml, or null)
-    
-    Message: {message}
-    
-    Example response: {{"content_type": "case_study", "industry": "banking", "topic": "digital_transformation"}}"""
-    
-    response = openai.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.1
-    )
+# ─── FUSED TURN ANALYSIS ───────────────────────────────────────────────────────
+class SentimentScores(BaseModel):
+    positive: float = Field(ge=0, le=1)
+    negative: float = Field(ge=0, le=1)
+    neutral: float = Field(ge=0, le=1)
+
+class IntentScores(BaseModel):
+    information_seeking: float = Field(ge=0, le=1)
+    product_interest: float = Field(ge=0, le=1)
+    technical_question: float = Field(ge=0, le=1)
+    contact_request: float = Field(ge=0, le=1)
+    compliance_question: float = Field(ge=0, le=1)
+    implementation_interest: float = Field(ge=0, le=1)
+
+class ContentPreferences(BaseModel):
+    content_type: Optional[str] = None
+    industry: Optional[str] = None
+    topic: Optional[str] = None
+
+class FinancialContextUpdate(BaseModel):
+    industry_vertical: Optional[str] = None
+    topics_of_interest: List[str] = []
+    potential_use_cases: List[str] = []
+    detected_pain_points: List[str] = []
+
+# Each field of the fused response is validated on its own so one bad field
+# only costs that field, not the whole analysis
+TURN_ANALYSIS_SCHEMA: Dict[str, TypeAdapter] = {
+    "sentiment": TypeAdapter(SentimentScores),
+    "topics": TypeAdapter(List[str]),
+    "intent": TypeAdapter(IntentScores),
+    "preferences": TypeAdapter(ContentPreferences),
+    "financial_context": TypeAdapter(Optional[FinancialContextUpdate]),
+    "context_confidence": TypeAdapter(Annotated[float, Field(ge=0, le=1)]),
+}
+
+def default_turn_analysis() -> Dict[str, Any]:
+    """Per-field fallbacks used when the fused analysis fails or a field is invalid."""
+    return {
+        "sentiment": dict(DEFAULT_SENTIMENT),
+        "topics": [],
+        "intent": dict(DEFAULT_INTENT),
+        "preferences": dict(DEFAULT_PREFERENCES),
+        "financial_context": None,
+        "context_confidence": 1.0
+    }
+
+def parse_turn_analysis(result_text: str) -> Dict[str, Any]:
+    """Validate a fused analysis response field by field, falling back to defaults."""
+    analysis = default_turn_analysis()
+    try:
+        data = json.loads(result_text)
+    except (TypeError, json.JSONDecodeError):
+        logger.warning("Failed to parse turn analysis JSON")
+        return analysis
+    
+    if not isinstance(data, dict):
+        logger.warning("Turn analysis response is not a JSON object")
+        return analysis
+    
+    for field, adapter in TURN_ANALYSIS_SCHEMA.items():
+        if field not in data:
+            continue
+        try:
+            value = adapter.validate_python(data[field])
+        except ValidationError:
+            logger.warning(f"Invalid '{field}' in turn analysis, using default")
+            continue
+        analysis[field] = value.model_dump() if isinstance(value, BaseModel) else value
+    
+    analysis["topics"] = [t.strip() for t in analysis["topics"] if t.strip()][:3]
+    if analysis["financial_context"]:
+        for key in ("topics_of_interest", "potential_use_cases", "detected_pain_points"):
+            analysis["financial_context"][key] = analysis["financial_context"][key][:3]
+    return analysis
+
+def financial_context_input(memory: ConversationMemory, full: bool) -> str:
+    """
+    The part of the analysis prompt that carries the session's financial context.
+
+    Args:
+        memory: The session's conversation memory
+        full: Include the conversation for a full re-analysis
+
+    Returns:
+        The known context, plus the summary and recent user messages when full
+    """
+    known = {key: value for key, value in memory.financial_context.items() if value}
+    text = f"\nKnown financial context: {json.dumps(known) if known else 'none'}\n"
+    if full:
+        if memory.summary:
+            text += f"\nConversation summary: {memory.summary}\n"
+        conversation = " ".join([msg.content for msg in memory.messages if msg.role == "user"])
+        text += f"\nEarlier conversation: {conversation}\n"
+    return text
+
+def analyze_turn(message: str, memory: ConversationMemory, timeout: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Analyze a user message with one structured-output call.
+
+    Replaces the separate sentiment, topic, intent, content preference and
+    financial context prompts.
+
+    Args:
+        message: The user's message
+        memory: The session's conversation memory
+        timeout: Timeout in seconds for the OpenAI request
+
+    Returns:
+        Dict with ``sentiment``, ``topics``, ``intent``, ``preferences``,
+        ``financial_context`` and ``context_confidence`` keys, and
+        ``full_context`` telling whether the conversation was re-analyzed
+    """
+    # Financial context is normally extracted from this message alone and
+    # merged into what is already known; the conversation is only re-read
+    # periodically or when the model's confidence in the known context drops
+    full = memory.needs_full_context_analysis()
+    source = "this message and the earlier conversation below" if full else \
+        "this message only (empty lists for anything it doesn't mention)"
+    
+    prompt = f"""Analyze this message to a financial services chatbot and return ONLY a JSON object with these fields:
+- sentiment: object with scores (0-1) for positive, negative and neutral
+- topics: list of 2-3 main financial services topics/themes (banking, finance, compliance, technology and related domains)
+- intent: object with scores (0-1) for information_seeking, product_interest, technical_question, contact_request, compliance_question and implementation_interest
+- preferences: object with
+    - content_type: case_study, whitepaper, blog, guide, or null if unclear
+    - industry: banking, insurance, wealth_management, investment_banking, payments, or null
+    - topic: digital_transformation, core_banking, compliance, risk_management, payments, cloud, ai_ml, or null
+- financial_context: object with these fields, extracted from {source}:
+    - industry_vertical: the specific financial industry vertical mentioned (banking, insurance, wealth management, etc.) or null
+    - topics_of_interest: financial topics the user seems interested in (up to 3)
+    - potential_use_cases: potential use cases the user might be exploring (up to 3)
+    - detected_pain_points: business challenges or pain points mentioned (up to 3)
+- context_confidence: score (0-1) for how well the known financial context still describes the user given this message; low if the message contradicts it or shifts focus
+
+Message: {message}
+"""
+    prompt += financial_context_input(memory, full)
     
     try:
-        return json.loads(response.choices[0].message.content)
-    except:
-        return {"content_type": None, "industry": None, "topic": None}
+        response = openai.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=[{"role": "user", "content": prompt}],
+            response_format={"type": "json_object"},
+            temperature=0.1,
+            timeout=timeout
+        )
+    except Exception as e:
+        logger.warning(f"Error analyzing turn: {e}")
+        analysis = default_turn_analysis()
+    else:
+        analysis = parse_turn_analysis(response.choices[0].message.content)
+    analysis["full_context"] = full
+    return analysis
 
 def generate_clarification_prompt(preferences: Dict[str, Any], available_content: List[Dict[str, Any]]) -> str:
     """Generate a clarification prompt based on available content with financial services focus."""
@@ -908,202 +1469,588 @@ def clean_response_format(text: str) -> str:
     
     return text
 
-# ─── CHAT ENDPOINT ─────────────────────────────────────────────────────────────
-@app.post("/chat", response_model=ChatResponse)
-async def chat(
-    req: ChatRequest,
-    openai_client: OpenAI = Depends(get_openai_client),
-    qdrant_client: QdrantClient = Depends(get_qdrant_client)
-):
-    try:
-        logger.info(f"Received chat request: {req.message[:50]}... (session: {req.session_id})")
-        
-        # Get or create session
-        sid = req.session_id or str(uuid.uuid4())
-        is_new_session = False
-        
-        if sid not in sessions:
-            logger.info(f"Creating new session: {sid}")
-            sessions[sid] = ConversationMemory()
-            is_new_session = True
-            welcome_message = generate_welcome_message()
-            return ChatResponse(
-                reply=welcome_message,
-                show_form=False,
-                session_id=sid,
-                sources=[],
-                suggested_questions=[]
-            )
-            
-        memory = sessions[sid]
-        
-        # Check if this is a simple greeting
-        if is_greeting(req.message):
-            logger.info(f"Greeting detected: {req.message}")
-            
-            # Only show welcome message for first greeting or new session
-            is_first_greeting = is_new_session or len(memory.messages) == 0
-            greeting_response = generate_greeting_response(is_first_greeting)
-            
-            # Update conversation memory
-            sentiment = {"positive": 0.8, "negative": 0.0, "neutral": 0.2}
-            topics = ["greeting"]
-            
-            # Check for duplicate messages to avoid adding the same exchange twice
-            if not memory.messages or memory.messages[-1]["content"] != greeting_response:
-                memory.add_exchange(req.message, greeting_response, sentiment, topics)
-            
-            return ChatResponse(
-                reply=greeting_response,
-                show_form=False,
-                session_id=sid,
-                sources=[],
-                suggested_questions=[]
-            )
-        
-        # Check for duplicate message (avoid processing the same message twice)
-        if memory.messages and len(memory.messages) >= 2 and memory.messages[-2]["content"] == req.message:
-            logger.info(f"Duplicate message detected: {req.message}")
-            return ChatResponse(
-                reply="I noticed you sent the same message twice. Did you have any additional questions or would you like me to elaborate further on my previous response?",
-                show_form=False,
-                session_id=sid,
-                sources=[],
-                suggested_questions=[]
-            )
-        
-        # Log the current request
-        logger.info(f"Processing request: {req.message}")
-        
-        # Update financial context from query
-        memory.update_financial_context(req.message)
-        
-        # Analyze message for content preferences with financial focus
-        preferences = detect_content_preferences(req.message)
-        
-        # Enhanced search for financial services content
-        search_results = enhanced_financial_search(
-            query=req.message,
-            qdrant_client=qdrant_client,
-            openai_client=openai_client
+# ─── ANALYSIS STAGE ────────────────────────────────────────────────────────────
+async def run_analysis_stage(
+    calls: Dict[str, Tuple[Callable[..., Any], Any]],
+    timeout: float = ANALYSIS_TIMEOUT
+) -> Dict[str, Any]:
+    """
+    Run independent blocking analysis calls concurrently and merge their results.
+
+    Args:
+        calls: Maps a result name to a (callable, default) pair. Each callable
+            receives a ``timeout`` keyword that it should pass to its API call.
+        timeout: Per-call timeout in seconds
+
+    Returns:
+        Dict of result name to the call's result, or its default when the
+        call failed or timed out
+    """
+    loop = asyncio.get_running_loop()
+    names = list(calls)
+    pending = [
+        asyncio.wait_for(
+            loop.run_in_executor(analysis_executor, lambda fn=fn: fn(timeout=timeout)),
+            timeout=timeout
         )
+        for fn, _ in calls.values()
+    ]
+    results = await asyncio.gather(*pending, return_exceptions=True)
+
+    merged = {}
+    for name, result in zip(names, results):
+        if isinstance(result, BaseException):
+            logger.warning(f"Analysis call '{name}' failed: {result!r}")
+            merged[name] = calls[name][1]
+        else:
+            merged[name] = result
+    return merged
+
+class TurnAnalytics:
+    """
+    Results of a turn's background analysis, applied to the session once.
+
+    Args:
+        sid: Session the turn belongs to
+        results: run_analysis_stage results ("turn" and, if messages were
+            evicted, "summary")
+        evicted: Messages folded into the summary
+        previous_summary: Summary the fold started from
+    """
+    def __init__(self, sid: str, results: Dict[str, Any], evicted: int, previous_summary: str):
+        self.sid = sid
+        self.results = results
+        self.evicted = evicted
+        self.previous_summary = previous_summary
+        self.applied = False
+
+    def apply(self, memory: ConversationMemory):
+        """Update the session; the caller holds the session lock and saves it."""
+        self.applied = True
+        analysis = self.results["turn"]
+        memory.apply_financial_context(
+            analysis["financial_context"], analysis["full_context"], analysis["context_confidence"]
+        )
+        memory.content_preferences = analysis["preferences"]
+        memory.record_analysis(analysis["sentiment"], analysis["topics"])
         
-        # Handle weak or no results
-        if not search_results or (len(search_results) == 1 and search_results[0].score < 0.7):
-            clarification = generate_clarification_prompt(preferences, [h.payload for h in search_results])
-            
-            # Get default suggested questions for financial services
-            default_questions = [
-                "What are your digital transformation services for banks?",
-                "How do you help with regulatory compliance?",
-                "Can you share a case study on core banking modernization?"
-            ]
-            
-            logger.info(f"Weak search results. Using default questions: {default_questions}")
-            
-            return ChatResponse(
-                reply=clarification,
-                show_form=False,
-                session_id=sid,
-                sources=[h.payload for h in search_results],
-                suggested_questions=[]
-            )
-        
-        # Prepare context and sources
-        context_blocks = []
-        sources = []
-        
-        for h in search_results:
-            p = h.payload
-            context_blocks.append(format_response(p, include_metadata=False))
-            sources.append({
-                "title": p['title'],
-                "url": p['url'],
-                "score": round(h.score, 3),
-                "content_type": p.get('content_type', 'article'),
-                "content_type_name": p.get('content_type_name', p.get('content_type', 'article').replace('_', ' ').title()),
-                "industries": p.get('industries', []),
-                "topics": p.get('topics', [])
-            })
-        
-        logger.info(f"Found {len(sources)} sources for query")
-        
-        # Store sources in memory for reference in follow-up questions
-        memory.last_sources = sources
-        
-        context = "\n\n---\n\n".join(context_blocks)
-        
-        # Generate financial services specialized prompt
-        specialized_prompt = generate_financial_prompt(req.message, context, memory)
-        
-        # Prepare conversation history
-        messages = [
-            {
-                "role": "system",
-                "content": specialized_prompt
-            }
-        ]
+        # Determine if we should show the form
+        if memory.should_show_form(analysis["intent"]):
+            memory.pending_show_form = True
         
-        # Add previous messages for context (without duplicating system prompt)
-        messages.extend(memory.messages)
+        # Skip the fold if it failed or another job already updated the summary;
+        # the messages stay pending and are folded by the next turn's job
+        summary = self.results.get("summary")
+        if summary and memory.summary == self.previous_summary:
+            memory.summary = summary
+            memory.unsummarized = memory.unsummarized[self.evicted:]
         
-        # Get chat completion
-        logger.info(f"Calling OpenAI chat completion API")
-        chat_response = openai_client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
-            temperature=0.7
-        )
+        logger.info(f"Session ID: {self.sid}, Detected topics: {analysis['topics']}")
+        logger.info(f"Intent scores: {analysis['intent']}")
+        logger.info(f"Show form pending: {memory.pending_show_form}")
+
+async def process_turn_analytics(sid: str, memory: ConversationMemory, message: str, ready: asyncio.Future):
+    """
+    Analyze a finished turn in the background and update the session.
+
+    None of this changes the text of the reply it follows: financial context,
+    content preferences and the rolling summary feed the next turn's prompt,
+    and the lead-form decision is delivered with the next reply or through
+    the poll endpoint.
 
-        answer = chat_response.choices[0].message.content.strip()
+    The results are published on ``ready`` as a TurnAnalytics, then applied
+    under the session lock. A next turn that already holds the lock and
+    waits for them applies them itself, since this job can't take the lock
+    until that turn ends.
+    """
+    calls = {
+        "turn": (lambda timeout: analyze_turn(message, memory, timeout=timeout), default_turn_analysis()),
+    }
+    # Fold messages that left the recent window into the summary alongside the analysis
+    evicted = list(memory.unsummarized)
+    if evicted:
+        calls["summary"] = (lambda timeout: memory.fold_into_summary(evicted, timeout=timeout), None)
+    # Captured before the await: another job may change the summary meanwhile
+    previous_summary = memory.summary
+    analytics = TurnAnalytics(sid, await run_analysis_stage(calls), len(evicted), previous_summary)
+    if not ready.done():
+        ready.set_result(analytics)
+    
+    # Read, update and save the latest stored state under the session lock, so
+    # the update can't interleave with a turn's own read-modify-write
+    async with session_locks.hold(sid):
+        if analytics.applied:
+            return
+        memory = await session_call(sessions.get, sid)
+        if memory is None:
+            logger.info(f"Session {sid} was removed before its analytics finished")
+            return
+        analytics.apply(memory)
+        await session_call(sessions.save, sid, memory)
 
-        # Clean up any formatting issues
-        answer = clean_response_format(answer)
+# ─── CHAT PIPELINE ─────────────────────────────────────────────────────────────
+# Maps session_id → background analytics still running for that session's last
+# turn, and → the future their TurnAnalytics are published on
+analysis_futures: Dict[str, asyncio.Future] = {}
+analysis_ready: Dict[str, asyncio.Future] = {}
 
-        # Format the response for financial services
-        answer = format_financial_response(answer, req.message)
+# Turns of one session run one at a time; different sessions run in parallel.
+# Background analytics apply their results under the same lock. The locks are
+# per process: with several API workers on a shared store, route a session's
+# requests to one worker (sticky sessions) to keep its updates serialized.
+session_locks = SessionLocks()
 
-        # Final cleanup to ensure no formatting artifacts remain
-        answer = clean_response_format(answer)
-        
-        # Check if answer is empty or too short
-        if not answer or len(answer.split()) < 5:
-            logger.warning(f"Received very short or empty answer: '{answer}'")
-            answer = "I apologize, but I couldn't generate a complete response. Let me try a different approach. Could you please rephrase your question about financial services technology?"
+def _forget_analysis(sid: str, future: asyncio.Future, ready: asyncio.Future):
+    if not ready.done():
+        # The job failed before publishing its results
+        ready.cancel()
+    if analysis_futures.get(sid) is future:
+        del analysis_futures[sid]
+        del analysis_ready[sid]
+
+class PreparedTurn:
+    """A chat turn that has been retrieved and is ready for the main completion."""
+    def __init__(self, sid: str, memory: ConversationMemory, message: str,
+                 sources: List[Dict[str, Any]], messages: List[Dict[str, str]], deadline: Deadline):
+        self.sid = sid
+        self.memory = memory
+        self.message = message
+        self.sources = sources
+        self.messages = messages
+        self.deadline = deadline
+
+def request_deadline(req: ChatRequest) -> Deadline:
+    """The request's time budget: the client's deadline_ms, never longer than REQUEST_DEADLINE_SECONDS."""
+    seconds = REQUEST_DEADLINE_SECONDS
+    if req.deadline_ms is not None:
+        seconds = min(seconds, req.deadline_ms / 1000)
+    return Deadline(seconds)
+
+def start_retrieval(req: ChatRequest, openai_client: OpenAI, qdrant_client: QdrantClient) -> Optional[asyncio.Future]:
+    """
+    Start a chat request's retrieval on arrival, before it queues for its session's lock.
+
+    Retrieval only needs the message, so it overlaps with the wait behind the
+    session's previous turn. Its upstream timeouts count from arrival; the
+    turn awaits it within the retrieval share of its own deadline.
+
+    Returns:
+        The pending search results, or None for requests that are certain to
+        be answered without retrieval (no session yet, or a greeting)
+    """
+    if not req.session_id or is_greeting(req.message):
+        return None
+    return asyncio.ensure_future(run_blocking(
+        enhanced_financial_search,
+        query=req.message,
+        qdrant_client=qdrant_client,
+        openai_client=openai_client,
+        deadline=request_deadline(req)
+    ))
+
+def cancel_retrieval(retrieval: Optional[asyncio.Future]):
+    """Drop a retrieval the turn ended up not using (a shortcut answer, an error or a disconnect)."""
+    if retrieval is not None and not retrieval.done():
+        retrieval.cancel()
+
+async def prepare_turn(req: ChatRequest, retrieval: Optional[asyncio.Future], deadline: Deadline):
+    """
+    Resolve the session, await the retrieval and build the completion messages.
+
+    Retrieval may run until RETRIEVAL_DEADLINE_SHARE of the request deadline
+    has elapsed; past that the turn is answered without retrieved context.
+
+    Args:
+        req: The chat request
+        retrieval: Search results started by start_retrieval(), or None
+        deadline: The turn's deadline, started once the session lock is held
+
+    Returns:
+        A ChatResponse when the turn is answered without a completion (new
+        session, greeting, duplicate message or weak search results), or a
+        PreparedTurn otherwise
+    """
+    logger.info(f"Received chat request: {req.message[:50]}... (session: {req.session_id})")
+    
+    # Get or create session
+    sid = req.session_id or str(uuid.uuid4())
+    is_new_session = False
+    
+    memory = await session_call(sessions.get, sid)
+    if memory is None:
+        logger.info(f"Creating new session: {sid}")
+        await session_call(sessions.save, sid, ConversationMemory())
+        is_new_session = True
+        welcome_message = generate_welcome_message()
+        return ChatResponse(
+            reply=welcome_message,
+            show_form=False,
+            session_id=sid,
+            sources=[],
+            suggested_questions=[]
+        )
+    
+    # Check if this is a simple greeting
+    if is_greeting(req.message):
+        logger.info(f"Greeting detected: {req.message}")
         
-        # Analyze sentiment and topics
-        sentiment = analyze_sentiment(req.message)
-        topics = extract_topics(req.message)
+        # Only show welcome message for first greeting or new session
+        is_first_greeting = is_new_session or len(memory.messages) == 0
+        greeting_response = generate_greeting_response(is_first_greeting)
         
         # Update conversation memory
-        memory.add_exchange(req.message, answer, sentiment, topics)
+        sentiment = {"positive": 0.8, "negative": 0.0, "neutral": 0.2}
+        topics = ["greeting"]
         
+        # Check for duplicate messages to avoid adding the same exchange twice
+        if not memory.messages or memory.messages[-1].content != greeting_response:
+            memory.add_exchange(req.message, greeting_response, sentiment, topics)
+            await session_call(sessions.save, sid, memory)
+            await index_message_emails(sid, req.message)
         
-        # Classify intent for lead form decision
-        intent = classify_intent(req.message)
+        return ChatResponse(
+            reply=greeting_response,
+            show_form=False,
+            session_id=sid,
+            sources=[],
+            suggested_questions=[]
+        )
+    
+    # Check for duplicate message (avoid processing the same message twice)
+    if memory.messages and len(memory.messages) >= 2 and memory.messages[-2].content == req.message:
+        logger.info(f"Duplicate message detected: {req.message}")
+        return ChatResponse(
+            reply="I noticed you sent the same message twice. Did you have any additional questions or would you like me to elaborate further on my previous response?",
+            show_form=False,
+            session_id=sid,
+            sources=[],
+            suggested_questions=[]
+        )
+    
+    # Log the current request
+    logger.info(f"Processing request: {req.message}")
+    
+    # Let the previous turn's background analytics land (while retrieval is
+    # in flight) so the prompt sees the latest financial context
+    pending = analysis_ready.get(sid)
+    if pending is not None and pending.get_loop() is not asyncio.get_running_loop():
+        # Left behind by workers of a closed event loop; it will never resolve
+        analysis_futures.pop(sid, None)
+        analysis_ready.pop(sid, None)
+        pending = None
+    if pending is not None and analysis_futures.get(sid) is not None:
+        try:
+            analytics = await asyncio.wait_for(
+                asyncio.shield(pending),
+                timeout=min(PENDING_ANALYSIS_WAIT, deadline.checkpoint(RETRIEVAL_DEADLINE_SHARE))
+            )
+        except asyncio.TimeoutError:
+            logger.info(f"Previous analysis for session {sid} still pending, continuing without it")
+            deadline.skip("pending_analysis")
+        except asyncio.CancelledError:
+            # Cancelled by _forget_analysis when the job failed; anything else
+            # cancels this turn itself
+            if not pending.cancelled():
+                raise
+            logger.info(f"Previous analysis for session {sid} failed, continuing without it")
+            deadline.skip("pending_analysis")
+        else:
+            # The job can't take the lock this turn holds, so apply its results here
+            if not analytics.applied:
+                analytics.apply(memory)
+                await session_call(sessions.save, sid, memory)
+    
+    # Content preferences from the latest background analysis
+    preferences = memory.content_preferences
+    
+    # Enhanced search for financial services content, started at request arrival
+    retrieval_timed_out = False
+    try:
+        search_results = await asyncio.wait_for(retrieval, timeout=deadline.checkpoint(RETRIEVAL_DEADLINE_SHARE))
+    except asyncio.TimeoutError:
+        # Slow retrieval says nothing about the query, so answer from the
+        # model's own knowledge rather than asking the user to rephrase
+        logger.warning(f"Retrieval exceeded its share of the request deadline, answering without context")
+        deadline.skip("retrieval")
+        retrieval_timed_out = True
+        search_results = []
+    
+    # Handle weak or no results
+    if not retrieval_timed_out and (not search_results or (len(search_results) == 1 and search_results[0].score < 0.7)):
+        clarification = generate_clarification_prompt(preferences, [h.payload for h in search_results])
         
-        # Determine if we should show the form
-        show_form = memory.should_show_form(intent)
+        # Get default suggested questions for financial services
+        default_questions = [
+            "What are your digital transformation services for banks?",
+            "How do you help with regulatory compliance?",
+            "Can you share a case study on core banking modernization?"
+        ]
         
-        # Add logging for troubleshooting
-        logger.info(f"Session ID: {sid}, Detected topics: {topics}")
-        logger.info(f"Intent scores: {intent}")
-        logger.info(f"Show form: {show_form}")
-        logger.info(f"Memory interaction count: {memory.interaction_count}")
+        logger.info(f"Weak search results. Using default questions: {default_questions}")
         
         return ChatResponse(
-            reply=answer,
-            show_form=show_form,
+            reply=clarification,
+            show_form=False,
             session_id=sid,
-            sources=sources,
-            suggested_questions=[]  # Return an empty list instead
+            sources=[h.payload for h in search_results],
+            suggested_questions=[],
+            skipped_stages=deadline.skipped
         )
+    
+    # Prepare context and sources
+    context_blocks = []
+    sources = []
+    
+    for h in search_results:
+        p = h.payload
+        context_blocks.append(format_response(p, include_metadata=False))
+        sources.append({
+            "title": p['title'],
+            "url": p['url'],
+            "score": round(h.score, 3),
+            "content_type": p.get('content_type', 'article'),
+            "content_type_name": p.get('content_type_name', p.get('content_type', 'article').replace('_', ' ').title()),
+            "industries": p.get('industries', []),
+            "topics": p.get('topics', [])
+        })
+    
+    logger.info(f"Found {len(sources)} sources for query")
+    
+    # Remember which points backed this reply for follow-up questions; the
+    # payloads can be fetched again by ID, so they aren't copied into the session
+    memory.last_source_ids = [h.id for h in search_results]
+    
+    # Fill the token budget: instructions and query, then ranked context, then recent turns
+    messages, prompt_stats = prompt_assembler.assemble(
+        lambda query, context: generate_financial_prompt(query, context, memory),
+        req.message,
+        context_blocks,
+        memory.messages
+    )
+    logger.info(f"Prompt tokens: {prompt_stats}")
+    
+    return PreparedTurn(sid, memory, req.message, sources, messages, deadline)
+
+async def finish_turn(turn: PreparedTurn, answer: str) -> ChatResponse:
+    """Post-process the completion, record the exchange and queue background analytics."""
+    answer = answer.strip()
+
+    # Clean up any formatting issues
+    answer = clean_response_format(answer)
+
+    # Format the response for financial services, within what's left of the deadline
+    try:
+        answer = await asyncio.wait_for(
+            run_blocking(format_financial_response, answer, turn.message, turn.deadline),
+            timeout=turn.deadline.remaining(DEADLINE_FINISH_RESERVE)
+        )
+    except asyncio.TimeoutError:
+        logger.warning(f"Response formatting exceeded the request deadline, sending the unformatted reply")
+        turn.deadline.skip("formatting")
+
+    # Final cleanup to ensure no formatting artifacts remain
+    answer = clean_response_format(answer)
+    
+    # Check if answer is empty or too short
+    if not answer or len(answer.split()) < 5:
+        logger.warning(f"Received very short or empty answer: '{answer}'")
+        answer = "I apologize, but I couldn't generate a complete response. Let me try a different approach. Could you please rephrase your question about financial services technology?"
+    
+    memory = turn.memory
+    
+    # Update conversation memory; sentiment and topics are recorded by the
+    # background analytics job
+    memory.add_exchange(turn.message, answer)
+    
+    # Lead-form decision from the previous turn's analytics
+    show_form = memory.take_show_form()
+    await session_call(sessions.save, turn.sid, memory)
+    await index_message_emails(turn.sid, turn.message)
+    
+    # Sentiment, topics, intent and the next lead-form decision don't
+    # affect this reply, so they run after it is sent
+    ready = asyncio.get_running_loop().create_future()
+    future = background_queue.submit(lambda: process_turn_analytics(turn.sid, memory, turn.message, ready))
+    if future is not None:
+        analysis_futures[turn.sid] = future
+        analysis_ready[turn.sid] = ready
+        future.add_done_callback(lambda f, sid=turn.sid: _forget_analysis(sid, f, ready))
+    
+    # Add logging for troubleshooting
+    logger.info(f"Show form: {show_form}")
+    logger.info(f"Memory interaction count: {memory.interaction_count}")
+    
+    return ChatResponse(
+        reply=answer,
+        show_form=show_form,
+        session_id=turn.sid,
+        sources=turn.sources,
+        suggested_questions=[],  # Return an empty list instead
+        skipped_stages=turn.deadline.skipped
+    )
+
+# ─── CHAT ENDPOINT ─────────────────────────────────────────────────────────────
+@app.post("/chat", response_model=ChatResponse)
+async def chat(
+    req: ChatRequest,
+    openai_client: OpenAI = Depends(get_openai_client),
+    qdrant_client: QdrantClient = Depends(get_qdrant_client)
+):
+    # Retrieval runs while the turn queues behind the session's previous one
+    retrieval = start_retrieval(req, openai_client, qdrant_client)
+    try:
+        async with session_locks.hold(req.session_id):
+            # Time spent queued behind the session's previous turn doesn't count
+            deadline = request_deadline(req)
+            turn = await prepare_turn(req, retrieval, deadline)
+            if isinstance(turn, ChatResponse):
+                return turn
+            
+            # Get chat completion; it may use the rest of the deadline
+            logger.info(f"Calling OpenAI chat completion API")
+            completion_timeout = deadline.remaining(DEADLINE_FINISH_RESERVE)
+            try:
+                chat_response = await asyncio.wait_for(
+                    run_blocking(
+                        openai_client.chat.completions.create,
+                        model="gpt-3.5-turbo",
+                        messages=turn.messages,
+                        temperature=0.7,
+                        timeout=completion_timeout
+                    ),
+                    timeout=completion_timeout
+                )
+            except asyncio.TimeoutError:
+                logger.error(f"Chat completion exceeded the {deadline.seconds:.1f}s request deadline")
+                raise HTTPException(status_code=504, detail="The request deadline was exceeded")
+
+            return await finish_turn(turn, chat_response.choices[0].message.content)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Chat error: {str(e)}", exc_info=True)  # Add exc_info=True for full stack trace
         raise HTTPException(status_code=500, detail=f"Error processing chat request: {str(e)}")
+    finally:
+        cancel_retrieval(retrieval)
+
+# ─── STREAMING CHAT ENDPOINT ───────────────────────────────────────────────────
+def sse_event(event: str, data: Any) -> str:
+    """Format a Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def stream_blocking(fn: Callable[..., Any], *args, **kwargs) -> AsyncIterator[Any]:
+    """
+    Iterate a blocking iterator on the I/O pool, yielding items as they arrive.
+
+    ``fn(*args, **kwargs)`` is called on a pool thread and must return an
+    iterable. Iteration stops early if the consumer goes away.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+    finished = object()
+    
+    def produce():
+        try:
+            iterator = fn(*args, **kwargs)
+            for item in iterator:
+                if stop.is_set():
+                    if hasattr(iterator, "close"):
+                        iterator.close()
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, (item, None))
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, (None, e))
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, (finished, None))
+    
+    loop.run_in_executor(io_executor, produce)
+    try:
+        while True:
+            item, error = await queue.get()
+            if error is not None:
+                raise error
+            if item is finished:
+                break
+            yield item
+    finally:
+        stop.set()
+
+@app.post("/chat/stream")
+async def chat_stream(
+    req: ChatRequest,
+    openai_client: OpenAI = Depends(get_openai_client),
+    qdrant_client: QdrantClient = Depends(get_qdrant_client)
+):
+    """
+    Server-Sent Events variant of /chat.
+
+    Emits ``sources`` as soon as retrieval finishes, then a ``token`` event per
+    completion delta, then ``done`` carrying the full ChatResponse with the
+    final formatted reply and show_form. Errors are reported as an ``error``
+    event since the status code has already been sent. A completion still
+    streaming at the deadline is cut short and reported as a skipped stage.
+    """
+    async def events():
+        # Retrieval runs while the turn queues behind the session's previous one
+        retrieval = start_retrieval(req, openai_client, qdrant_client)
+        try:
+            async with session_locks.hold(req.session_id):
+                # Time spent queued behind the session's previous turn doesn't count
+                deadline = request_deadline(req)
+                turn = await prepare_turn(req, retrieval, deadline)
+                if isinstance(turn, ChatResponse):
+                    yield sse_event("done", turn.model_dump())
+                    return
+                
+                yield sse_event("sources", {"session_id": turn.sid, "sources": turn.sources})
+                
+                logger.info(f"Calling OpenAI chat completion API (streaming)")
+                parts = []
+                chunks = stream_blocking(
+                    openai_client.chat.completions.create,
+                    model="gpt-3.5-turbo",
+                    messages=turn.messages,
+                    temperature=0.7,
+                    stream=True,
+                    timeout=deadline.remaining(DEADLINE_FINISH_RESERVE)
+                )
+                try:
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(
+                                chunks.__anext__(), timeout=deadline.remaining(DEADLINE_FINISH_RESERVE)
+                            )
+                        except StopAsyncIteration:
+                            break
+                        except asyncio.TimeoutError:
+                            logger.warning(f"Chat completion cut short at the {deadline.seconds:.1f}s request deadline")
+                            deadline.skip("completion")
+                            break
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            parts.append(delta)
+                            yield sse_event("token", {"text": delta})
+                finally:
+                    await chunks.aclose()
+                
+                response = await finish_turn(turn, "".join(parts))
+                yield sse_event("done", response.model_dump())
+        except Exception as e:
+            logger.error(f"Chat stream error: {str(e)}", exc_info=True)
+            yield sse_event("error", {"detail": f"Error processing chat request: {str(e)}"})
+        finally:
+            cancel_retrieval(retrieval)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
-        
 # ─── LEAD CAPTURE ENDPOINT ─────────────────────────────────────────────────────
 @app.post("/lead", response_model=LeadResponse)
 async def lead_capture(req: LeadRequest):
@@ -1112,16 +2059,18 @@ async def lead_capture(req: LeadRequest):
         
         # Enhanced financial services lead generation
         # Get conversation memory if available
-        sid = None
-        for session_id, memory in sessions.items():
-            if memory.messages and any(msg["content"] and req.email in msg["content"] for msg in memory.messages):
-                sid = session_id
-                break
+        # Use the session id sent by the widget, else the session whose
+        # messages mentioned this email address
+        sid = req.session_id
+        memory = await session_call(sessions.get, sid) if sid else None
+        if memory is None:
+            sid = await session_call(sessions.find_by_email, req.email.lower())
+            memory = await session_call(sessions.get, sid) if sid else None
         
         # Generate lead email with financial context
         email_content = ""
-        if sid and sid in sessions:
-            email_content = generate_lead_email(sessions[sid])
+        if sid and memory:
+            email_content = generate_lead_email(memory)
             logger.info(f"Generated contextual lead email for session {sid[:8]}...")
         else:
             # Basic lead email without conversation context
@@ -1155,12 +2104,12 @@ async def lead_capture(req: LeadRequest):
             # Try to import and use email service
             try:
                 from email_service import send_lead_notification
-                email_sent = send_lead_notification(lead_data, email_content)
+                email_sent = await run_blocking(send_lead_notification, lead_data, email_content)
             except ImportError:
                 # Try sendgrid if email_service isn't available
                 try:
                     from sendgrid_service import send_lead_notification
-                    email_sent = send_lead_notification(lead_data, email_content)
+                    email_sent = await run_blocking(send_lead_notification, lead_data, email_content)
                 except ImportError:
                     logger.warning("No email service module found. Email notification not sent.")
                     email_sent = False
@@ -1183,12 +2132,26 @@ async def lead_capture(req: LeadRequest):
 # ─── SESSION MANAGEMENT ENDPOINT ────────────────────────────────────────────────
 @app.delete("/sessions/{session_id}")
 async def clear_session(session_id: str):
-    if session_id in sessions:
-        del sessions[session_id]
+    if await session_call(sessions.delete, session_id):
         return {"status": "ok", "message": f"Session {session_id} cleared"}
     else:
         raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
 
+@app.get("/sessions/{session_id}/form")
+async def poll_form(session_id: str):
+    """Lightweight poll for the lead-form decision made by background analytics."""
+    # Clearing the flag is a read-modify-write like a turn's or an analytics
+    # job's, so it takes the same lock and can't lose either side's update
+    async with session_locks.hold(session_id):
+        memory = await session_call(sessions.get, session_id)
+        if memory is None:
+            raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
+        
+        show_form = memory.take_show_form()
+        if show_form:
+            await session_call(sessions.save, session_id, memory)
+    return {"session_id": session_id, "show_form": show_form}
+
 # Make it visible externally by default
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,188 @@
+"""
+Token-budgeted prompt assembly for the main chat completion.
+
+The assembler fills a fixed token budget in priority order:
+
+1. System instructions (persona, memory context, summary)
+2. The current user query
+3. Retrieved context blocks, best ranked first
+4. Recent conversation turns, newest first, with long assistant replies truncated
+
+so the size of the prompt, and with it completion latency and cost, has a
+hard ceiling no matter how long the chunks or the conversation get.
+"""
+
+import logging
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+# Tokens the chat format adds around each message
+MESSAGE_OVERHEAD_TOKENS = 4
+TRUNCATION_MARKER = " …"
+
+# Characters per token assumed when the tiktoken vocabulary can't be loaded.
+# English text averages about 4 with cl100k_base; 3 overcounts, so prompts
+# stay within the budget.
+FALLBACK_CHARS_PER_TOKEN = 3
+
+class _CharacterEstimate:
+    """Stand-in for a tiktoken encoding that treats every few characters as a token."""
+    def encode(self, text: str) -> List[str]:
+        return [text[i:i + FALLBACK_CHARS_PER_TOKEN] for i in range(0, len(text), FALLBACK_CHARS_PER_TOKEN)]
+
+    def decode(self, tokens: List[str]) -> str:
+        return "".join(tokens)
+
+class PromptAssembler:
+    """
+    Builds the completion messages within a token budget.
+
+    Args:
+        budget: Maximum prompt tokens, across all messages
+        history_reserve: Tokens held back from context for recent turns
+        max_query_tokens: Longest user query kept verbatim
+        max_assistant_tokens: Longest previous assistant reply kept verbatim
+        min_block_tokens: Smallest useful remainder of a truncated context block
+        encoding_name: tiktoken encoding matching the chat model
+    """
+    def __init__(
+        self,
+        budget: int = 6000,
+        history_reserve: int = 800,
+        max_query_tokens: int = 1000,
+        max_assistant_tokens: int = 300,
+        min_block_tokens: int = 150,
+        encoding_name: str = "cl100k_base"
+    ):
+        self.budget = budget
+        self.history_reserve = history_reserve
+        self.max_query_tokens = max_query_tokens
+        self.max_assistant_tokens = max_assistant_tokens
+        self.min_block_tokens = min_block_tokens
+        self.encoding_name = encoding_name
+        self._encoder = None
+
+    def load(self) -> bool:
+        """
+        Load the tiktoken encoding, or fall back to a character-based estimate.
+
+        tiktoken downloads the vocabulary on first use, so call this at startup
+        rather than on the request path.
+
+        Returns:
+            Whether token counts are exact
+        """
+        if self._encoder is None:
+            try:
+                self._encoder = tiktoken.get_encoding(self.encoding_name)
+            except Exception as e:
+                logger.warning(
+                    f"Could not load the {self.encoding_name} encoding, estimating "
+                    f"{FALLBACK_CHARS_PER_TOKEN} characters per token: {e}"
+                )
+                self._encoder = _CharacterEstimate()
+        return not isinstance(self._encoder, _CharacterEstimate)
+
+    @property
+    def encoder(self):
+        if self._encoder is None:
+            self.load()
+        return self._encoder
+
+    def count(self, text: str) -> int:
+        return len(self.encoder.encode(text))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut text to at most max_tokens tokens, marking the cut."""
+        tokens = self.encoder.encode(text)
+        if len(tokens) <= max_tokens:
+            return text
+        marker_tokens = self.count(TRUNCATION_MARKER)
+        return self.encoder.decode(tokens[:max(0, max_tokens - marker_tokens)]) + TRUNCATION_MARKER
+
+    def assemble(
+        self,
+        build_system_prompt: Callable[[str, str], str],
+        query: str,
+        context_blocks: List[str],
+        history: Sequence[Tuple[str, str]],
+        separator: str = "\n\n---\n\n"
+    ) -> Tuple[List[Dict[str, str]], Dict[str, Any]]:
+        """
+        Assemble the completion messages.
+
+        Args:
+            build_system_prompt: Called as build_system_prompt(query, context)
+                to render the system message around the selected context
+            query: The current user query
+            context_blocks: Retrieved context, best ranked first
+            history: Previous conversation messages as (role, content) pairs,
+                oldest first
+            separator: Joins the selected context blocks
+
+        Returns:
+            The messages to send and a stats dict with the tokens used by each
+            part and how many blocks/turns were kept
+        """
+        query = self.truncate(query, self.max_query_tokens)
+
+        # 1 + 2: instructions and query always go in
+        base_tokens = self.count(build_system_prompt(query, "")) + MESSAGE_OVERHEAD_TOKENS
+        remaining = self.budget - base_tokens
+        if remaining < 0:
+            logger.warning(f"System prompt alone ({base_tokens} tokens) exceeds the {self.budget} token budget")
+
+        # 3: context blocks in rank order, leaving the history reserve untouched
+        context_allowance = remaining - self.history_reserve
+        selected = []
+        context_tokens = 0
+        separator_tokens = self.count(separator)
+        for block in context_blocks:
+            cost = self.count(block) + (separator_tokens if selected else 0)
+            if context_tokens + cost <= context_allowance:
+                selected.append(block)
+                context_tokens += cost
+                continue
+            # Keep the head of the first block that doesn't fit, if enough room is left
+            room = context_allowance - context_tokens - (separator_tokens if selected else 0)
+            if room >= self.min_block_tokens:
+                selected.append(self.truncate(block, room))
+                context_tokens += room + (separator_tokens if len(selected) > 1 else 0)
+            break
+
+        system_prompt = build_system_prompt(query, separator.join(selected))
+        system_tokens = self.count(system_prompt) + MESSAGE_OVERHEAD_TOKENS
+        remaining = self.budget - system_tokens
+
+        # 4: recent turns, newest first, until the budget is spent
+        kept: List[Dict[str, str]] = []
+        history_tokens = 0
+        for role, content in reversed(history):
+            if role == "assistant":
+                content = self.truncate(content, self.max_assistant_tokens)
+            cost = self.count(content) + MESSAGE_OVERHEAD_TOKENS
+            if history_tokens + cost > remaining:
+                break
+            kept.append({"role": role, "content": content})
+            history_tokens += cost
+        kept.reverse()
+
+        # Don't open the history with an orphaned assistant reply
+        if kept and kept[0]["role"] == "assistant":
+            history_tokens -= self.count(kept[0]["content"]) + MESSAGE_OVERHEAD_TOKENS
+            kept = kept[1:]
+
+        messages = [{"role": "system", "content": system_prompt}] + kept
+        stats = {
+            "budget": self.budget,
+            "total_tokens": system_tokens + history_tokens,
+            "system_tokens": system_tokens,
+            "context_tokens": context_tokens,
+            "history_tokens": history_tokens,
+            "context_blocks": f"{len(selected)}/{len(context_blocks)}",
+            "history_messages": f"{len(kept)}/{len(history)}",
+        }
+        return messages, stats
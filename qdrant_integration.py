@@ -4,9 +4,12 @@ These functions improve the chatbot's ability to retrieve relevant content from
 vector database before falling back to hardcoded responses.
 """
 
+import json
 from typing import List, Dict, Any, Optional
-from qdrant_client import QdrantClient
+from qdrant_client import QdrantClient, models
 from openai import OpenAI
+from embedding_cache import embedding_cache
+from retrieval_cache import get_retrieval_cache
 
 def parse_qdrant_results(hits: List[Any]) -> List[Dict[str, Any]]:
     """
@@ -75,27 +78,35 @@ def search_qdrant_with_filters(
     Returns:
         List of search hits from Qdrant
     """
-    # Generate embedding for query
-    embedding_response = openai_client.embeddings.create(
-        input=query,
-        model="text-embedding-ada-002"
+    # Generate embedding for query (repeated queries come from the shared cache)
+    query_vector = embedding_cache.embed(openai_client, query)
+    
+    # Reuse the results of a near-identical recent query with the same parameters
+    retrieval_cache = get_retrieval_cache(collection_name)
+    cache_key = json.dumps(
+        {"filters": filters, "limit": limit, "score_threshold": score_threshold},
+        sort_keys=True, default=str
     )
-    query_vector = embedding_response.data[0].embedding
+    cached = retrieval_cache.lookup(query_vector, cache_key)
+    if cached is not None:
+        return cached
     
     # Build search parameters
     search_params = {
         "collection_name": collection_name,
-        "query_vector": query_vector,
+        "query": query_vector,
         "limit": limit,
         "score_threshold": score_threshold
     }
     
     # Add filters if provided
     if filters:
-        search_params["filter"] = filters
+        search_params["query_filter"] = models.Filter(**filters)
     
     # Execute search
-    return client.search(**search_params)
+    results = client.query_points(**search_params).points
+    retrieval_cache.store(query_vector, cache_key, results)
+    return results
 
 def get_relevant_case_study(
     client: QdrantClient,
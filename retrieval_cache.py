@@ -0,0 +1,221 @@
+"""
+Semantic cache of Qdrant search results.
+
+Many visitor questions are near-paraphrases of each other. When a new query
+embedding is close enough (cosine similarity above a threshold) to a cached
+query that was searched with the same filters, that query's ranked hits are
+reused and the Qdrant round trip is skipped.
+
+Cached queries are rows of one matrix per collection, so a lookup is a
+single matrix-vector product. Ingestion scripts call
+``bump_collection_version()`` after writing to a collection, which
+invalidates that collection's cache in every API process on the box.
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from config import (
+    RETRIEVAL_CACHE_THRESHOLD, RETRIEVAL_CACHE_SIZE, RETRIEVAL_CACHE_TTL, COLLECTION_VERSION_DIR
+)
+
+logger = logging.getLogger(__name__)
+
+# How often (seconds) a cache checks whether ingestion bumped its collection version
+VERSION_CHECK_INTERVAL = 1.0
+
+def _version_path(collection: str) -> str:
+    return os.path.join(COLLECTION_VERSION_DIR, f".{collection}.version")
+
+def read_collection_version(collection: str) -> str:
+    """Current content version of a collection; empty if it was never bumped."""
+    try:
+        with open(_version_path(collection)) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return ""
+
+def bump_collection_version(collection: str) -> str:
+    """Mark a collection's content as changed. Call after upserting or recreating it."""
+    version = str(time.time_ns())
+    path = _version_path(collection)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(version)
+    os.replace(tmp_path, path)
+    logger.info(f"Bumped {collection} content version to {version}")
+    return version
+
+class RetrievalCache:
+    """
+    Ring buffer of (query embedding, filter key, ranked hits) for one collection.
+
+    Args:
+        collection: Qdrant collection the cached hits came from
+        threshold: Minimum cosine similarity for two queries to share results
+        max_entries: Cached queries kept; the oldest is overwritten first
+        ttl: Seconds a cached result stays valid, or None
+    """
+    def __init__(self, collection: str, threshold: float = 0.97, max_entries: int = 2000, ttl: Optional[float] = None):
+        self.collection = collection
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # Allocated on first store, once the embedding size is known
+        self._vectors: Optional[np.ndarray] = None
+        self._key_ids = np.full(max_entries, -1, dtype=np.int32)
+        self._created = np.zeros(max_entries, dtype=np.float64)
+        self._results: List[Optional[List[Any]]] = [None] * max_entries
+        # Filter keys of the cached queries ↔ small ids, with the number of
+        # slots holding each; a key is dropped when its last slot is overwritten
+        self._key_index: Dict[str, int] = {}
+        self._key_names: Dict[int, str] = {}
+        self._key_refs: Dict[int, int] = {}
+        self._free_key_ids: List[int] = []
+        self._next = 0
+        self._size = 0
+        self._version = read_collection_version(collection)
+        self._version_checked_at = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _clear(self):
+        self._key_ids.fill(-1)
+        self._results = [None] * self.max_entries
+        self._key_index.clear()
+        self._key_names.clear()
+        self._key_refs.clear()
+        self._free_key_ids.clear()
+        self._next = 0
+        self._size = 0
+
+    def _acquire_key(self, key: str) -> int:
+        """Id of a filter key for one more slot. Caller holds the lock."""
+        key_id = self._key_index.get(key)
+        if key_id is None:
+            # Every allocated id is in use or free, so with no free id the
+            # next one is the number of keys in use
+            key_id = self._free_key_ids.pop() if self._free_key_ids else len(self._key_index)
+            self._key_index[key] = key_id
+            self._key_names[key_id] = key
+            self._key_refs[key_id] = 0
+        self._key_refs[key_id] += 1
+        return key_id
+
+    def _release_key(self, key_id: int):
+        """Drop a slot's reference to its filter key. Caller holds the lock."""
+        if key_id < 0:
+            return
+        self._key_refs[key_id] -= 1
+        if not self._key_refs[key_id]:
+            del self._key_refs[key_id]
+            del self._key_index[self._key_names.pop(key_id)]
+            self._free_key_ids.append(key_id)
+
+    def _check_version(self):
+        """Drop everything if ingestion changed the collection. Caller holds the lock."""
+        now = time.monotonic()
+        if now - self._version_checked_at < VERSION_CHECK_INTERVAL:
+            return
+        self._version_checked_at = now
+        version = read_collection_version(self.collection)
+        if version != self._version:
+            self._version = version
+            if self._size:
+                logger.info(f"{self.collection} content changed, dropping {self._size} cached searches")
+                self.invalidations += 1
+            self._clear()
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
+
+    def lookup(self, vector: List[float], key: str) -> Optional[List[Any]]:
+        """
+        Ranked hits of the most similar cached query searched with ``key``.
+
+        Args:
+            vector: Embedding of the new query
+            key: Canonical description of the filters and search parameters
+
+        Returns:
+            A copy of the cached hits, or None when no cached query with the
+            same key is within the similarity threshold
+        """
+        query = self._normalize(vector)
+        with self._lock:
+            self._check_version()
+            key_id = self._key_index.get(key)
+            if key_id is None or self._size == 0 or self._vectors.shape[1] != query.shape[0]:
+                self.misses += 1
+                return None
+
+            size = self._size
+            mask = self._key_ids[:size] == key_id
+            if self.ttl is not None:
+                mask &= self._created[:size] >= time.time() - self.ttl
+            similarities = np.where(mask, self._vectors[:size] @ query, -np.inf)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return list(self._results[best])
+
+    def store(self, vector: List[float], key: str, results: List[Any]):
+        """Cache the ranked hits of a query searched with ``key``."""
+        query = self._normalize(vector)
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != query.shape[0]:
+                self._vectors = np.zeros((self.max_entries, query.shape[0]), dtype=np.float32)
+                self._clear()
+            slot = self._next
+            self._release_key(int(self._key_ids[slot]))
+            self._vectors[slot] = query
+            self._key_ids[slot] = self._acquire_key(key)
+            self._created[slot] = time.time()
+            self._results[slot] = list(results)
+            self._next = (slot + 1) % self.max_entries
+            self._size = min(self._size + 1, self.max_entries)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._size,
+            "max_entries": self.max_entries,
+            "filter_keys": len(self._key_index),
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+# One cache per collection, shared by every search path in the process
+_caches: Dict[str, RetrievalCache] = {}
+_caches_lock = threading.Lock()
+
+def get_retrieval_cache(collection: str) -> RetrievalCache:
+    with _caches_lock:
+        cache = _caches.get(collection)
+        if cache is None:
+            cache = _caches[collection] = RetrievalCache(
+                collection,
+                threshold=RETRIEVAL_CACHE_THRESHOLD,
+                max_entries=RETRIEVAL_CACHE_SIZE,
+                ttl=RETRIEVAL_CACHE_TTL
+            )
+        return cache
+
+def retrieval_cache_stats() -> Dict[str, Any]:
+    return {collection: cache.stats() for collection, cache in _caches.items()}
@@ -0,0 +1,96 @@
+"""
+Per-session locks for the chat pipeline.
+
+Turns of the same session run one at a time, so two quick messages from one
+browser tab can't interleave their reads and writes of the session. Turns of
+different sessions never wait for each other.
+
+The locks live in one process. With several API workers sharing a SQLite or
+Redis session store, a session's requests must reach the same worker (sticky
+sessions) for its updates to stay serialized.
+"""
+
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class _SessionLock:
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        # Turns holding or waiting for the lock; the entry is dropped at zero
+        self.users = 0
+
+class SessionLocks:
+    """
+    One asyncio lock per active session, created on demand and discarded as
+    soon as no turn holds or waits for it, with lock wait metrics.
+    """
+    def __init__(self):
+        self._locks: Dict[str, _SessionLock] = {}
+        self.acquired = 0
+        self.contended = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @asynccontextmanager
+    async def hold(self, session_id: Optional[str]) -> AsyncIterator[float]:
+        """
+        Hold the session's lock for the duration of the block.
+
+        Args:
+            session_id: Session to serialize on; None (a new session) doesn't lock
+
+        Yields:
+            Seconds spent waiting for the lock
+        """
+        if not session_id:
+            yield 0.0
+            return
+
+        entry = self._locks.get(session_id)
+        if entry is None:
+            entry = self._locks[session_id] = _SessionLock()
+        entry.users += 1
+
+        contended = entry.lock.locked()
+        start = time.perf_counter()
+        try:
+            await entry.lock.acquire()
+        except BaseException:
+            self._release_entry(session_id, entry)
+            raise
+        wait = time.perf_counter() - start
+
+        self.acquired += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        if contended:
+            self.contended += 1
+            logger.info(f"Session {session_id[:8]}... waited {wait * 1000:.0f}ms for its previous turn")
+
+        try:
+            yield wait
+        finally:
+            entry.lock.release()
+            self._release_entry(session_id, entry)
+
+    def _release_entry(self, session_id: str, entry: _SessionLock):
+        entry.users -= 1
+        if entry.users == 0 and self._locks.get(session_id) is entry:
+            del self._locks[session_id]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active_sessions": len(self._locks),
+            "waiting": sum(max(0, entry.users - 1) for entry in self._locks.values()),
+            "acquired": self.acquired,
+            "contended": self.contended,
+            "avg_wait_ms": round(self.total_wait / self.acquired * 1000, 2) if self.acquired else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 2),
+        }
@@ -0,0 +1,611 @@
+"""
+Session storage backends for the chat API.
+
+The in-memory backend keeps ConversationMemory objects in the process and is
+the default; with a snapshot file it also survives restarts. The SQLite (WAL mode) and Redis backends store serialized
+sessions outside the process, so several uvicorn workers, or a restarted
+worker, see the same conversations.
+
+Sessions are encoded with the ``encode``/``decode`` callables the store is
+created with (ConversationMemory.to_bytes / ConversationMemory.from_bytes in
+main.py). With a shared backend, ``get`` returns a fresh copy and changes
+are only visible to other workers after ``save``.
+"""
+
+import os
+import time
+import zlib
+import sqlite3
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Marks a session with no unwritten snapshot changes
+_NOT_PENDING = object()
+
+def _connect_sqlite(local: threading.local, path: str) -> sqlite3.Connection:
+    """Per-thread connection to a WAL-mode database; sqlite3 connections must not be shared across threads."""
+    conn = getattr(local, "conn", None)
+    if conn is None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(path, timeout=5.0)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        local.conn = conn
+    return conn
+
+class SessionStore(ABC):
+    """Interface shared by all session backends."""
+    # True when operations do I/O and should run off the event loop
+    blocking = False
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    def save(self, session_id: str, memory: Any):
+        ...
+
+    @abstractmethod
+    def delete(self, session_id: str) -> bool:
+        """Remove a session and its email index entries; False if it didn't exist."""
+
+    @abstractmethod
+    def session_ids(self) -> Iterator[str]:
+        ...
+
+    @abstractmethod
+    def index_email(self, email: str, session_id: str):
+        """Remember that ``email`` appeared in a message of ``session_id``."""
+
+    @abstractmethod
+    def find_by_email(self, email: str) -> Optional[str]:
+        """Session id most recently indexed for ``email``, if any."""
+
+    def blocks(self, operation: str, *args) -> bool:
+        """Whether calling method ``operation`` with ``args`` does I/O and should run off the event loop."""
+        return self.blocking
+
+    def __contains__(self, session_id: str) -> bool:
+        return self.get(session_id) is not None
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self.session_ids())
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": type(self).__name__, "sessions": len(self)}
+
+class InMemorySessionStore(SessionStore):
+    """
+    Process-local store holding live ConversationMemory objects.
+
+    Optionally bounded: sessions idle for longer than ``ttl`` seconds expire,
+    and once ``max_sessions`` or the approximate ``max_bytes`` budget is
+    exceeded the least recently used sessions are evicted first. Session
+    sizes come from ``sizeof`` and are re-measured on every save.
+    """
+    def __init__(
+        self,
+        max_sessions: Optional[int] = None,
+        ttl: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        sizeof: Optional[Callable[[Any], int]] = None
+    ):
+        # session_id → (memory, last access time, approximate size), oldest access first
+        self._sessions: "OrderedDict[str, Tuple[Any, float, int]]" = OrderedDict()
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or (lambda memory: 0)
+        self.total_bytes = 0
+        self.evictions = {"ttl": 0, "max_sessions": 0, "max_bytes": 0}
+        # email → session_id, and the reverse so evicted sessions drop their entries
+        self._email_index: Dict[str, str] = {}
+        self._session_emails: Dict[str, set] = {}
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            memory, last_access, size = entry
+            now = time.monotonic()
+            if self.ttl is not None and now - last_access > self.ttl:
+                self._evict(session_id, "ttl")
+                return None
+            self._sessions[session_id] = (memory, now, size)
+            self._sessions.move_to_end(session_id)
+            return memory
+
+    def save(self, session_id: str, memory: Any):
+        size = self.sizeof(memory)
+        with self._lock:
+            previous = self._sessions.pop(session_id, None)
+            if previous is not None:
+                self.total_bytes -= previous[2]
+            self._sessions[session_id] = (memory, time.monotonic(), size)
+            self.total_bytes += size
+            self._enforce_limits(keep=session_id)
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            if entry is None:
+                return False
+            self.total_bytes -= entry[2]
+            self._unindex(session_id)
+            return True
+
+    def session_ids(self) -> Iterator[str]:
+        with self._lock:
+            return iter(list(self._sessions))
+
+    def index_email(self, email: str, session_id: str):
+        with self._lock:
+            if session_id not in self._sessions:
+                return
+            previous = self._email_index.get(email)
+            if previous is not None and previous != session_id:
+                self._session_emails.get(previous, set()).discard(email)
+            self._email_index[email] = session_id
+            self._session_emails.setdefault(session_id, set()).add(email)
+
+    def find_by_email(self, email: str) -> Optional[str]:
+        return self._email_index.get(email)
+
+    def _unindex(self, session_id: str):
+        for email in self._session_emails.pop(session_id, ()):
+            if self._email_index.get(email) == session_id:
+                del self._email_index[email]
+
+    def __contains__(self, session_id: str) -> bool:
+        return self.get(session_id) is not None
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _evict(self, session_id: str, reason: str):
+        memory, _, size = self._sessions.pop(session_id)
+        self.total_bytes -= size
+        self.evictions[reason] += 1
+        self._unindex(session_id)
+
+    def _enforce_limits(self, keep: str):
+        """Expire idle sessions, then evict LRU sessions until within limits. Caller holds the lock."""
+        if self.ttl is not None:
+            cutoff = time.monotonic() - self.ttl
+            # Entries are ordered by last access, so expired ones are at the front
+            while self._sessions:
+                oldest_id, (_, last_access, _) = next(iter(self._sessions.items()))
+                if last_access >= cutoff:
+                    break
+                self._evict(oldest_id, "ttl")
+
+        while self.max_sessions is not None and len(self._sessions) > self.max_sessions:
+            self._evict(next(iter(self._sessions)), "max_sessions")
+
+        while self.max_bytes is not None and self.total_bytes > self.max_bytes and len(self._sessions) > 1:
+            oldest_id = next(iter(self._sessions))
+            if oldest_id == keep:
+                break
+            self._evict(oldest_id, "max_bytes")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self).__name__,
+            "sessions": len(self._sessions),
+            "approx_bytes": self.total_bytes,
+            "max_sessions": self.max_sessions,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "indexed_emails": len(self._email_index),
+            "evictions": dict(self.evictions),
+        }
+
+class SnapshotSessionStore(InMemorySessionStore):
+    """
+    In-memory store that periodically snapshots changed sessions to SQLite.
+
+    Sessions live in memory exactly as with InMemorySessionStore. Saves and
+    deletes mark a session dirty. ``collect_snapshot()`` encodes the dirty
+    sessions, and ``write_snapshot()`` writes them zlib-compressed in one
+    transaction. After a restart, sessions are restored lazily from the
+    snapshot the first time they are accessed, so startup doesn't load
+    anything. Sessions evicted from memory by the count or size limits stay
+    in the snapshot and are restored the same way. Expired and deleted
+    sessions are removed from it.
+
+    ``collect_snapshot()`` must run on the thread that mutates sessions (the
+    event loop in main.py). ``write_snapshot()`` does the blocking work and
+    can run on any thread. Lookups that miss memory read the snapshot
+    database, so ``blocks()`` sends them off the event loop.
+    """
+    def __init__(
+        self,
+        path: str,
+        encode: Callable[[Any], bytes],
+        decode: Callable[[bytes], Any],
+        max_sessions: Optional[int] = None,
+        ttl: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        sizeof: Optional[Callable[[Any], int]] = None
+    ):
+        super().__init__(max_sessions=max_sessions, ttl=ttl, max_bytes=max_bytes, sizeof=sizeof)
+        self.path = path
+        self.encode = encode
+        self.decode = decode
+        self._local = threading.local()
+        # session_id → memory to write, or None to remove it from the snapshot
+        self._dirty: Dict[str, Optional[Any]] = {}
+        # Collected by collect_snapshot() and still being written
+        self._writing: Dict[str, Optional[Any]] = {}
+        self._dirty_emails: Dict[str, str] = {}
+        self.restored = 0
+        self.snapshots = 0
+        self.last_snapshot_ms = 0.0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS session_snapshots ("
+                "session_id TEXT PRIMARY KEY, data BLOB NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS snapshot_emails ("
+                "email TEXT PRIMARY KEY, session_id TEXT NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return _connect_sqlite(self._local, self.path)
+
+    def blocks(self, operation: str, *args) -> bool:
+        # Only lookups of sessions and emails not held in memory touch the database
+        if operation == "get":
+            return args[0] not in self._sessions
+        if operation == "find_by_email":
+            return args[0] not in self._email_index
+        return False
+
+    def get(self, session_id: str) -> Optional[Any]:
+        memory = super().get(session_id)
+        if memory is None:
+            memory = self._restore(session_id)
+        return memory
+
+    def save(self, session_id: str, memory: Any):
+        super().save(session_id, memory)
+        with self._lock:
+            self._dirty[session_id] = memory
+
+    def delete(self, session_id: str) -> bool:
+        deleted = super().delete(session_id)
+        with self._lock:
+            self._dirty[session_id] = None
+        return deleted
+
+    def index_email(self, email: str, session_id: str):
+        super().index_email(email, session_id)
+        with self._lock:
+            self._dirty_emails[email] = session_id
+
+    def find_by_email(self, email: str) -> Optional[str]:
+        session_id = super().find_by_email(email)
+        if session_id is None:
+            row = self._connect().execute(
+                "SELECT session_id FROM snapshot_emails WHERE email = ?", (email,)
+            ).fetchone()
+            session_id = row[0] if row else None
+        return session_id
+
+    def _evict(self, session_id: str, reason: str):
+        memory = self._sessions[session_id][0]
+        super()._evict(session_id, reason)
+        if reason == "ttl":
+            self._dirty[session_id] = None
+        elif session_id in self._dirty:
+            # Keep unsaved changes until the next snapshot writes them
+            self._dirty[session_id] = memory
+
+    def _restore(self, session_id: str) -> Optional[Any]:
+        """Load a session that isn't in memory from pending writes or the snapshot."""
+        with self._lock:
+            memory = self._dirty.get(session_id, self._writing.get(session_id, _NOT_PENDING))
+        if memory is _NOT_PENDING:
+            memory = self._load_snapshot(session_id)
+        if memory is None:
+            return None
+
+        size = self.sizeof(memory)
+        with self._lock:
+            if session_id in self._sessions:
+                # Restored concurrently by another thread
+                return self._sessions[session_id][0]
+            self._sessions[session_id] = (memory, time.monotonic(), size)
+            self.total_bytes += size
+            self.restored += 1
+            self._enforce_limits(keep=session_id)
+        return memory
+
+    def _load_snapshot(self, session_id: str) -> Optional[Any]:
+        row = self._connect().execute(
+            "SELECT data, updated_at FROM session_snapshots WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        data, updated_at = row
+        if self.ttl is not None and time.time() - updated_at > self.ttl:
+            return None
+        return self.decode(zlib.decompress(data))
+
+    def collect_snapshot(self) -> List[Tuple[str, Optional[bytes]]]:
+        """
+        Encode the sessions changed since the last snapshot.
+
+        Returns:
+            (session_id, encoded session or None for removal) pairs to pass
+            to write_snapshot()
+        """
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            self._writing.update(dirty)
+        return [
+            (session_id, self.encode(memory) if memory is not None else None)
+            for session_id, memory in dirty.items()
+        ]
+
+    def write_snapshot(self, batch: List[Tuple[str, Optional[bytes]]]):
+        """Write a batch from collect_snapshot(), and pending email index entries, in one transaction."""
+        start = time.perf_counter()
+        with self._lock:
+            emails, self._dirty_emails = self._dirty_emails, {}
+        if not batch and not emails:
+            return
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO session_snapshots (session_id, data, updated_at) VALUES (?, ?, ?)",
+                    [(sid, zlib.compress(data), now) for sid, data in batch if data is not None]
+                )
+                removed = [(sid,) for sid, data in batch if data is None]
+                conn.executemany("DELETE FROM session_snapshots WHERE session_id = ?", removed)
+                conn.executemany("DELETE FROM snapshot_emails WHERE session_id = ?", removed)
+                conn.executemany(
+                    "INSERT OR REPLACE INTO snapshot_emails (email, session_id) VALUES (?, ?)",
+                    list(emails.items())
+                )
+        finally:
+            with self._lock:
+                for session_id, _ in batch:
+                    self._writing.pop(session_id, None)
+        self.snapshots += 1
+        self.last_snapshot_ms = (time.perf_counter() - start) * 1000
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats.update({
+            "snapshot_path": self.path,
+            "dirty": len(self._dirty),
+            "restored": self.restored,
+            "snapshots": self.snapshots,
+            "last_snapshot_ms": round(self.last_snapshot_ms, 2),
+        })
+        return stats
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Sessions in a local SQLite database in WAL mode.
+
+    WAL lets readers in every worker process proceed while one writer
+    commits, which is the access pattern of a multi-worker uvicorn on one box.
+    """
+    blocking = True
+
+    def __init__(self, path: str, encode: Callable[[Any], bytes], decode: Callable[[bytes], Any]):
+        self.path = path
+        self.encode = encode
+        self.decode = decode
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, data BLOB NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS session_emails ("
+                "email TEXT PRIMARY KEY, session_id TEXT NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS session_emails_session ON session_emails (session_id)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return _connect_sqlite(self._local, self.path)
+
+    def get(self, session_id: str) -> Optional[Any]:
+        row = self._connect().execute(
+            "SELECT data FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return self.decode(row[0]) if row else None
+
+    def save(self, session_id: str, memory: Any):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, data, updated_at) VALUES (?, ?, ?)",
+                (session_id, self.encode(memory), time.time())
+            )
+
+    def delete(self, session_id: str) -> bool:
+        with self._connect() as conn:
+            cursor = conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM session_emails WHERE session_id = ?", (session_id,))
+        return cursor.rowcount > 0
+
+    def session_ids(self) -> Iterator[str]:
+        rows = self._connect().execute("SELECT session_id FROM sessions").fetchall()
+        return (row[0] for row in rows)
+
+    def index_email(self, email: str, session_id: str):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO session_emails (email, session_id) VALUES (?, ?)",
+                (email, session_id)
+            )
+
+    def find_by_email(self, email: str) -> Optional[str]:
+        row = self._connect().execute(
+            "SELECT session_id FROM session_emails WHERE email = ?", (email,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def __contains__(self, session_id: str) -> bool:
+        return self._connect().execute(
+            "SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+class RedisSessionStore(SessionStore):
+    """
+    Sessions in Redis, or any server speaking the Redis protocol.
+
+    Pass ``client`` to use an existing client object, e.g. a local stand-in
+    such as ``fakeredis.FakeRedis()``; otherwise one is created from ``url``
+    with the optional ``redis`` package.
+
+    Session ids are also kept in a set, so counting them for /metrics is one
+    SCARD rather than a SCAN over a possibly shared keyspace.
+    """
+    blocking = True
+
+    def __init__(
+        self,
+        encode: Callable[[Any], bytes],
+        decode: Callable[[bytes], Any],
+        url: str = "redis://localhost:6379/0",
+        client: Any = None,
+        prefix: str = "anaptyss:session:"
+    ):
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError("The redis session store requires the 'redis' package (pip install redis)")
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.encode = encode
+        self.decode = decode
+        self.prefix = prefix
+
+    def _key(self, session_id: str) -> str:
+        return f"{self.prefix}{session_id}"
+
+    @property
+    def _ids_key(self) -> str:
+        return f"{self.prefix}ids"
+
+    def get(self, session_id: str) -> Optional[Any]:
+        data = self.client.get(self._key(session_id))
+        return self.decode(data) if data is not None else None
+
+    def save(self, session_id: str, memory: Any):
+        pipeline = self.client.pipeline()
+        pipeline.set(self._key(session_id), self.encode(memory))
+        pipeline.sadd(self._ids_key, session_id)
+        pipeline.execute()
+
+    def _email_key(self, email: str) -> str:
+        return f"{self.prefix}email:{email}"
+
+    def _session_emails_key(self, session_id: str) -> str:
+        # Emails indexed for a session, so delete() can drop their index keys
+        return f"{self.prefix}emails:{session_id}"
+
+    def delete(self, session_id: str) -> bool:
+        emails = self.client.smembers(self._session_emails_key(session_id))
+        # Keep index keys that a later message moved to another session
+        stale = [
+            self._email_key(email.decode() if isinstance(email, bytes) else email)
+            for email in emails
+        ]
+        stale = [key for key in stale if self._decode_id(self.client.get(key)) == session_id]
+        deleted = self.client.delete(self._key(session_id))
+        pipeline = self.client.pipeline()
+        pipeline.srem(self._ids_key, session_id)
+        pipeline.delete(self._session_emails_key(session_id), *stale)
+        pipeline.execute()
+        return bool(deleted)
+
+    def index_email(self, email: str, session_id: str):
+        pipeline = self.client.pipeline()
+        pipeline.set(self._email_key(email), session_id)
+        pipeline.sadd(self._session_emails_key(session_id), email)
+        pipeline.execute()
+
+    @staticmethod
+    def _decode_id(session_id: Any) -> Optional[str]:
+        return session_id.decode() if isinstance(session_id, bytes) else session_id
+
+    def find_by_email(self, email: str) -> Optional[str]:
+        return self._decode_id(self.client.get(self._email_key(email)))
+
+    def session_ids(self) -> Iterator[str]:
+        return (self._decode_id(session_id) for session_id in self.client.sscan_iter(self._ids_key))
+
+    def __contains__(self, session_id: str) -> bool:
+        return bool(self.client.exists(self._key(session_id)))
+
+    def __len__(self) -> int:
+        return self.client.scard(self._ids_key)
+
+def create_session_store(
+    backend: str,
+    encode: Callable[[Any], bytes],
+    decode: Callable[[bytes], Any],
+    sqlite_path: str = "sessions.db",
+    redis_url: str = "redis://localhost:6379/0",
+    max_sessions: Optional[int] = None,
+    ttl: Optional[float] = None,
+    max_bytes: Optional[int] = None,
+    sizeof: Optional[Callable[[Any], int]] = None,
+    snapshot_path: Optional[str] = None
+) -> SessionStore:
+    """
+    Create the session store selected by configuration.
+
+    Args:
+        backend: "memory", "sqlite" or "redis"
+        encode: Serializes a session to bytes (shared backends only)
+        decode: Restores a session from bytes (shared backends only)
+        sqlite_path: Database file for the sqlite backend
+        redis_url: Server URL for the redis backend
+        max_sessions: Session count limit for the memory backend
+        ttl: Idle timeout in seconds for the memory backend
+        max_bytes: Approximate size budget for the memory backend
+        sizeof: Estimates a session's size in bytes for the memory backend
+        snapshot_path: Snapshot database for the memory backend; sessions
+            are only kept in memory if not set
+    """
+    backend = (backend or "memory").lower()
+    if backend == "memory" and snapshot_path:
+        store = SnapshotSessionStore(
+            snapshot_path, encode, decode,
+            max_sessions=max_sessions, ttl=ttl, max_bytes=max_bytes, sizeof=sizeof
+        )
+    elif backend == "memory":
+        store = InMemorySessionStore(max_sessions=max_sessions, ttl=ttl, max_bytes=max_bytes, sizeof=sizeof)
+    elif backend == "sqlite":
+        store = SQLiteSessionStore(sqlite_path, encode, decode)
+    elif backend == "redis":
+        store = RedisSessionStore(encode, decode, url=redis_url)
+    else:
+        raise ValueError(f"Unknown session store backend: {backend}")
+    logger.info(f"Using {type(store).__name__} for sessions")
+    return store
@@ -81,10 +81,8 @@ if [ "$COLLECTION_EXISTS" -eq 0 ]; then
         fi
         echo -e "${GREEN}Qdrant initialized successfully.${NC}"
     else
-        echo -e "${YELLOW}initialize_qdrant.py not found. Creating collection manually...${NC}"
-        curl -X PUT "http://localhost:6333/collections/anaptyss_content" \
-            -H "Content-Type: application/json" \
-            -d '{"vectors": {"size": 1536, "distance": "Cosine"}}'
+        echo -e "${YELLOW}initialize_qdrant.py not found. Creating collection from its schema...${NC}"
+        python collection_schema.py anaptyss_content
         if [ $? -ne 0 ]; then
             echo -e "${RED}Failed to create Qdrant collection.${NC}"
             exit 1
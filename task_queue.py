@@ -0,0 +1,135 @@
+"""
+Background task queue for work that must not delay the chat response.
+
+Jobs are coroutine functions submitted from a request handler and executed
+by a fixed set of asyncio worker tasks after the handler has returned.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class BackgroundTaskQueue:
+    """
+    Bounded asyncio work queue drained by a fixed number of worker tasks.
+
+    Workers are started lazily on the first submission (or explicitly with
+    ``start()``), so the queue can be created at import time.
+    """
+    def __init__(self, workers: int = 4, maxsize: int = 1000, name: str = "background"):
+        self.workers = workers
+        self.maxsize = maxsize
+        self.name = name
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+
+    @property
+    def running(self) -> bool:
+        """True if the workers are alive on the running event loop."""
+        if not self._workers:
+            return False
+        try:
+            return self._loop is asyncio.get_running_loop()
+        except RuntimeError:
+            return not self._loop.is_closed()
+
+    async def start(self):
+        """Start the worker tasks on the running event loop."""
+        self._start_workers()
+
+    def _start_workers(self):
+        if self.running:
+            return
+        if self._workers:
+            # Workers of a previous (usually closed) loop can never run again;
+            # whatever they left queued is lost with them
+            stale = self._queue.qsize() if self._queue else 0
+            self.dropped += stale
+            logger.warning(f"{self.name} workers belong to another event loop, "
+                           f"restarting them ({stale} queued jobs dropped)")
+            self._reset()
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._workers = [
+            asyncio.create_task(self._worker(i), name=f"{self.name}-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(f"Started {self.workers} {self.name} workers")
+
+    def _reset(self):
+        self._workers = []
+        self._queue = None
+        self._loop = None
+
+    async def stop(self, drain_timeout: float = 10.0):
+        """Wait for queued jobs to finish (up to drain_timeout) and stop the workers."""
+        if not self.running:
+            # Workers started on another loop cannot be awaited from this one
+            self._reset()
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"{self.name} queue did not drain within {drain_timeout}s")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._reset()
+
+    def submit(self, job: Callable[[], Awaitable[Any]]) -> Optional[asyncio.Future]:
+        """
+        Queue a coroutine function for background execution.
+
+        Args:
+            job: Zero-argument coroutine function
+
+        Returns:
+            Future resolved with the job's result, or None if the queue is full
+        """
+        self._start_workers()
+
+        future = asyncio.get_running_loop().create_future()
+        # Failures are logged by the worker; don't warn again if nobody awaits
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        try:
+            self._queue.put_nowait((job, future))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"{self.name} queue full, dropping job")
+            return None
+        return future
+
+    async def _worker(self, index: int):
+        while True:
+            job, future = await self._queue.get()
+            try:
+                result = await job()
+                self.completed += 1
+                if not future.done():
+                    future.set_result(result)
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.cancel()
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"{self.name} job failed: {e}", exc_info=True)
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "workers": len(self._workers),
+            "completed": self.completed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+        }
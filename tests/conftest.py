@@ -0,0 +1,72 @@
+"""
+Shared test setup.
+
+The modules live at the repository root, and main.py builds its clients and
+session store at import time, so configure them for a process without any
+services before anything imports it.
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ["SESSION_STORE"] = "memory"
+os.environ["SESSION_SNAPSHOT_PATH"] = ""
+os.environ["COLLECTION_VERSION_DIR"] = tempfile.mkdtemp(prefix="anaptyss-tests-")
+
+class FakeClock:
+    """Stands in for the ``time`` module of the code under test; advanced by hand."""
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+    def perf_counter(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    import session_store
+    fake = FakeClock()
+    monkeypatch.setattr(session_store, "time", fake)
+    return fake
+
+@pytest.fixture
+def make_conversation():
+    """Build a ConversationMemory with every serialized field set."""
+    from main import ConversationMemory
+
+    def build(turns: int = 3) -> "ConversationMemory":
+        memory = ConversationMemory()
+        for turn in range(turns):
+            memory.add_exchange(
+                f"Question {turn} about core banking and AML?",
+                f"Answer {turn}: modernization options for your bank.",
+                sentiment={"positive": 0.7, "negative": 0.1, "neutral": 0.2},
+                topics=["core banking", f"topic {turn % 2}"]
+            )
+        memory.summary = "Visitor from a mid-size bank asking about core banking."
+        memory.last_form_trigger = datetime(2026, 1, 2, 3, 4, 5)
+        memory.financial_context["industry_vertical"] = "banking"
+        memory.financial_context["topics_of_interest"] = ["aml", "kyc"]
+        memory.context_analyzed_turn = turns
+        memory.context_refresh_due = True
+        memory.last_source_ids = [1, "post-7"]
+        memory.content_preferences = {"content_type": "case_study", "industry": "banking", "topic": None}
+        memory.pending_show_form = True
+        return memory
+
+    return build
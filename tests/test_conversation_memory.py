@@ -0,0 +1,42 @@
+import json
+from collections import deque
+
+from main import ConversationMemory, Message, Sentiment
+
+def test_round_trip_keeps_every_field(make_conversation):
+    memory = make_conversation(turns=7)
+    restored = ConversationMemory.from_bytes(memory.to_bytes())
+
+    for attr in ConversationMemory.__slots__:
+        assert getattr(restored, attr) == getattr(memory, attr), attr
+    assert restored.to_bytes() == memory.to_bytes()
+
+def test_round_trip_restores_compact_types(make_conversation):
+    restored = ConversationMemory.from_bytes(make_conversation(turns=7).to_bytes())
+
+    assert all(isinstance(message, Message) for message in restored.messages + restored.unsummarized)
+    assert isinstance(restored.sentiment_history, deque)
+    assert restored.sentiment_history.maxlen == ConversationMemory.SENTIMENT_HISTORY_SIZE
+    assert all(isinstance(sentiment, Sentiment) for sentiment in restored.sentiment_history)
+    assert list(restored.topics_discussed) == ["core banking", "topic 0", "topic 1"]
+
+def test_empty_fields_are_omitted():
+    data = json.loads(ConversationMemory().to_bytes())
+
+    # A new session only has the default financial context and content preferences
+    assert set(data) == {"fc", "cp"}
+    restored = ConversationMemory.from_bytes(ConversationMemory().to_bytes())
+    assert restored.messages == [] and restored.summary == "" and not restored.pending_show_form
+
+def test_unknown_keys_are_ignored():
+    memory = ConversationMemory.from_bytes(b'{"n": 2, "zz": "from a newer version"}')
+
+    assert memory.interaction_count == 2
+
+def test_recent_window_moves_old_messages_to_unsummarized(make_conversation):
+    memory = make_conversation(turns=6)
+
+    assert len(memory.messages) == ConversationMemory.KEEP_MESSAGES
+    assert len(memory.unsummarized) == 12 - ConversationMemory.KEEP_MESSAGES
+    assert memory.unsummarized[0] == Message("user", "Question 0 about core banking and AML?")
+    assert memory.messages[-1] == Message("assistant", "Answer 5: modernization options for your bank.")
@@ -0,0 +1,187 @@
+import pytest
+
+from main import ConversationMemory
+from session_store import InMemorySessionStore, RedisSessionStore, SnapshotSessionStore, SQLiteSessionStore
+
+encode, decode = ConversationMemory.to_bytes, ConversationMemory.from_bytes
+
+# ─── SHARED STORES ─────────────────────────────────────────────────────────────
+@pytest.fixture(params=["sqlite", "redis"])
+def shared_store(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteSessionStore(str(tmp_path / "sessions.db"), encode, decode)
+    fakeredis = pytest.importorskip("fakeredis")
+    return RedisSessionStore(encode, decode, client=fakeredis.FakeRedis())
+
+def test_round_trip(shared_store, make_conversation):
+    memory = make_conversation()
+    shared_store.save("s1", memory)
+
+    loaded = shared_store.get("s1")
+    assert loaded is not memory
+    assert loaded.to_bytes() == memory.to_bytes()
+    assert "s1" in shared_store and "s2" not in shared_store
+    assert shared_store.get("s2") is None
+
+    memory.add_exchange("One more question", "One more answer")
+    shared_store.save("s1", memory)
+    assert shared_store.get("s1").interaction_count == memory.interaction_count
+    assert list(shared_store.session_ids()) == ["s1"]
+    assert len(shared_store) == 1
+
+def test_delete_drops_the_email_index(shared_store, make_conversation):
+    shared_store.save("s1", make_conversation())
+    shared_store.index_email("lead@bank.example", "s1")
+    shared_store.index_email("cfo@bank.example", "s1")
+    assert shared_store.find_by_email("lead@bank.example") == "s1"
+
+    assert shared_store.delete("s1")
+    assert shared_store.get("s1") is None
+    assert shared_store.find_by_email("lead@bank.example") is None
+    assert shared_store.find_by_email("cfo@bank.example") is None
+    assert not shared_store.delete("s1")
+    assert len(shared_store) == 0
+
+def test_delete_keeps_an_email_moved_to_another_session(shared_store, make_conversation):
+    shared_store.save("s1", make_conversation())
+    shared_store.save("s2", make_conversation())
+    shared_store.index_email("lead@bank.example", "s1")
+    shared_store.index_email("lead@bank.example", "s2")
+
+    shared_store.delete("s1")
+    assert shared_store.find_by_email("lead@bank.example") == "s2"
+
+def test_redis_delete_leaves_no_keys(make_conversation):
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeRedis()
+    store = RedisSessionStore(encode, decode, client=client)
+    store.save("s1", make_conversation())
+    store.index_email("lead@bank.example", "s1")
+
+    store.delete("s1")
+    assert client.keys("*") == []
+
+def test_redis_counts_sessions_without_scanning(make_conversation):
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeRedis()
+    client.set("unrelated:key", b"1")
+    store = RedisSessionStore(encode, decode, client=client)
+    for sid in ("s1", "s2", "s3"):
+        store.save(sid, make_conversation())
+    store.index_email("lead@bank.example", "s1")
+    store.delete("s3")
+
+    def scan_iter(*args, **kwargs):
+        raise AssertionError("stats must not scan the keyspace")
+    client.scan_iter = scan_iter
+    assert store.stats() == {"backend": "RedisSessionStore", "sessions": 2}
+    assert sorted(store.session_ids()) == ["s1", "s2"]
+
+# ─── IN-MEMORY STORE ───────────────────────────────────────────────────────────
+def test_least_recently_used_session_is_evicted_first(clock, make_conversation):
+    store = InMemorySessionStore(max_sessions=2)
+    store.save("a", make_conversation())
+    store.save("b", make_conversation())
+    clock.advance(1)
+    assert store.get("a") is not None
+
+    store.save("c", make_conversation())
+    assert list(store.session_ids()) == ["a", "c"]
+    assert store.evictions["max_sessions"] == 1
+
+def test_idle_sessions_expire(clock, make_conversation):
+    store = InMemorySessionStore(ttl=10)
+    store.save("a", make_conversation())
+    store.save("b", make_conversation())
+    clock.advance(6)
+    assert store.get("b") is not None
+
+    clock.advance(6)
+    assert store.get("a") is None
+    assert store.get("b") is not None
+    assert store.evictions["ttl"] == 1
+
+def test_expired_sessions_are_dropped_on_save(clock, make_conversation):
+    store = InMemorySessionStore(ttl=10)
+    store.save("a", make_conversation())
+    clock.advance(11)
+
+    store.save("b", make_conversation())
+    assert len(store) == 1
+    assert store.evictions["ttl"] == 1
+
+def test_size_budget_evicts_oldest_sessions(clock, make_conversation):
+    store = InMemorySessionStore(max_bytes=250, sizeof=lambda memory: 100)
+    for sid in ("a", "b", "c"):
+        store.save(sid, make_conversation())
+        clock.advance(1)
+
+    assert list(store.session_ids()) == ["b", "c"]
+    assert store.total_bytes == 200
+    assert store.evictions["max_bytes"] == 1
+
+def test_evicted_session_drops_its_email_entries(clock, make_conversation):
+    store = InMemorySessionStore(max_sessions=1)
+    store.save("a", make_conversation())
+    store.index_email("lead@bank.example", "a")
+
+    store.save("b", make_conversation())
+    assert store.find_by_email("lead@bank.example") is None
+    assert store.stats()["indexed_emails"] == 0
+
+def test_email_of_unknown_session_is_not_indexed():
+    store = InMemorySessionStore()
+    store.index_email("lead@bank.example", "missing")
+
+    assert store.find_by_email("lead@bank.example") is None
+
+# ─── SNAPSHOTS ─────────────────────────────────────────────────────────────────
+def snapshot(store: SnapshotSessionStore):
+    store.write_snapshot(store.collect_snapshot())
+
+def test_sessions_are_restored_lazily_after_restart(tmp_path, make_conversation):
+    path = str(tmp_path / "sessions.snapshot.db")
+    memory = make_conversation()
+    before = SnapshotSessionStore(path, encode, decode)
+    before.save("s1", memory)
+    before.index_email("lead@bank.example", "s1")
+    snapshot(before)
+
+    after = SnapshotSessionStore(path, encode, decode)
+    assert len(after) == 0
+    assert after.blocks("get", "s1")
+    assert after.find_by_email("lead@bank.example") == "s1"
+    assert after.get("s1").to_bytes() == memory.to_bytes()
+    assert after.restored == 1
+    assert not after.blocks("get", "s1")
+
+def test_deleted_sessions_leave_the_snapshot(tmp_path, make_conversation):
+    path = str(tmp_path / "sessions.snapshot.db")
+    store = SnapshotSessionStore(path, encode, decode)
+    store.save("s1", make_conversation())
+    store.index_email("lead@bank.example", "s1")
+    snapshot(store)
+    store.delete("s1")
+    snapshot(store)
+
+    after = SnapshotSessionStore(path, encode, decode)
+    assert after.get("s1") is None
+    assert after.find_by_email("lead@bank.example") is None
+
+def test_evicted_session_is_restored_before_it_is_snapshotted(tmp_path, make_conversation):
+    store = SnapshotSessionStore(str(tmp_path / "sessions.snapshot.db"), encode, decode, max_sessions=1)
+    memory = make_conversation()
+    store.save("a", memory)
+    store.save("b", make_conversation())
+    assert store.evictions["max_sessions"] == 1
+
+    assert store.get("a") is memory
+
+def test_expired_snapshots_are_not_restored(tmp_path, clock, make_conversation):
+    path = str(tmp_path / "sessions.snapshot.db")
+    store = SnapshotSessionStore(path, encode, decode, ttl=10)
+    store.save("s1", make_conversation())
+    snapshot(store)
+
+    clock.advance(11)
+    assert SnapshotSessionStore(path, encode, decode, ttl=10).get("s1") is None
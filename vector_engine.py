@@ -0,0 +1,381 @@
+"""
+In-process vector search for small collections.
+
+The content collection is a few thousand 1536-dim chunks, small enough to
+hold in memory as one float32 matrix (~20MB per 3000 points). VectorEngine
+loads every point once and answers the searches made by
+``enhanced_financial_search`` locally, with no network hop to Qdrant:
+
+- scores are one matrix-vector product over pre-normalized vectors (cosine,
+  the distance the collections are created with)
+- top-k comes from ``argpartition`` instead of a full sort
+- payload filters on ``content_type``, ``industries`` and ``topics`` are
+  evaluated from boolean masks precomputed per field value, and ``has_id``
+  from an id → row map
+
+Filters on any other field are sent to Qdrant. The matrix is reloaded in the
+background on a schedule, and soon after ingestion bumps the collection
+version.
+"""
+
+import time
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from qdrant_client.http.models import QueryResponse, Record, ScoredPoint
+
+from retrieval_cache import read_collection_version
+
+logger = logging.getLogger(__name__)
+
+# Payload fields with precomputed masks; list fields match when any element matches
+MASKED_FIELDS = ("content_type", "industries", "topics")
+
+# How often (seconds) the engine checks whether ingestion bumped the collection version
+VERSION_CHECK_INTERVAL = 1.0
+
+class _Snapshot:
+    """Immutable in-memory copy of a collection."""
+    __slots__ = ("matrix", "ids", "rows_by_id", "payloads", "masks", "version", "loaded_at")
+
+    def __init__(self, matrix: np.ndarray, ids: List[Any], payloads: List[Dict[str, Any]], version: str):
+        self.matrix = matrix
+        self.ids = ids
+        self.rows_by_id = {point_id: row for row, point_id in enumerate(ids)}
+        self.payloads = payloads
+        self.version = version
+        self.loaded_at = time.monotonic()
+        # field → value → boolean mask over the rows
+        self.masks: Dict[str, Dict[Any, np.ndarray]] = {field: {} for field in MASKED_FIELDS}
+        for row, payload in enumerate(payloads):
+            for field in MASKED_FIELDS:
+                values = payload.get(field)
+                if values is None:
+                    continue
+                for value in values if isinstance(values, list) else [values]:
+                    mask = self.masks[field].get(value)
+                    if mask is None:
+                        mask = self.masks[field][value] = np.zeros(len(payloads), dtype=bool)
+                    mask[row] = True
+
+class _UnsupportedFilter(Exception):
+    pass
+
+class VectorEngine:
+    """
+    Drop-in for the ``query_points``/``query_batch_points``/``retrieve`` calls of a QdrantClient on one collection.
+
+    Args:
+        client: QdrantClient the points are loaded from, and that serves
+            searches the engine can't answer locally
+        collection: Collection to mirror
+        refresh_interval: Seconds between scheduled reloads
+        batch_size: Points fetched per scroll request while loading
+    """
+    def __init__(self, client: Any, collection: str, refresh_interval: float = 300, batch_size: int = 256):
+        self.client = client
+        self.collection = collection
+        self.refresh_interval = refresh_interval
+        self.batch_size = batch_size
+        self._snapshot: Optional[_Snapshot] = None
+        self._load_lock = threading.Lock()
+        self._refreshing = False
+        self._version_checked_at = 0.0
+        self.local_searches = 0
+        self.delegated_searches = 0
+        self.reloads = 0
+
+    # ─── Loading ───────────────────────────────────────────────────────────────
+    def load(self) -> _Snapshot:
+        """Scroll the whole collection into a new snapshot and swap it in."""
+        version = read_collection_version(self.collection)
+        start = time.perf_counter()
+        ids, payloads, vectors = [], [], []
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection,
+                limit=self.batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True
+            )
+            for point in points:
+                ids.append(point.id)
+                payloads.append(point.payload or {})
+                vectors.append(point.vector)
+            if offset is None:
+                break
+
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.size:
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix /= np.where(norms == 0, 1, norms)
+        snapshot = _Snapshot(np.ascontiguousarray(matrix), ids, payloads, version)
+        self._snapshot = snapshot
+        self.reloads += 1
+        logger.info(
+            f"Loaded {len(ids)} points of {self.collection} into the vector engine "
+            f"in {(time.perf_counter() - start) * 1000:.0f}ms ({matrix.nbytes / 1e6:.1f}MB)"
+        )
+        return snapshot
+
+    def _reload_in_background(self):
+        try:
+            self.load()
+        except Exception as e:
+            logger.warning(f"Vector engine reload failed, keeping the previous snapshot: {e}")
+        finally:
+            self._refreshing = False
+
+    def _current(self) -> _Snapshot:
+        """The snapshot to search, loading it on first use and scheduling refreshes."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._load_lock:
+                if self._snapshot is None:
+                    self.load()
+                return self._snapshot
+
+        stale = time.monotonic() - snapshot.loaded_at > self.refresh_interval
+        now = time.monotonic()
+        if not stale and now - self._version_checked_at >= VERSION_CHECK_INTERVAL:
+            self._version_checked_at = now
+            stale = read_collection_version(self.collection) != snapshot.version
+        if stale:
+            with self._load_lock:
+                if not self._refreshing:
+                    self._refreshing = True
+                    threading.Thread(target=self._reload_in_background, name="vector-engine-reload", daemon=True).start()
+        return snapshot
+
+    # ─── Filters ───────────────────────────────────────────────────────────────
+    def _filter_mask(self, snapshot: _Snapshot, flt: Any) -> Optional[np.ndarray]:
+        """Boolean row mask for a Qdrant filter (dict or model), None for no filter."""
+        if flt is None:
+            return None
+        if hasattr(flt, "model_dump"):
+            flt = flt.model_dump(exclude_none=True)
+        if not flt:
+            return None
+        unsupported = set(flt) - {"must", "should", "must_not"}
+        if unsupported:
+            raise _UnsupportedFilter(f"filter clauses {unsupported}")
+
+        rows = len(snapshot.ids)
+        mask = np.ones(rows, dtype=bool)
+        for condition in flt.get("must") or []:
+            mask &= self._condition_mask(snapshot, condition)
+        if flt.get("should"):
+            any_mask = np.zeros(rows, dtype=bool)
+            for condition in flt["should"]:
+                any_mask |= self._condition_mask(snapshot, condition)
+            mask &= any_mask
+        for condition in flt.get("must_not") or []:
+            mask &= ~self._condition_mask(snapshot, condition)
+        return mask
+
+    def _condition_mask(self, snapshot: _Snapshot, condition: Dict[str, Any]) -> np.ndarray:
+        if any(clause in condition for clause in ("must", "should", "must_not")):
+            # Nested filter
+            mask = self._filter_mask(snapshot, condition)
+            return mask if mask is not None else np.ones(len(snapshot.ids), dtype=bool)
+
+        if "has_id" in condition:
+            mask = np.zeros(len(snapshot.ids), dtype=bool)
+            mask[[snapshot.rows_by_id[point_id] for point_id in condition["has_id"] if point_id in snapshot.rows_by_id]] = True
+            return mask
+
+        field = condition.get("key")
+        match = condition.get("match") or {}
+        if field not in snapshot.masks or not ({"value", "any"} >= set(match)) or not match:
+            raise _UnsupportedFilter(f"condition {condition}")
+
+        values = [match["value"]] if "value" in match else match["any"]
+        mask = np.zeros(len(snapshot.ids), dtype=bool)
+        for value in values:
+            value_mask = snapshot.masks[field].get(value)
+            if value_mask is not None:
+                mask |= value_mask
+        return mask
+
+    # ─── Search ────────────────────────────────────────────────────────────────
+    @staticmethod
+    def _project(payload: Dict[str, Any], with_payload: Any) -> Optional[Dict[str, Any]]:
+        """A stored payload as QdrantClient returns it for ``with_payload`` (True, False/None or a field list)."""
+        if isinstance(with_payload, list):
+            return {key: payload[key] for key in with_payload if key in payload}
+        return payload if with_payload else None
+
+    def _top_k(
+        self,
+        snapshot: _Snapshot,
+        scores: np.ndarray,
+        limit: int,
+        score_threshold: Optional[float],
+        mask: Optional[np.ndarray],
+        with_payload: Any = True,
+        with_vectors: bool = False
+    ) -> List[ScoredPoint]:
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+        k = min(limit, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        hits = []
+        for row in top:
+            score = float(scores[row])
+            if score == -np.inf or (score_threshold is not None and score < score_threshold):
+                break
+            hits.append(ScoredPoint(
+                id=snapshot.ids[row],
+                version=0,
+                score=score,
+                payload=self._project(snapshot.payloads[row], with_payload),
+                vector=snapshot.matrix[row].tolist() if with_vectors else None
+            ))
+        return hits
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        return query / norm if norm else query
+
+    @staticmethod
+    def _is_vector(query: Any) -> bool:
+        """Plain dense vectors are searched locally; other query types (recommend, fusion, ...) go to Qdrant."""
+        return isinstance(query, (list, np.ndarray)) and len(query) > 0 and not isinstance(query[0], (list, np.ndarray))
+
+    def query_points(
+        self,
+        collection_name: str,
+        query: Any = None,
+        query_filter: Any = None,
+        limit: int = 10,
+        score_threshold: Optional[float] = None,
+        with_payload: Any = True,
+        with_vectors: bool = False,
+        **kwargs
+    ) -> QueryResponse:
+        """Same arguments and results as QdrantClient.query_points."""
+        delegate = lambda: self._delegate_query(
+            collection_name, query, query_filter, limit, score_threshold, with_payload, with_vectors, **kwargs
+        )
+        if collection_name != self.collection or not self._is_vector(query) or kwargs.get("prefetch") or kwargs.get("using"):
+            return delegate()
+        try:
+            snapshot = self._current()
+            mask = self._filter_mask(snapshot, query_filter)
+        except _UnsupportedFilter as e:
+            logger.debug(f"Vector engine can't evaluate {e}, searching Qdrant")
+            return delegate()
+        except Exception as e:
+            logger.warning(f"Vector engine unavailable, searching Qdrant: {e}")
+            return delegate()
+
+        self.local_searches += 1
+        scores = snapshot.matrix @ self._normalize(query)
+        return QueryResponse(points=self._top_k(snapshot, scores, limit, score_threshold, mask, with_payload, with_vectors))
+
+    def query_batch_points(self, collection_name: str, requests: List[Any], **kwargs) -> List[QueryResponse]:
+        """Same arguments and results as QdrantClient.query_batch_points; all queries share one matrix product."""
+        if collection_name != self.collection or not all(
+            self._is_vector(request.query) and not request.prefetch and not request.using for request in requests
+        ):
+            return self._delegate_batch(collection_name, requests, **kwargs)
+        try:
+            snapshot = self._current()
+            masks = [self._filter_mask(snapshot, request.filter) for request in requests]
+        except _UnsupportedFilter as e:
+            logger.debug(f"Vector engine can't evaluate {e}, searching Qdrant")
+            return self._delegate_batch(collection_name, requests, **kwargs)
+        except Exception as e:
+            logger.warning(f"Vector engine unavailable, searching Qdrant: {e}")
+            return self._delegate_batch(collection_name, requests, **kwargs)
+
+        self.local_searches += len(requests)
+        queries = np.stack([self._normalize(request.query) for request in requests])
+        scores = queries @ snapshot.matrix.T
+        return [
+            QueryResponse(points=self._top_k(
+                snapshot,
+                scores[i],
+                request.limit if request.limit is not None else 10,
+                request.score_threshold,
+                masks[i],
+                # QueryRequest leaves both unset by default; Qdrant then returns no payload
+                request.with_payload or False,
+                bool(request.with_vector)
+            ))
+            for i, request in enumerate(requests)
+        ]
+
+    def retrieve(
+        self,
+        collection_name: str,
+        ids: List[Any],
+        with_payload: Any = True,
+        with_vectors: bool = False,
+        **kwargs
+    ) -> List[Record]:
+        """Same arguments and results as QdrantClient.retrieve; vectors come back normalized."""
+        if collection_name != self.collection:
+            return self.client.retrieve(
+                collection_name=collection_name, ids=ids, with_payload=with_payload, with_vectors=with_vectors, **kwargs
+            )
+        try:
+            snapshot = self._current()
+        except Exception as e:
+            logger.warning(f"Vector engine unavailable, retrieving from Qdrant: {e}")
+            snapshot = None
+
+        records, missing = [], []
+        for point_id in ids:
+            row = snapshot.rows_by_id.get(point_id) if snapshot else None
+            if row is None:
+                missing.append(point_id)
+                continue
+            records.append(Record(
+                id=point_id,
+                payload=self._project(snapshot.payloads[row], with_payload),
+                vector=snapshot.matrix[row].tolist() if with_vectors else None
+            ))
+        if missing:
+            # Added since the last reload
+            records.extend(self.client.retrieve(
+                collection_name=collection_name, ids=missing, with_payload=with_payload, with_vectors=with_vectors, **kwargs
+            ))
+        return records
+
+    def _delegate_query(self, collection_name, query, query_filter, limit, score_threshold, with_payload, with_vectors, **kwargs):
+        self.delegated_searches += 1
+        return self.client.query_points(
+            collection_name=collection_name,
+            query=query,
+            query_filter=query_filter,
+            limit=limit,
+            score_threshold=score_threshold,
+            with_payload=with_payload,
+            with_vectors=with_vectors,
+            **kwargs
+        )
+
+    def _delegate_batch(self, collection_name, requests, **kwargs):
+        self.delegated_searches += len(requests)
+        return self.client.query_batch_points(collection_name=collection_name, requests=requests, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "points": len(snapshot.ids) if snapshot else 0,
+            "matrix_mb": round(snapshot.matrix.nbytes / 1e6, 1) if snapshot else 0.0,
+            "snapshot_age_s": round(time.monotonic() - snapshot.loaded_at, 1) if snapshot else None,
+            "local_searches": self.local_searches,
+            "delegated_searches": self.delegated_searches,
+            "reloads": self.reloads,
+        }